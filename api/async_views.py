@@ -0,0 +1,140 @@
+"""`config.asgi` 에서 사용하는 비동기 예측/검색 view (`settings.ASYNC_VIEWS`)
+
+ASGI 서버가 업로드 본문을 비동기로 모두 받은 뒤에 view 가 실행되므로, 느린 모바일 업로드가
+스레드를 점유하지 않는다. CPU 를 쓰는 예측은 스레드(설정에 따라 다시 프로세스 풀)에서 실행하고,
+DB 접근은 Django 의 비동기 ORM 을 사용한다. 파일 쓰기는 `media` writer 가 응답 이후에 처리한다.
+
+동기 view 와 같은 JSON 을 돌려주며, `?async=1`, `?multiple=1` 요청은 동기 `PredictView` 가 처리한다.
+오래 걸리는 동기 코드는 Django 의 공유 동기 스레드(thread_sensitive)가 아닌 스레드에서 실행하여
+다른 동기 view 와 ORM 호출을 막지 않는다. (`_off_thread`)
+"""
+import asyncio
+import functools
+import time
+import typing
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpRequest, HttpResponse
+from django.utils import timezone
+from django.views import View
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+
+from api import views
+from api.core import analytics, catalogue, drug_index, jobs, metrics, uploads
+from api.models import DrugFullSpecification, Prediction
+from api.pagination import ItemSeqCursorPagination
+from api.serializers import DrugProjection, PredictionSerializer
+
+
+def _render(data: typing.Any, status_code: int = status.HTTP_200_OK) -> HttpResponse:
+    return HttpResponse(JSONRenderer().render(data), status=status_code, content_type='application/json')
+
+
+def _off_thread(func: typing.Callable) -> typing.Callable[..., typing.Awaitable]:
+    """`func` 를 공유 동기 스레드가 아닌 스레드 풀에서 실행한다. 그 스레드에서 연 DB 연결은 끝나면 정리한다."""
+    @functools.wraps(func)
+    def run(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return sync_to_async(run, thread_sensitive=False)
+
+
+async def _serialize(prediction: Prediction, request: HttpRequest) -> typing.Dict[str, typing.Any]:
+    """후보 약품을 비동기 ORM 으로 미리 읽어 `PredictionSerializer` 에 넘긴다."""
+    if prediction.candidates is not None:
+        pks = prediction.candidates
+    else:
+        pks = (await sync_to_async(drug_index.lookup)(prediction.shape, prediction.color)).tolist()
+    drugs = await DrugFullSpecification.objects.ain_bulk(pks)
+    return PredictionSerializer(prediction, context={'request': request, 'drugs': (pks, drugs)}).data
+
+
+class _AsyncAPIView(View):
+    """DRF `APIView` 처럼 CSRF 검사를 건너뛰고, `APIException` 을 같은 형식의 응답으로 바꾼다."""
+
+    @classmethod
+    def as_view(cls, **initkwargs):
+        view = super().as_view(**initkwargs)
+        view.csrf_exempt = True
+        return view
+
+    async def dispatch(self, request: HttpRequest, *args, **kwargs):
+        try:
+            return await super().dispatch(request, *args, **kwargs)
+        except APIException as e:
+            data = e.detail if isinstance(e.detail, (list, dict)) else {'detail': e.detail}
+            return _render(data, e.status_code)
+
+
+class PredictView(_AsyncAPIView):
+    image_field_name = 'raw_image'
+
+    async def post(self, request: HttpRequest, *args, **kwargs):
+        if request.GET.get('async', '').lower() in ('1', 'true') or request.GET.get('multiple', '').lower() in ('1', 'true'):
+            return await _off_thread(views.PredictView.as_view())(request, *args, **kwargs)
+
+        requested_at = timezone.now()
+        # multipart 파싱과 이미지 검증은 본문 크기에 비례하므로 이벤트 루프 밖에서 한다.
+        files = await sync_to_async(lambda: request.FILES, thread_sensitive=False)()
+        serializer = PredictionSerializer(data=files, context={'request': request})
+        if not await sync_to_async(serializer.is_valid, thread_sensitive=False)():
+            return _render(serializer.errors, status.HTTP_400_BAD_REQUEST)
+        file = serializer.validated_data[__class__.image_field_name]
+        try:
+            # 캐시에 없는 예측은 `drug_index` 를 처음 만들 때 ORM 을 쓸 수 있다.
+            outcome = await _off_thread(uploads.predict)(file)
+        except Exception as e:
+            await sync_to_async(analytics.record_failures)(requested_at, [e])
+            raise
+        with metrics.timing('save'):
+            prediction = Prediction(**{**serializer.validated_data, **outcome.fields}, requested_at=requested_at)
+            await prediction.asave()
+        await sync_to_async(analytics.record)([prediction])
+        uploads.remember(outcome, prediction)
+        return _render(await _serialize(prediction, request), status.HTTP_201_CREATED)
+
+
+class PredictionDetailView(_AsyncAPIView):
+    """`?wait=<초>` long-poll 을 스레드 없이 기다리는 `views.PredictionDetailView`"""
+
+    async def get(self, request: HttpRequest, pk: int, *args, **kwargs):
+        try:
+            prediction = await Prediction.objects.aget(pk=pk)
+        except Prediction.DoesNotExist:
+            raise NotFound()
+        deadline = time.monotonic() + views.PredictionDetailView.get_wait(request.GET)
+        while prediction.status not in jobs.TERMINAL_STATUSES and time.monotonic() < deadline:
+            await asyncio.sleep(settings.PREDICTION_JOBS['POLL_INTERVAL'])
+            await prediction.arefresh_from_db()
+        return _render(await _serialize(prediction, request))
+
+
+class SearchView(_AsyncAPIView):
+    async def get(self, request: HttpRequest, *args, **kwargs):
+        result = None
+        if settings.CATALOGUE_CACHE['ENABLED']:
+            version = await catalogue.aget_version()
+            result = await sync_to_async(catalogue.lookup)(request, version, 'application/json')
+            if result.not_modified or result.content is not None:
+                return catalogue.cached_response(result, 'application/json')
+
+        drf_request = Request(request)
+        projection = DrugProjection.from_query_params(drf_request.query_params)
+        paginator = ItemSeqCursorPagination()
+        queryset = views.SearchView.build_queryset(drf_request.query_params).values(*projection.columns(paginator.ordering))
+        # 4.2 의 비동기 ORM 도 내부적으로는 같은 방식(sync_to_async)으로 쿼리를 실행한다.
+        page = await sync_to_async(paginator.paginate_queryset)(queryset, drf_request)
+        data = projection.to_representation_many(page)
+        response = _render(paginator.get_paginated_response(data).data)
+        if result is not None:
+            await sync_to_async(catalogue.store)(result, response.content)
+            response['ETag'] = result.etag
+        return response
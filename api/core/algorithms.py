@@ -2,15 +2,14 @@ import dataclasses
 import functools
 import typing
 
-import colorgram
-import colour
 import cv2
 import cv2.typing
 import numpy
-import PIL.Image
 
-from api.core import exceptions
-from api.models import ColorChoices, Drug, ShapeChoices
+from django.conf import settings
+
+from api.core import drug_index, exceptions, metrics, munsell, palette, visual_index
+from api.models import ColorChoices, ShapeChoices
 
 
 @dataclasses.dataclass
@@ -33,12 +32,24 @@ class _MunsellColor:
         9: ColorChoices.BLUISH_PURPLE, # "P"
     }
 
+    @classmethod
+    def from_specification(cls, spec: typing.Sequence[float]) -> '_MunsellColor':
+        return cls(
+            hue=float(spec[0]),
+            value=float(spec[1]),
+            chroma=float(spec[2]),
+            code=float(spec[3]),
+        )
+
     def to_color_choice(self) -> ColorChoices:
         if self._is_colorless():
             return self._to_color_choices_colorless()
         return __class__.COLOR_CHOICES_MUNSELL_HUE_CODES[round(self.code, 1)]
 
     def _is_colorless(self) -> bool:
+        # colour-science 는 무채색(N)의 hue/chroma/code 를 NaN 으로 돌려준다.
+        if numpy.isnan(self.chroma) or numpy.isnan(self.code):
+            return True
         return self.chroma < 4.0 or self.value < 2.0 or self.value > 9.0 or round(self.code, 1) == 0
 
     def _to_color_choices_colorless(self) -> ColorChoices:
@@ -50,118 +61,363 @@ class _MunsellColor:
             return ColorChoices.WHITE
 
 
+@dataclasses.dataclass
+class ContourDescriptor:
+    """윤곽선 하나에 대한 분석 결과. 이미지마다 한 번 계산하여 마스크/모양/색상 단계가 함께 사용한다."""
+    points: cv2.typing.MatLike
+    perimeter: float
+    area: float
+    bounding_rect: typing.Tuple[int, int, int, int]
+    min_area_rect: typing.Tuple[typing.Tuple[float, float], typing.Tuple[float, float], float]
+    convexity: float
+    hu_moments: numpy.ndarray
+    approx: cv2.typing.MatLike
+
+    @classmethod
+    def from_contour(cls, contour: cv2.typing.MatLike, approx_epsilon: float) -> 'ContourDescriptor':
+        perimeter = cv2.arcLength(contour, True)
+        moments = cv2.moments(contour)
+        area = moments['m00']
+        hull_area = cv2.contourArea(cv2.convexHull(contour))
+        return cls(
+            points=contour,
+            perimeter=perimeter,
+            area=area,
+            bounding_rect=cv2.boundingRect(contour),
+            min_area_rect=cv2.minAreaRect(contour),
+            convexity=area / hull_area if hull_area else 0.0,
+            hu_moments=cv2.HuMoments(moments).flatten(),
+            approx=cv2.approxPolyDP(contour, approx_epsilon * perimeter, True),
+        )
+
+    @property
+    def n_vertices(self) -> int:
+        return len(self.approx)
+
+    @property
+    def elongation(self) -> float:
+        """최소 외접 사각형의 장축/단축 비"""
+        width, height = self.min_area_rect[1]
+        if min(width, height) == 0:
+            return float('inf')
+        return max(width, height) / min(width, height)
+
+    @property
+    def rectangularity(self) -> float:
+        """최소 외접 사각형 대비 면적 비 (타원 ≈ π/4, 장방형에 가까울수록 1)"""
+        width, height = self.min_area_rect[1]
+        if width * height == 0:
+            return 0.0
+        return self.area / (width * height)
+
+
 class PredictionModel:
     IMG_SHAPE = (256, 256)
     APPROX_EPSILON = 0.04
     CIRCLE_VERTICES = 7
+    CIRCLE_MAX_ELONGATION = 1.15
+    OBLONG_MIN_RECTANGULARITY = 0.86
+    COLOR_SHAPE = (64, 64)
+    COLOR_MIN_PROPORTION = 0.05
+    # 비용이 적은 순서. 마지막 전략은 신뢰도와 관계없이 결과를 사용한다.
+    MASK_STRATEGIES = ('chromakey', 'contour')
+    MASK_MIN_CONFIDENCE = 0.75
+    MASK_MIN_SOLIDITY = 0.85
+    MASK_AREA_RATIO_RANGE = (0.01, 0.6)
+    CHROMAKEY_MIN_TOLERANCE = 12.0
 
+    raw_shape: typing.Tuple[int, int]
     raw_mat: cv2.typing.MatLike
     mat: cv2.typing.MatLike
     bin_mat: cv2.typing.MatLike
-    contour: typing.Sequence[cv2.typing.MatLike]
+    contour: ContourDescriptor
+    mask_strategy: str
+    mask_confidence: float
     shape: ShapeChoices
     color: ColorChoices
-    drug: typing.Optional[Drug]
+    candidates: numpy.ndarray
+    # 시각 색인으로 후보를 정렬한 경우에만 설정된다.
+    descriptor: typing.Optional[numpy.ndarray] = None
 
     def __init__(self, mat: cv2.typing.MatLike) -> None:
+        self.raw_shape = mat.shape[:2]
         raw_mat = self._resize(mat)
-        mat = self._white_balance(raw_mat)
-        mat = self._denoise(mat)
-        bin_mat = self._draw_mask_via_contour(mat)
+        bin_mat, contour = self._draw_mask(raw_mat)
         mat = cv2.copyTo(raw_mat, bin_mat)
 
         self.raw_mat = raw_mat
         self.mat = mat
         self.bin_mat = bin_mat
+        self.contour = contour
         self.shape = self._predict_shape()
         self.color = self._predict_color()
-        self.drug = self._predict_drug()
+        self.candidates = self._predict_drug()
 
+    @metrics.timed('resize')
     def _resize(self, mat: cv2.typing.MatLike) -> cv2.typing.MatLike:
         return cv2.resize(mat, __class__.IMG_SHAPE)
 
+    @metrics.timed('white_balance')
     def _white_balance(self, mat: cv2.typing.MatLike) -> cv2.typing.MatLike:
         mat = cv2.cvtColor(mat, cv2.COLOR_BGR2LAB)
         mat = _get_white_balancer().balanceWhite(mat)
         return cv2.cvtColor(mat, cv2.COLOR_LAB2BGR)
 
+    @metrics.timed('denoise')
     def _denoise(self, mat: cv2.typing.MatLike) -> cv2.typing.MatLike:
         mat = cv2.medianBlur(mat, 5)
         return cv2.bilateralFilter(mat, -1, 32.0, 8.0)
 
-    def _draw_mask_via_contour(self, mat: cv2.typing.MatLike) -> cv2.typing.MatLike:
-        bin_mat = cv2.Canny(mat, 0, 255)
-        bin_mat = cv2.morphologyEx(bin_mat, cv2.MORPH_CLOSE, _get_structuring_element(7))
-        contours = cv2.findContours(bin_mat, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]
-        if not contours:
+    def _draw_mask(self, raw_mat: cv2.typing.MatLike) -> typing.Tuple[cv2.typing.MatLike, ContourDescriptor]:
+        """비용이 적은 전략부터 마스크를 그려 보고, 신뢰도가 충분하면 그 결과를 사용한다.
+
+        모든 전략의 신뢰도가 낮으면 가장 신뢰도가 높았던 결과를 (같으면 나중 전략을) 사용한다.
+        """
+        best = None
+        for strategy in __class__.MASK_STRATEGIES:
+            try:
+                bin_mat, contour = getattr(self, f'_draw_mask_via_{strategy}')(raw_mat)
+            except exceptions.NotDetectedException:
+                continue
+            confidence = self._score_mask(bin_mat, contour)
+            if best is None or best[0] <= confidence:
+                best = (confidence, strategy, bin_mat, contour)
+            if __class__.MASK_MIN_CONFIDENCE <= confidence:
+                break
+        if best is None:
             # TODO: 검출 실패한 데이터 수집
             raise exceptions.NotDetectedException('알약이 검출되지 않았습니다.')
-        contour = max(contours, key=lambda cont:cv2.arcLength(cont, True))
-        return cv2.drawContours(bin_mat, [contour], -1, 255, -1)
+        self.mask_confidence, self.mask_strategy, bin_mat, contour = best
+        return bin_mat, contour
+
+    def _score_mask(self, bin_mat: cv2.typing.MatLike, contour: ContourDescriptor) -> float:
+        """마스크가 알약 하나를 제대로 감쌌을 가능성 (0~1)
+
+        - solidity: 알약은 볼록하므로 윤곽선이 convex hull 을 거의 채운다.
+        - area ratio: 사진 대비 알약 면적이 너무 작거나(잡음) 크지(배경) 않다.
+        - border contact: 알약이 사진 가장자리에 닿아 있으면 배경이 섞였을 가능성이 크다.
+        """
+        height, width = bin_mat.shape[:2]
+        min_ratio, max_ratio = __class__.MASK_AREA_RATIO_RANGE
+        area_ratio = contour.area / (height * width)
+        if not min_ratio <= area_ratio <= max_ratio:
+            return 0.0
+        solidity = numpy.clip((contour.convexity - __class__.MASK_MIN_SOLIDITY) / (1 - __class__.MASK_MIN_SOLIDITY), 0, 1)
+        x, y = contour.points[:, 0, 0], contour.points[:, 0, 1]
+        on_border = numpy.count_nonzero((x == 0) | (y == 0) | (x == width - 1) | (y == height - 1))
+        border = 1 - min(1.0, 10 * on_border / len(contour.points))
+        return float(solidity * border)
 
-    def _draw_mask_via_chromakey(self, mat: cv2.typing.MatLike) -> cv2.typing.MatLike:
+    @metrics.timed('mask')
+    def _draw_mask_via_chromakey(self, raw_mat: cv2.typing.MatLike) -> typing.Tuple[cv2.typing.MatLike, ContourDescriptor]:
+        """네 모서리의 색을 배경색으로 보고, 배경색과 다른 영역 중 가장 큰 것을 알약으로 본다."""
         error = 0.075
-        mat = cv2.medianBlur(mat, 5)
+        mat = cv2.medianBlur(raw_mat, 5)
         bg_color = numpy.mean(mat[[0,0,-1,-1],[0,-1,-1,0]], axis=0)
-        lowerb = ((1-error) * bg_color).astype(numpy.uint8)
-        upperb = ((1+error) * bg_color).astype(numpy.uint8)
+        # 어두운 배경에서는 비율만으로는 허용 범위가 센서 잡음보다 좁아진다.
+        tolerance = numpy.maximum(error * bg_color, __class__.CHROMAKEY_MIN_TOLERANCE)
+        lowerb = numpy.clip(bg_color - tolerance, 0, 255).astype(numpy.uint8)
+        upperb = numpy.clip(bg_color + tolerance, 0, 255).astype(numpy.uint8)
         bin_mat = 255 - cv2.inRange(mat, lowerb, upperb)
         bin_mat = cv2.morphologyEx(bin_mat, cv2.MORPH_OPEN, _get_structuring_element(15))
         bin_mat = cv2.morphologyEx(bin_mat, cv2.MORPH_CLOSE, _get_structuring_element(7))
-        return bin_mat
+        contours = cv2.findContours(bin_mat, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]
+        if not contours:
+            raise exceptions.NotDetectedException('알약이 검출되지 않았습니다.')
+        contour = max(contours, key=cv2.contourArea)
+        descriptor = ContourDescriptor.from_contour(contour, __class__.APPROX_EPSILON)
+        bin_mat = numpy.zeros_like(bin_mat)
+        return cv2.drawContours(bin_mat, [contour], -1, 255, -1), descriptor
 
-    def _predict_shape(self) -> ShapeChoices:
-        contours = cv2.findContours(self.bin_mat, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]
+    def _draw_mask_via_contour(self, raw_mat: cv2.typing.MatLike) -> typing.Tuple[cv2.typing.MatLike, ContourDescriptor]:
+        mat = self._white_balance(raw_mat)
+        mat = self._denoise(mat)
+        return self._draw_mask_via_edges(mat)
+
+    @metrics.timed('mask')
+    def _draw_mask_via_edges(self, mat: cv2.typing.MatLike) -> typing.Tuple[cv2.typing.MatLike, ContourDescriptor]:
+        bin_mat = cv2.Canny(mat, 0, 255)
+        bin_mat = cv2.morphologyEx(bin_mat, cv2.MORPH_CLOSE, _get_structuring_element(7))
+        contours = cv2.findContours(bin_mat, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]
         if not contours:
+            # TODO: 검출 실패한 데이터 수집
+            raise exceptions.NotDetectedException('알약이 검출되지 않았습니다.')
+        contour = max(contours, key=lambda cont:cv2.arcLength(cont, True))
+        descriptor = ContourDescriptor.from_contour(contour, __class__.APPROX_EPSILON)
+        bin_mat = numpy.zeros_like(bin_mat)
+        return cv2.drawContours(bin_mat, [contour], -1, 255, -1), descriptor
+
+    @metrics.timed('shape')
+    def _predict_shape(self) -> ShapeChoices:
+        if self.contour.area == 0:
             # TODO: 검출 실패한 데이터 수집
             raise exceptions.ShapeNotDetectedException('알약이 검출되지 않았습니다.')
-        contour =  max(contours, key=lambda cont:cv2.arcLength(cont, True))
-        arc_length = cv2.arcLength(contour, True)
-        approx_contour = cv2.approxPolyDP(contour, __class__.APPROX_EPSILON * arc_length, True)
-        n_vertices = len(approx_contour)
+        return self._classify_shape(self.contour)
+
+    def _classify_shape(self, contour: ContourDescriptor) -> ShapeChoices:
+        n_vertices = contour.n_vertices
         if n_vertices == 3:
             return ShapeChoices.TRIANGLE
         elif n_vertices == 4:
             return ShapeChoices.RECTANGLE
         elif n_vertices == 5:
             return ShapeChoices.PENTAGON
-        elif n_vertices < __class__.CIRCLE_VERTICES:
-            return ShapeChoices.OVAL
-        else:
+        elif n_vertices >= __class__.CIRCLE_VERTICES and contour.elongation <= __class__.CIRCLE_MAX_ELONGATION:
             return ShapeChoices.CIRCLE
+        elif contour.rectangularity >= __class__.OBLONG_MIN_RECTANGULARITY:
+            return ShapeChoices.OBLONG
+        else:
+            return ShapeChoices.OVAL
 
+    @metrics.timed('color')
     def _predict_color(self) -> ColorChoices:
-        colors: typing.List[colorgram.Color]
-        mat = cv2.resize(self.mat, (64, 64))
+        # 알약을 감싸는 영역만 잘라내어, 축소 후에도 알약 픽셀이 최대한 남도록 한다.
+        x, y, w, h = self.contour.bounding_rect
+        mat = cv2.resize(self.mat[y:y+h, x:x+w], __class__.COLOR_SHAPE, interpolation=cv2.INTER_AREA)
         mat = cv2.bilateralFilter(mat, -1, 32.0, 8.0)
-        mat = cv2.cvtColor(mat, cv2.COLOR_BGR2RGB)
-        img = PIL.Image.fromarray(mat)
-        colors = colorgram.extract(img, 2)
-        if len(colors) < 2:
+        mask = cv2.resize(self.bin_mat[y:y+h, x:x+w], __class__.COLOR_SHAPE, interpolation=cv2.INTER_NEAREST)
+        colors = palette.extract(mat, mask, 1, min_proportion=__class__.COLOR_MIN_PROPORTION)
+        if not colors:
             raise exceptions.ColorNotDetectedException('색상이 검출되지 않았습니다.')
-        color = colors[1] # colors[0]는 가장 많은 색상 = 배경 색상이므로 무시한다.
-        munsell = self._to_munsell(color)
-        print(munsell)
-        return munsell.to_color_choice()
-
-    def _to_munsell(self, color: colorgram.Color) -> _MunsellColor:
-        """colorgram이 감지한 색상을 Munsell 색 체계로 변환"""
-        color_rgb = list(map(lambda x: x / 255.0, color.rgb))
-        color_XYZ = colour.RGB_to_XYZ(color_rgb, colour.models.RGB_COLOURSPACE_sRGB)
-        color_xyY = colour.XYZ_to_xyY(color_XYZ)
-        color_munsell = colour.notation.munsell.xyY_to_munsell_specification(color_xyY)
-        return _MunsellColor(
-            hue=color_munsell[0],
-            value=color_munsell[1],
-            chroma=color_munsell[2],
-            code=color_munsell[3],
-        )
+        munsell_color = self._to_munsell(colors[0].rgb)
+        return munsell_color.to_color_choice()
+
+    @metrics.timed('munsell')
+    def _to_munsell(self, rgb: typing.Tuple[int, int, int]) -> _MunsellColor:
+        """sRGB 색상을 Munsell 색 체계로 변환"""
+        spec = munsell.lookup(numpy.array([rgb], dtype=numpy.uint8))[0]
+        if numpy.isnan(spec['value']):
+            raise exceptions.ColorNotDetectedException('색상을 Munsell 색 체계로 변환할 수 없습니다.')
+        return _MunsellColor.from_specification(spec.tolist())
+
+    @metrics.timed('drug')
+    def _predict_drug(self) -> numpy.ndarray:
+        """후보 약품(`DrugFullSpecification`)의 pk 배열, 가능성이 높은 순서
+
+        시각 색인(`visual_index`)이 있으면 (모양, 색상)이 일치하는 후보를 참고 사진과 가까운 순서로 정렬하고,
+        일치하는 후보가 없으면 색인 전체에서 가장 가까운 약품을 찾는다.
+        """
+        index = visual_index.get_index()
+        if index is None:
+            return drug_index.lookup(self.shape, self.color)
+        limit = settings.DRUG_INDEX['LIMIT']
+        self.descriptor = visual_index.describe(self)
+        pks, item_seqs = drug_index.get_index().candidates(self.shape, self.color)
+        if not len(pks):
+            item_seqs, _ = index.search(self.descriptor, limit)
+            return drug_index.get_index().pks_by_item_seq(item_seqs)
+        return pks[index.rank(self.descriptor, item_seqs)[:limit]]
+
+
+class ReferenceImageModel(PredictionModel):
+    """약품 참고 사진(`ITEM_IMAGE`)에서 예측과 같은 방법으로 알약 영역만 찾는다. (`visual_index`)"""
+
+    def __init__(self, mat: cv2.typing.MatLike) -> None:
+        self.raw_shape = mat.shape[:2]
+        raw_mat = self._resize(mat)
+        bin_mat, contour = self._draw_mask(raw_mat)
+
+        self.raw_mat = raw_mat
+        self.mat = cv2.copyTo(raw_mat, bin_mat)
+        self.bin_mat = bin_mat
+        self.contour = contour
+
+
+@dataclasses.dataclass
+class PillDetection:
+    label: int
+    contour: ContourDescriptor
+    shape: ShapeChoices
+    color: ColorChoices
+    bounding_box: typing.Tuple[float, float, float, float]
+    """(x, y, 너비, 높이), 이미지 크기에 대한 0~1 비율"""
+
+
+class MultiPredictionModel(PredictionModel):
+    """사진 한 장에서 여러 개의 알약을 찾는다.
+
+    면적이 충분한 윤곽선을 모두 마스크에 그린 뒤, 연결 요소(connected components)의
+    label 배열 하나로 모든 알약의 색상을 한 번에 계산한다.
+    """
+    MIN_AREA_RATIO = 0.002
+
+    labels: cv2.typing.MatLike
+    pills: typing.List[PillDetection]
+
+    def __init__(self, mat: cv2.typing.MatLike) -> None:
+        self.raw_shape = mat.shape[:2]
+        raw_mat = self._resize(mat)
+        mat = self._white_balance(raw_mat)
+        mat = self._denoise(mat)
+        bin_mat, contours = self._draw_mask_via_contours(mat)
+        mat = cv2.copyTo(raw_mat, bin_mat)
+
+        # 배경색 분리는 가장 큰 영역 하나만 찾으므로 여러 알약에는 윤곽선 검출만 사용한다.
+        self.mask_strategy = 'contour'
+
+        self.raw_mat = raw_mat
+        self.mat = mat
+        self.bin_mat = bin_mat
+        n_labels, self.labels, stats, _ = cv2.connectedComponentsWithStats(bin_mat, connectivity=8)
+
+        # 붙어 있는 알약은 하나의 연결 요소가 되므로, label 마다 가장 큰 윤곽선만 사용한다.
+        by_label: typing.Dict[int, ContourDescriptor] = {}
+        for contour in contours:
+            x, y = contour.points[0][0]
+            label = int(self.labels[y, x])
+            if label and (label not in by_label or by_label[label].area < contour.area):
+                by_label[label] = contour
+
+        colors = self._predict_colors(n_labels, sorted(by_label))
+        height, width = bin_mat.shape[:2]
+        self.pills = [
+            PillDetection(
+                label=label,
+                contour=contour,
+                shape=self._classify_shape(contour),
+                color=colors[label],
+                bounding_box=(
+                    round(float(stats[label, cv2.CC_STAT_LEFT] / width), 4),
+                    round(float(stats[label, cv2.CC_STAT_TOP] / height), 4),
+                    round(float(stats[label, cv2.CC_STAT_WIDTH] / width), 4),
+                    round(float(stats[label, cv2.CC_STAT_HEIGHT] / height), 4),
+                ),
+            )
+            for label, contour in sorted(by_label.items())
+        ]
+        if not self.pills:
+            raise exceptions.NotDetectedException('알약이 검출되지 않았습니다.')
+
+    @metrics.timed('mask')
+    def _draw_mask_via_contours(self, mat: cv2.typing.MatLike) -> typing.Tuple[cv2.typing.MatLike, typing.List[ContourDescriptor]]:
+        bin_mat = cv2.Canny(mat, 0, 255)
+        bin_mat = cv2.morphologyEx(bin_mat, cv2.MORPH_CLOSE, _get_structuring_element(7))
+        contours = cv2.findContours(bin_mat, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_NONE)[-2]
+        min_area = __class__.MIN_AREA_RATIO * bin_mat.shape[0] * bin_mat.shape[1]
+        contours = [contour for contour in contours if cv2.contourArea(contour) >= min_area]
+        if not contours:
+            # TODO: 검출 실패한 데이터 수집
+            raise exceptions.NotDetectedException('알약이 검출되지 않았습니다.')
+        bin_mat = numpy.zeros_like(bin_mat)
+        cv2.drawContours(bin_mat, contours, -1, 255, -1)
+        return bin_mat, [ContourDescriptor.from_contour(contour, __class__.APPROX_EPSILON) for contour in contours]
 
-    def _predict_drug(self) -> typing.Optional[Drug]:
-        return Drug.objects.filter(
-            color=self.color,
-            shape=self.shape,
-        ).first()
+    @metrics.timed('color')
+    def _predict_colors(self, n_labels: int, labels: typing.List[int]) -> typing.Dict[int, ColorChoices]:
+        """`labels` 각각의 대표 색상. 색상을 정할 수 없으면 UNKNOWN"""
+        rgbs, counts = palette.extract_by_label(self.mat, self.labels, n_labels)
+        with metrics.timing('munsell'):
+            specs = munsell.lookup(rgbs[labels])
+        colors = {}
+        for label, spec in zip(labels, specs):
+            if numpy.isnan(spec['value']):
+                colors[label] = ColorChoices.UNKNOWN
+                continue
+            try:
+                colors[label] = _MunsellColor.from_specification(spec.tolist()).to_color_choice()
+            except KeyError:
+                colors[label] = ColorChoices.UNKNOWN
+        return colors
 
 
 @functools.cache
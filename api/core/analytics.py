@@ -0,0 +1,204 @@
+"""예측 통계 집계 (`PredictionRollup`)
+
+예측이 끝날 때마다 (정시 구간, 모양, 색상, 결과)별 건수와 지연 시간 합계를 더해 두므로,
+대시보드 조회는 `Prediction` 을 읽지 않고 구간 수만큼의 집계 행만 읽는다.
+
+- 결과(`outcome`)는 검출(DONE), 검출 실패(검출되지 않았거나 여러 개 검출), 그 밖의 오류로 나눈다.
+- 지연 시간은 요청 시각(`requested_at`)부터 결과를 저장한 시각(`created_at`)까지다.
+- 동기 예측이 실패하면 `Prediction` 이 만들어지지 않으므로 모양, 색상을 UNKNOWN 으로 하여 따로 더한다.
+  이 건수는 `backfill_prediction_rollups` 로 다시 만들 수 없다.
+"""
+import collections
+import contextlib
+import datetime
+import typing
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q, Sum
+from django.utils import timezone
+
+from api.core.exceptions import ColorNotDetectedException, MultipleDetectedException, NotDetectedException, ShapeNotDetectedException
+from api.models import ColorChoices, Prediction, PredictionOutcomeChoices, PredictionRollup, PredictionStatusChoices, ShapeChoices
+
+
+BUCKET = datetime.timedelta(hours=1)
+TERMINAL_STATUSES = (PredictionStatusChoices.DONE, PredictionStatusChoices.FAILED)
+
+# 작업자는 APIException 의 detail 을 `error` 로 저장한다. (`jobs.process`)
+_NOT_DETECTED_ERRORS = {
+    str(cls.default_detail)
+    for cls in (NotDetectedException, ColorNotDetectedException, ShapeNotDetectedException, MultipleDetectedException)
+}
+
+# (bucket, shape, color, outcome) → [건수, 지연 시간 합계]
+Increments = typing.Dict[typing.Tuple[datetime.datetime, str, str, str], typing.List[float]]
+
+
+def bucket_of(moment: datetime.datetime) -> datetime.datetime:
+    return moment.astimezone(datetime.timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def outcome_of(status: str, error: typing.Optional[str]) -> str:
+    if status == PredictionStatusChoices.DONE:
+        return PredictionOutcomeChoices.DETECTED
+    if error in _NOT_DETECTED_ERRORS:
+        return PredictionOutcomeChoices.NOT_DETECTED
+    return PredictionOutcomeChoices.ERROR
+
+
+def outcome_of_exception(e: Exception) -> str:
+    if isinstance(e, (NotDetectedException, MultipleDetectedException)):
+        return PredictionOutcomeChoices.NOT_DETECTED
+    return PredictionOutcomeChoices.ERROR
+
+
+def add(
+    increments: Increments,
+    requested_at: datetime.datetime,
+    finished_at: datetime.datetime,
+    shape: str,
+    color: str,
+    outcome: str,
+) -> None:
+    value = increments.setdefault((bucket_of(requested_at), shape, color, outcome), [0, 0.0])
+    value[0] += 1
+    value[1] += max((finished_at - requested_at).total_seconds(), 0.0)
+
+
+def apply(increments: Increments) -> None:
+    """집계 행에 더한다. 행이 없으면 만들고, 다른 요청이 먼저 만들었으면 다시 더한다."""
+    for (bucket, shape, color, outcome), (count, latency_sum) in increments.items():
+        key = dict(bucket=bucket, shape=shape, color=color, outcome=outcome)
+        changes = dict(count=F('count') + count, latency_sum=F('latency_sum') + latency_sum)
+        if PredictionRollup.objects.filter(**key).update(**changes):
+            continue
+        try:
+            with transaction.atomic():
+                PredictionRollup.objects.create(**key, count=count, latency_sum=latency_sum)
+        except IntegrityError:
+            PredictionRollup.objects.filter(**key).update(**changes)
+
+
+def record(predictions: typing.Iterable[Prediction]) -> None:
+    """끝난(DONE, FAILED) 예측을 집계에 더한다. 저장한 직후에 호출한다."""
+    if not settings.PREDICTION_ANALYTICS['ENABLED']:
+        return
+    increments: Increments = {}
+    for prediction in predictions:
+        if prediction.status not in TERMINAL_STATUSES:
+            continue
+        add(
+            increments, prediction.requested_at, prediction.created_at,
+            prediction.shape, prediction.color, outcome_of(prediction.status, prediction.error),
+        )
+    apply(increments)
+
+
+def record_failures(requested_at: datetime.datetime, errors: typing.Iterable[Exception]) -> None:
+    """`Prediction` 을 만들지 못한 동기 예측의 실패를 더한다."""
+    if not settings.PREDICTION_ANALYTICS['ENABLED']:
+        return
+    increments: Increments = {}
+    now = timezone.now()
+    for e in errors:
+        add(increments, requested_at, now, ShapeChoices.UNKNOWN, ColorChoices.UNKNOWN, outcome_of_exception(e))
+    apply(increments)
+
+
+@contextlib.contextmanager
+def recording_failure(requested_at: datetime.datetime) -> typing.Iterator[None]:
+    """블록 안에서 발생한 예외를 실패로 더하고 그대로 다시 발생시킨다."""
+    try:
+        yield
+    except Exception as e:
+        record_failures(requested_at, [e])
+        raise
+
+
+def backfill(
+    since: typing.Optional[datetime.datetime],
+    until: datetime.datetime,
+    batch_size: int,
+    progress: typing.Optional[typing.Callable[[int], None]] = None,
+) -> int:
+    """[since, until) 구간의 집계를 지우고 `Prediction` 에서 다시 만든다. 다시 더한 예측 수를 돌려준다.
+
+    (requested_at, pk) 순서로 `batch_size` 개씩 읽으므로, 읽은 묶음보다 앞선 구간은 더 바뀌지 않는다.
+    그 구간의 집계 행만 한꺼번에 저장하고 버리므로 메모리 사용량은 묶음 크기에 비례한다.
+    `until` 은 정시여야 하며, 이후 구간에 더해지는 예측과 겹치지 않도록 현재 시각 이전으로 둔다.
+    """
+    rollups = PredictionRollup.objects.filter(bucket__lt=until)
+    predictions = Prediction.objects.filter(status__in=TERMINAL_STATUSES, requested_at__lt=until)
+    if since is not None:
+        since = bucket_of(since)
+        rollups = rollups.filter(bucket__gte=since)
+        predictions = predictions.filter(requested_at__gte=since)
+    rollups.delete()
+
+    def flush(before: typing.Optional[datetime.datetime]):
+        keys = [key for key in increments if before is None or key[0] < before]
+        PredictionRollup.objects.bulk_create([
+            PredictionRollup(bucket=bucket, shape=shape, color=color, outcome=outcome, count=count, latency_sum=latency_sum)
+            for (bucket, shape, color, outcome), (count, latency_sum) in ((key, increments.pop(key)) for key in keys)
+        ], batch_size=1000)
+
+    increments: Increments = {}
+    done = 0
+    last: typing.Optional[typing.Tuple[datetime.datetime, int]] = None
+    while True:
+        batch = predictions.order_by('requested_at', 'pk')
+        if last is not None:
+            batch = batch.filter(Q(requested_at__gt=last[0]) | Q(requested_at=last[0], pk__gt=last[1]))
+        batch = list(batch.values_list('pk', 'requested_at', 'created_at', 'shape', 'color', 'status', 'error')[:batch_size])
+        if not batch:
+            flush(None)
+            return done
+        for _, requested_at, created_at, shape, color, status, error in batch:
+            add(increments, requested_at, created_at, shape, color, outcome_of(status, error))
+        last = (batch[-1][1], batch[-1][0])
+        flush(bucket_of(last[0]))
+        done += len(batch)
+        if progress is not None:
+            progress(done)
+
+
+def summarize(since: datetime.datetime, until: datetime.datetime) -> typing.List[typing.Dict[str, typing.Any]]:
+    """[since, until) 의 구간별 통계. 예측이 없는 구간도 0 으로 채운다."""
+    first = bucket_of(since)
+    rollups = PredictionRollup.objects.filter(bucket__gte=first, bucket__lt=until).order_by()
+    detected = rollups.filter(outcome=PredictionOutcomeChoices.DETECTED)
+    buckets: typing.Dict[datetime.datetime, typing.Dict[str, typing.Any]] = {}
+    bucket = first
+    while bucket < until:
+        buckets[bucket] = {
+            'outcomes': collections.Counter(),
+            'shapes': collections.Counter(),
+            'colors': collections.Counter(),
+            'latency_sum': 0.0,
+        }
+        bucket += BUCKET
+
+    # 구간과 결과, 모양, 색상별 합계는 DB 에서 구하므로 읽는 행 수는 구간 수에 비례한다.
+    for bucket, outcome, count, latency_sum in rollups.values_list('bucket', 'outcome').annotate(Sum('count'), Sum('latency_sum')):
+        summary = buckets[bucket_of(bucket)]
+        summary['outcomes'][outcome] += count
+        summary['latency_sum'] += latency_sum
+    for field in ('shape', 'color'):
+        for bucket, value, count in detected.values_list('bucket', field).annotate(Sum('count')):
+            buckets[bucket_of(bucket)][f'{field}s'][value] += count
+
+    results = []
+    for bucket, summary in buckets.items():
+        count = sum(summary['outcomes'].values())
+        failed = count - summary['outcomes'][PredictionOutcomeChoices.DETECTED]
+        results.append({
+            'bucket': bucket.isoformat().replace('+00:00', 'Z'),
+            'count': count,
+            **{outcome: summary['outcomes'][outcome] for outcome in PredictionOutcomeChoices.values},
+            'failure_rate': failed / count if count else None,
+            'mean_latency': summary['latency_sum'] / count if count else None,
+            'shapes': dict(summary['shapes'].most_common()),
+            'colors': dict(summary['colors'].most_common()),
+        })
+    return results
@@ -0,0 +1,107 @@
+"""약품 목록 버전과 조회 응답 캐시
+
+약품 목록은 `UploadView` 로 시트를 올릴 때만 바뀐다. 시트를 반영하는 transaction 안에서
+`CatalogueVersion` 을 1 올리므로, 커밋되는 순간 모든 프로세스가 새 버전을 보게 된다.
+
+검색/조회 응답은 (버전, 요청)으로 만든 키로 Django 캐시(`CATALOGUE_CACHE['ALIAS']`)에 저장한다.
+같은 버전에서 같은 요청의 응답은 항상 같으므로 이 키를 강한 ETag 로도 사용하고,
+`If-None-Match` 가 일치하면 검색 쿼리를 실행하지 않고 304 를 돌려준다.
+버전이 바뀌면 키가 달라지므로 이전 항목은 지울 필요 없이 `TIMEOUT` 이 지나면 사라진다.
+"""
+import dataclasses
+import hashlib
+import typing
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import F
+from django.http import HttpRequest, HttpResponse, HttpResponseNotModified
+from django.utils.cache import parse_etags
+
+from api.core import metrics
+from api.models import CatalogueVersion
+
+
+def get_version() -> int:
+    return CatalogueVersion.objects.filter(pk=1).values_list('version', flat=True).first() or 0
+
+
+async def aget_version() -> int:
+    return await CatalogueVersion.objects.filter(pk=1).values_list('version', flat=True).afirst() or 0
+
+
+def bump() -> int:
+    """시트를 반영하는 transaction 안에서 호출하고 새 버전을 반환한다. 행 잠금으로 동시에 올린 시트도 버전이 겹치지 않는다.
+
+    버전 행은 마이그레이션(0008)이 만들어 두므로 올리기만 한다.
+    """
+    CatalogueVersion.objects.filter(pk=1).update(version=F('version') + 1)
+    return CatalogueVersion.objects.values_list('version', flat=True).get(pk=1)
+
+
+@dataclasses.dataclass
+class Lookup:
+    key: str
+    etag: str
+    content: typing.Optional[bytes] = None
+    not_modified: bool = False
+
+
+def _cache():
+    return caches[settings.CATALOGUE_CACHE['ALIAS']]
+
+
+def _key(version: int, request: HttpRequest, media_type: str) -> str:
+    # 응답의 next/previous 링크가 Host 와 쿼리 문자열을 그대로 사용하므로 정규화하지 않는다.
+    raw = '\n'.join([request.get_host(), request.get_full_path(), media_type])
+    return f'catalogue:{version}:{hashlib.sha256(raw.encode()).hexdigest()[:32]}'
+
+
+def lookup(request: HttpRequest, version: int, media_type: str) -> Lookup:
+    """`If-None-Match` 와 캐시를 확인한다. 둘 다 아니면 `content` 가 None 이며 응답을 만든 뒤 `store` 한다."""
+    key = _key(version, request, media_type)
+    result = Lookup(key=key, etag=f'"{key.split(":", 1)[1]}"')
+    if result.etag in parse_etags(request.META.get('HTTP_IF_NONE_MATCH', '')):
+        result.not_modified = True
+        metrics.count_catalogue_cache('not_modified')
+        return result
+    result.content = _cache().get(key)
+    metrics.count_catalogue_cache('miss' if result.content is None else 'hit')
+    return result
+
+
+def store(result: Lookup, content: bytes) -> None:
+    _cache().set(result.key, content, settings.CATALOGUE_CACHE['TIMEOUT'])
+
+
+def cached_response(result: Lookup, content_type: str) -> HttpResponse:
+    if result.not_modified:
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(result.content, content_type=content_type)
+    response['ETag'] = result.etag
+    return response
+
+
+class CachedCatalogueMixin:
+    """DRF 조회 view 의 JSON 응답을 약품 목록 버전별로 캐시하고 ETag/304 를 처리한다. GET 은 `list` 가 처리한다."""
+
+    def get(self, request, *args, **kwargs):
+        self._catalogue_lookup = None
+        renderer = request.accepted_renderer
+        if not settings.CATALOGUE_CACHE['ENABLED'] or renderer.format != 'json':
+            return self.list(request, *args, **kwargs)
+        result = lookup(request, get_version(), renderer.media_type)
+        if result.not_modified or result.content is not None:
+            return cached_response(result, renderer.media_type)
+        self._catalogue_lookup = result
+        return self.list(request, *args, **kwargs)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        response = super().finalize_response(request, response, *args, **kwargs)
+        result = getattr(self, '_catalogue_lookup', None)
+        if result is not None and response.status_code == 200:
+            response.render()
+            store(result, response.content)
+            response['ETag'] = result.etag
+        return response
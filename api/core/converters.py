@@ -1,15 +1,128 @@
-import cv2
+"""업로드 파일과 OpenCV 이미지 사이의 변환
+
+cv2 는 불러오는 데 오래 걸리므로, 검색만 처리하는 워커나 관리 명령이 비용을 치르지 않도록
+실제로 변환할 때 불러온다.
+"""
+from __future__ import annotations
+
+import contextlib
+import functools
+import io
+import mmap
+import os
+import typing
+
 import numpy
 
 from django.core.files import File
 from django.core.files.base import ContentFile
 
+from api.core import metrics
+
+if typing.TYPE_CHECKING:
+    import cv2
+
+
+Buffer = typing.Union[bytes, bytearray, memoryview, mmap.mmap]
+
+# 원본 이미지를 이 크기보다 작아지지 않는 범위에서 최대한 축소하여 디코딩한다. (PredictionModel.IMG_SHAPE)
+DECODE_MIN_SHAPE = (256, 256)
+
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
+
+@contextlib.contextmanager
+def open_file_buffer(file: File) -> typing.Iterator[memoryview]:
+    """파일 내용을 복사하지 않고 읽는 버퍼
+
+    메모리에 올라온 업로드는 `BytesIO` 의 버퍼를, 디스크에 있는 파일(큰 임시 업로드 등)은
+    mmap 을 그대로 노출한다. 둘 다 아니면 한 번 읽어서 반환한다.
+    """
+    f = getattr(file, 'file', file)
+    if isinstance(f, io.BytesIO):
+        with f.getbuffer() as view:
+            yield view
+        return
+    try:
+        fileno = f.fileno()
+    except (AttributeError, io.UnsupportedOperation, OSError):
+        fileno = None
+    if fileno is not None and os.fstat(fileno).st_size:
+        with mmap.mmap(fileno, 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+            yield view
+        return
+    f.seek(0)
+    yield memoryview(f.read())
+
+
+def read_image_size(buf: Buffer) -> typing.Optional[typing.Tuple[int, int]]:
+    """디코딩하지 않고 PNG/JPEG 헤더에서 (너비, 높이)를 읽는다. 알 수 없는 형식이면 None"""
+    buf = memoryview(buf)
+    if buf[:8] == b'\x89PNG\r\n\x1a\n' and buf[12:16] == b'IHDR':
+        return int.from_bytes(buf[16:20], 'big'), int.from_bytes(buf[20:24], 'big')
+    if buf[:2] != b'\xff\xd8':
+        return None
+    i, n = 2, len(buf)
+    while i + 9 < n:
+        if buf[i] != 0xFF:
+            i += 1
+            continue
+        marker = buf[i + 1]
+        if marker == 0xFF:
+            i += 1
+        elif marker == 0x01 or 0xD0 <= marker <= 0xD8:
+            i += 2
+        elif marker in _JPEG_SOF_MARKERS:
+            return int.from_bytes(buf[i + 7:i + 9], 'big'), int.from_bytes(buf[i + 5:i + 7], 'big')
+        else:
+            i += 2 + int.from_bytes(buf[i + 2:i + 4], 'big')
+    return None
+
+
+@functools.cache
+def _get_reduced_decode_flags() -> typing.Tuple[typing.Tuple[int, int], ...]:
+    import cv2
+
+    return (
+        (8, cv2.IMREAD_REDUCED_COLOR_8),
+        (4, cv2.IMREAD_REDUCED_COLOR_4),
+        (2, cv2.IMREAD_REDUCED_COLOR_2),
+    )
+
+
+def _get_decode_flags(buf: Buffer, min_shape: typing.Tuple[int, int]) -> int:
+    import cv2
+
+    size = read_image_size(buf)
+    if size is not None:
+        width, height = size
+        for factor, flags in _get_reduced_decode_flags():
+            if width // factor >= min_shape[0] and height // factor >= min_shape[1]:
+                return flags
+    return cv2.IMREAD_COLOR
+
+
+def convert_file_to_mat(file: File, min_shape: typing.Tuple[int, int] = DECODE_MIN_SHAPE) -> cv2.Mat:
+    with open_file_buffer(file) as buf:
+        return convert_bytes_to_mat(buf, min_shape)
+
+
+@metrics.timed('decode')
+def convert_bytes_to_mat(data: Buffer, min_shape: typing.Tuple[int, int] = DECODE_MIN_SHAPE) -> cv2.Mat:
+    """이미지를 디코딩한다. `min_shape` 보다 충분히 크면 OpenCV 의 축소 디코딩을 사용한다."""
+    import cv2
+
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    return cv2.imdecode(buf, _get_decode_flags(data, min_shape))
+
+
+@metrics.timed('encode')
+def convert_mat_to_bytes(mat: cv2.Mat, ext: str = '.png', params: typing.Sequence[int] = ()) -> bytes:
+    import cv2
 
-def convert_file_to_mat(file: File) -> cv2.Mat:
-    buf = numpy.asarray(bytearray(file.file.read()), dtype=numpy.uint8)
-    return cv2.imdecode(buf, cv2.IMREAD_COLOR)
+    ret, buf = cv2.imencode(ext, mat, params)
+    return buf.tobytes()
 
 
 def convert_mat_to_file(mat: cv2.Mat, filename: str = 'image.png') -> File:
-    ret, buf = cv2.imencode('.png', mat)
-    return ContentFile(buf.tobytes(), name=filename)
+    return ContentFile(convert_mat_to_bytes(mat), name=filename)
@@ -0,0 +1,208 @@
+"""(모양, 색상)으로 약품 후보를 찾는 메모리 내 색인
+
+`DrugFullSpecification` 전체를 한 번 읽어 (모양, 색상)별로 정렬된 정수 배열을 만들어 두므로,
+예측마다 DB 를 조회하지 않고 상위 N개의 후보를 돌려줄 수 있다.
+
+색인은 약품 목록 버전(`catalogue`)이 바뀌었을 때만 다시 만든다. 버전 확인과 다시 만드는 일은
+백그라운드 스레드에서 하고, 그동안 요청은 이전 색인을 그대로 사용한다.
+`UploadView` 는 새 시트를 반영한 직후 `refresh()` 를 호출하고, 다른 프로세스에서 반영된 업로드는
+`DRUG_INDEX['CHECK_INTERVAL']` 초마다 버전을 확인하여 따라잡는다.
+"""
+import functools
+import re
+import threading
+import time
+import typing
+
+import numpy
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from api.core import catalogue
+from api.models import ColorChoices, DrugFullSpecification, ShapeChoices
+
+
+Key = typing.Tuple[str, str]
+
+# 앞면 색상이 일치하면 뒷면만 일치하는 경우보다 우선한다.
+SCORE_FRONT = 2
+SCORE_BACK = 1
+
+_SHAPE_ALIASES = {
+    '마름모형': ShapeChoices.DIAMOND,
+    '사각형': ShapeChoices.RECTANGLE,
+}
+
+
+def _label_words(label: str) -> typing.List[str]:
+    """'R - 빨강(적)' → ['빨강', '적']"""
+    return re.findall(r'[가-힣]+', label)
+
+
+_SHAPES_BY_WORD = {
+    **{label: ShapeChoices(value) for value, label in ShapeChoices.choices},
+    **_SHAPE_ALIASES,
+}
+_COLORS_BY_WORD = {
+    word: ColorChoices(value)
+    for value, label in ColorChoices.choices if value != ColorChoices.UNKNOWN
+    for word in _label_words(label)
+}
+
+
+def parse_shape(drug_shape: typing.Optional[str]) -> ShapeChoices:
+    return _SHAPES_BY_WORD.get((drug_shape or '').strip(), ShapeChoices.UNKNOWN)
+
+
+def parse_colors(color_class: typing.Optional[str]) -> typing.List[ColorChoices]:
+    """'하양, 노랑' 처럼 여러 색상이 적힌 경우도 있으므로 목록으로 반환"""
+    colors = []
+    for word in _label_words(color_class or ''):
+        color = _COLORS_BY_WORD.get(word)
+        if color is not None and color not in colors:
+            colors.append(color)
+    return colors
+
+
+class DrugIndex:
+    """(모양, 색상) → 점수 순으로 정렬된 `DrugFullSpecification` pk 배열 (와 같은 순서의 ITEM_SEQ 배열)"""
+
+    def __init__(
+        self,
+        records: typing.Dict[Key, typing.Tuple[numpy.ndarray, numpy.ndarray, numpy.ndarray]],
+        item_seqs: numpy.ndarray,
+        pks: numpy.ndarray,
+    ) -> None:
+        self._records = records
+        # ITEM_SEQ 오름차순. ITEM_SEQ → pk 변환에 사용한다.
+        self._item_seqs = item_seqs
+        self._pks = pks
+        self.size = len(item_seqs)
+
+    @classmethod
+    def build(cls) -> 'DrugIndex':
+        buckets: typing.Dict[Key, typing.List[typing.Tuple[int, int, int]]] = {}
+        rows = DrugFullSpecification.objects.values_list('pk', 'ITEM_SEQ', 'DRUG_SHAPE', 'COLOR_CLASS1', 'COLOR_CLASS2')
+        all_pks, all_item_seqs = [], []
+        for pk, item_seq, drug_shape, color_front, color_back in rows.iterator(chunk_size=2000):
+            all_pks.append(pk)
+            all_item_seqs.append(item_seq)
+            shape = parse_shape(drug_shape)
+            scores: typing.Dict[str, int] = {}
+            for color in parse_colors(color_back):
+                scores[color] = SCORE_BACK
+            for color in parse_colors(color_front):
+                scores[color] = SCORE_FRONT
+            for color, score in scores.items():
+                buckets.setdefault((shape, color), []).append((pk, score, item_seq))
+
+        records = {}
+        for key, items in buckets.items():
+            pks = numpy.fromiter((pk for pk, _, _ in items), dtype=numpy.int64, count=len(items))
+            scores = numpy.fromiter((score for _, score, _ in items), dtype=numpy.int8, count=len(items))
+            item_seqs = numpy.fromiter((item_seq for _, _, item_seq in items), dtype=numpy.int64, count=len(items))
+            order = numpy.lexsort((pks, -scores))
+            records[key] = (pks[order], scores[order], item_seqs[order])
+        item_seqs = numpy.array(all_item_seqs, dtype=numpy.int64)
+        order = numpy.argsort(item_seqs)
+        return cls(records, item_seqs[order], numpy.array(all_pks, dtype=numpy.int64)[order])
+
+    def lookup(self, shape: str, color: str, limit: typing.Optional[int] = None) -> numpy.ndarray:
+        """후보 pk 배열 (점수 내림차순, 같은 점수 안에서는 pk 오름차순)"""
+        record = self._records.get((shape, color))
+        if record is None:
+            return numpy.empty(0, dtype=numpy.int64)
+        return record[0][:limit]
+
+    def candidates(self, shape: str, color: str) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """(모양, 색상)이 일치하는 모든 후보의 (pk 배열, ITEM_SEQ 배열). 순서는 `lookup` 과 같다."""
+        record = self._records.get((shape, color))
+        if record is None:
+            return numpy.empty(0, dtype=numpy.int64), numpy.empty(0, dtype=numpy.int64)
+        return record[0], record[2]
+
+    def pks_by_item_seq(self, item_seqs: numpy.ndarray) -> numpy.ndarray:
+        """ITEM_SEQ 배열에 해당하는 pk 배열. DB 에 없는 ITEM_SEQ 는 제외한다."""
+        positions = numpy.searchsorted(self._item_seqs, item_seqs)
+        positions = numpy.minimum(positions, max(len(self._item_seqs) - 1, 0))
+        found = self._item_seqs[positions] == item_seqs if len(self._item_seqs) else numpy.zeros(len(item_seqs), dtype=bool)
+        return self._pks[positions[found]]
+
+
+_index: typing.Optional[DrugIndex] = None
+_version: typing.Optional[int] = None
+_checked_at = 0.0
+_lock = threading.Lock()
+# 처음 만들 때와 다시 만들 때가 겹치지 않게 한다. `_lock` 은 색인을 바꿔 끼울 때만 잡는다.
+_build_lock = threading.Lock()
+
+
+def get_index() -> DrugIndex:
+    """현재 프로세스의 색인. 처음 한 번만 요청 스레드에서 만들고, 그 뒤로는 버전 확인을 백그라운드에 맡긴다."""
+    global _checked_at
+    index = _index
+    if index is None:
+        return _build()
+    with _lock:
+        due = time.monotonic() - _checked_at > settings.DRUG_INDEX['CHECK_INTERVAL']
+        if due:
+            _checked_at = time.monotonic()
+    if due:
+        refresh()
+    return index
+
+
+def _build() -> DrugIndex:
+    with _build_lock:
+        if _index is None:
+            _swap(catalogue.get_version(), DrugIndex.build())
+        return _index
+
+
+def _swap(version: int, index: DrugIndex) -> None:
+    global _index, _version, _checked_at
+    with _lock:
+        _index = index
+        _version = version
+        _checked_at = time.monotonic()
+
+
+@functools.cache
+def get_refresher():
+    """버전을 확인하고 색인을 다시 만드는 스레드. 하나뿐이므로 다시 만드는 일이 겹치지 않는다."""
+    import concurrent.futures
+
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='drug-index')
+
+
+def refresh() -> None:
+    """약품 목록 버전이 바뀌었으면 백그라운드에서 색인을 다시 만든다. 업로드가 커밋된 직후에도 호출한다."""
+    get_refresher().submit(_refresh)
+
+
+def _refresh() -> None:
+    close_old_connections()
+    try:
+        # 만드는 도중에 다른 시트가 반영되면 버전이 달라 다음 확인 때 다시 만든다.
+        version = catalogue.get_version()
+        if _index is None or version == _version:
+            return
+        with _build_lock:
+            _swap(version, DrugIndex.build())
+    finally:
+        close_old_connections()
+
+
+def invalidate() -> None:
+    """색인을 버린다. 다음 조회가 요청 스레드에서 새로 만든다. (벤치마크용)"""
+    global _index, _version
+    with _lock:
+        _index = None
+        _version = None
+
+
+def lookup(shape: str, color: str, limit: typing.Optional[int] = None) -> numpy.ndarray:
+    if limit is None:
+        limit = settings.DRUG_INDEX['LIMIT']
+    return get_index().lookup(shape, color, limit)
@@ -22,3 +22,21 @@ class ColorNotDetectedException(NotDetectedException):
 class ShapeNotDetectedException(NotDetectedException):
     default_detail = 'Shape detection failed.'
     default_code = 'shape_detection_error'
+
+
+class PredictionBusyException(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Prediction queue is full, try again later.'
+    default_code = 'prediction_busy'
+
+
+class PredictionCrashedException(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Prediction worker crashed, try again.'
+    default_code = 'prediction_crashed'
+
+
+class PredictionTimeoutException(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Prediction timed out.'
+    default_code = 'prediction_timeout'
@@ -0,0 +1,259 @@
+"""예측 파이프라인 실행기
+
+`PredictionModel` 은 CPU 를 오래 점유하므로, 설정에 따라 사전에 준비(warm-up)된
+프로세스 풀에서 실행한다. 풀에는 원본 이미지 바이트를 넘기고, 결과로 모양/색상과
+마스킹된 이미지/마스크 배열을 돌려받는다. 인코딩과 저장은 `media` 가 응답 이후에 처리한다.
+"""
+import concurrent.futures
+import concurrent.futures.process
+import contextvars
+import dataclasses
+import functools
+import multiprocessing
+import os
+import threading
+import typing
+
+import numpy
+
+from django.conf import settings
+
+from api.core import converters, exceptions, metrics
+
+
+@dataclasses.dataclass
+class PredictionResult:
+    shape: str
+    color: str
+    mask_strategy: str
+    image: numpy.ndarray
+    mask_image: numpy.ndarray
+    # 시각 색인으로 정렬한 후보 pk. 색인이 없으면 None (조회 시 (모양, 색상)으로 찾는다)
+    candidates: typing.Optional[typing.List[int]] = None
+    timings: metrics.Timings = dataclasses.field(default_factory=list)
+
+
+def run(data: converters.Buffer) -> PredictionResult:
+    """원본 이미지 바이트로 예측 파이프라인을 실행한다. (풀 워커 또는 요청 스레드에서 호출)"""
+    from api.core.algorithms import PredictionModel
+
+    with metrics.collect() as timings:
+        try:
+            model = PredictionModel(converters.convert_bytes_to_mat(data, PredictionModel.IMG_SHAPE))
+        except exceptions.NotDetectedException as e:
+            metrics.count(type(e).__name__)
+            raise
+        metrics.count('detected')
+        metrics.count_mask_strategy(model.mask_strategy)
+    return PredictionResult(
+        shape=model.shape,
+        color=model.color,
+        mask_strategy=model.mask_strategy,
+        image=model.mat,
+        mask_image=model.bin_mat,
+        candidates=model.candidates.tolist() if model.descriptor is not None else None,
+        timings=list(timings),
+    )
+
+
+@dataclasses.dataclass
+class PillResult:
+    shape: str
+    color: str
+    bounding_box: typing.Tuple[float, float, float, float]
+    mask_image: numpy.ndarray
+
+
+@dataclasses.dataclass
+class MultiPredictionResult:
+    image: numpy.ndarray
+    mask_strategy: str
+    pills: typing.List[PillResult]
+    timings: metrics.Timings = dataclasses.field(default_factory=list)
+
+
+def run_multiple(data: converters.Buffer) -> MultiPredictionResult:
+    """사진 한 장에서 찾은 알약마다 모양/색상/위치와 마스크를 반환한다."""
+    from api.core.algorithms import MultiPredictionModel
+
+    with metrics.collect() as timings:
+        try:
+            model = MultiPredictionModel(converters.convert_bytes_to_mat(data, MultiPredictionModel.IMG_SHAPE))
+        except exceptions.NotDetectedException as e:
+            metrics.count(type(e).__name__)
+            raise
+        metrics.count('detected')
+        metrics.count_mask_strategy(model.mask_strategy)
+        pills = [
+            PillResult(
+                shape=pill.shape,
+                color=pill.color,
+                bounding_box=pill.bounding_box,
+                mask_image=(model.labels == pill.label).astype('uint8') * 255,
+            )
+            for pill in model.pills
+        ]
+    return MultiPredictionResult(image=model.mat, mask_strategy=model.mask_strategy, pills=pills, timings=list(timings))
+
+
+def warm_up() -> None:
+    """무거운 모듈을 불러오고 캐시를 채워, 첫 요청이 초기화 비용을 치르지 않도록 한다."""
+    import colour.notation.munsell # noqa: F401
+
+    from api.core import algorithms, munsell
+
+    converters._get_reduced_decode_flags()
+    algorithms._get_white_balancer()
+    for ksize in (7, 15):
+        algorithms._get_structuring_element(ksize)
+    munsell.get_table()
+
+
+def _init_worker(keep_metrics_local: bool = False) -> None:
+    import django
+
+    django.setup()
+    # spawn 된 워커는 설정을 새로 읽으므로, 부모가 `metrics.keep_local()` 을 호출했으면 따른다.
+    if keep_metrics_local:
+        metrics.keep_local()
+    warm_up()
+
+
+def _ping() -> None:
+    pass
+
+
+class PredictionExecutor:
+    """동시에 처리 중인 작업 수를 제한하는 프로세스 풀
+
+    `workers + queue_size` 개를 넘는 작업이 밀려 있으면 즉시 `PredictionBusyException` (503)을,
+    작업이 `timeout` 초 안에 끝나지 않으면 `PredictionTimeoutException` 을 발생시킨다.
+    워커가 비정상 종료되면 풀을 더 쓸 수 없으므로 `broken` 으로 표시하고 `PredictionCrashedException` 을 발생시킨다.
+    """
+
+    def __init__(self, workers: int, queue_size: int, timeout: float, start_method: str) -> None:
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(workers + queue_size)
+        self._pool = concurrent.futures.ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context(start_method),
+            initializer=_init_worker,
+            initargs=(settings.METRICS['DIR'] is None,),
+        )
+        self._workers = workers
+        self.broken = False
+
+    def start(self) -> None:
+        """모든 워커 프로세스를 미리 띄우고 초기화가 끝날 때까지 기다린다."""
+        futures = [self._pool.submit(_ping) for _ in range(self._workers)]
+        concurrent.futures.wait(futures)
+
+    def submit(self, data: converters.Buffer, func: typing.Callable = run):
+        if not self._slots.acquire(blocking=False):
+            raise exceptions.PredictionBusyException()
+        try:
+            future = self._pool.submit(func, bytes(data))
+        except concurrent.futures.process.BrokenProcessPool:
+            self._slots.release()
+            self.broken = True
+            raise exceptions.PredictionCrashedException()
+        except BaseException:
+            self._slots.release()
+            raise
+        # 시간 초과된 작업도 워커를 점유하므로, 요청이 포기할 때가 아니라 작업이 실제로 끝났을 때 자리를 반환한다.
+        # (아직 시작하지 않은 작업은 cancel 로 끝나므로 그때 반환된다)
+        future.add_done_callback(lambda _: self._slots.release())
+        try:
+            result = future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError:
+            future.cancel()
+            raise exceptions.PredictionTimeoutException()
+        except concurrent.futures.process.BrokenProcessPool:
+            self.broken = True
+            raise exceptions.PredictionCrashedException()
+        metrics.extend(result.timings)
+        return result
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+
+_executor: typing.Optional[PredictionExecutor] = None
+_pid: typing.Optional[int] = None
+_lock = threading.Lock()
+
+
+def get_executor() -> typing.Optional[PredictionExecutor]:
+    """현재 프로세스의 풀. `PREDICTION_EXECUTOR['WORKERS']` 가 0 이면 None (요청 스레드에서 실행)
+
+    처음 예측할 때(또는 `start()` 에서) 만든다. `gunicorn --preload` 처럼 fork 된 프로세스에서는
+    부모가 만든 풀(관리 스레드가 복사되지 않는다)을 쓰지 않고 새로 만들고, 워커가 죽어 깨진 풀도 새로 만든다.
+    """
+    global _executor, _pid
+    config = settings.PREDICTION_EXECUTOR
+    if not config['WORKERS']:
+        return None
+    with _lock:
+        if _executor is not None and _pid == os.getpid() and _executor.broken:
+            _executor.shutdown()
+            _executor = None
+        if _executor is None or _pid != os.getpid():
+            _executor = PredictionExecutor(
+                workers=config['WORKERS'],
+                queue_size=config['QUEUE_SIZE'],
+                timeout=config['TIMEOUT'],
+                start_method=config['START_METHOD'],
+            )
+            _pid = os.getpid()
+        return _executor
+
+
+def start() -> None:
+    """풀을 쓰도록 설정되어 있으면 현재 프로세스의 워커를 미리 띄운다.
+
+    fork 된 뒤의 각 서버 프로세스에서 호출한다. (`config/gunicorn.conf.py` 의 `post_worker_init`)
+    """
+    executor = get_executor()
+    if executor is not None:
+        executor.start()
+
+
+def predict(data: converters.Buffer) -> PredictionResult:
+    executor = get_executor()
+    if executor is None:
+        return run(data)
+    return executor.submit(data)
+
+
+def predict_multiple(data: converters.Buffer) -> MultiPredictionResult:
+    executor = get_executor()
+    if executor is None:
+        return run_multiple(data)
+    return executor.submit(data, run_multiple)
+
+
+T = typing.TypeVar('T')
+R = typing.TypeVar('R')
+
+
+@functools.cache
+def get_thread_pool() -> concurrent.futures.ThreadPoolExecutor:
+    """일괄 예측용 스레드 풀. OpenCV 는 연산 중 GIL 을 놓으므로 여러 장을 동시에 처리할 수 있다."""
+    return concurrent.futures.ThreadPoolExecutor(
+        max_workers=settings.PREDICTION_BATCH['THREADS'],
+        thread_name_prefix='prediction-batch',
+    )
+
+
+def map_settled(func: typing.Callable[[T], R], items: typing.Sequence[T]) -> typing.List[typing.Union[R, Exception]]:
+    """`items` 를 스레드 풀에서 동시에 처리하고, 입력 순서대로 결과 또는 발생한 예외를 반환"""
+    pool = get_thread_pool()
+    # 요청의 contextvars(계측 등)를 작업 스레드에서도 볼 수 있도록 복사하여 실행한다.
+    futures = [pool.submit(contextvars.copy_context().run, func, item) for item in items]
+    results: typing.List[typing.Union[R, Exception]] = []
+    for future in futures:
+        try:
+            results.append(future.result())
+        except Exception as e:
+            results.append(e)
+    return results
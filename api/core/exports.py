@@ -0,0 +1,75 @@
+"""`DrugFullSpecification` 전체/증분 내보내기 (NDJSON, CSV)
+
+`QuerySet.iterator(chunk_size)` 로 행을 묶음 단위로 읽고 묶음마다 인코딩하여 바로 내보내므로,
+표의 크기와 관계없이 메모리 사용량이 일정하다. 행은 `DrugProjection` 으로 API 와 같은 값으로 바꾸며,
+`?fields=` 로 필요한 열만 받을 수 있다.
+
+행은 ITEM_SEQ 순서로 나가므로, 연결이 끊기면 마지막으로 받은 ITEM_SEQ 를 `after` 로 넘겨 이어 받을 수 있다.
+증분 동기화는 지난번 응답의 `X-Catalogue-Version` 을 `since_version` 으로 넘긴다. 행마다 반영한 시트의
+약품 목록 버전(`catalogue_version`)이 있고 버전은 커밋 순서대로 오르므로, 조회 중에 커밋된 시트도 놓치지 않는다.
+조회 중에 커밋된 행은 다음 증분에 다시 나올 수 있으므로 받는 쪽은 ITEM_SEQ 로 덮어쓴다.
+"""
+import csv
+import io
+import itertools
+import json
+import typing
+
+from django.db.models import QuerySet
+
+from api.models import DrugFullSpecification
+
+if typing.TYPE_CHECKING:
+    from api.serializers import DrugProjection
+
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+}
+
+
+def build_queryset(
+    columns: typing.Sequence[str],
+    after: typing.Optional[int] = None,
+    since_version: typing.Optional[int] = None,
+) -> QuerySet:
+    queryset = DrugFullSpecification.objects.order_by('ITEM_SEQ')
+    if after is not None:
+        queryset = queryset.filter(ITEM_SEQ__gt=after)
+    if since_version is not None:
+        queryset = queryset.filter(catalogue_version__gt=since_version)
+    return queryset.values(*columns)
+
+
+def _batches(queryset: QuerySet, chunk_size: int) -> typing.Iterator[typing.List[dict]]:
+    rows = queryset.iterator(chunk_size=chunk_size)
+    while batch := list(itertools.islice(rows, chunk_size)):
+        yield batch
+
+
+def iter_ndjson(queryset: QuerySet, projection: 'DrugProjection', chunk_size: int) -> typing.Iterator[bytes]:
+    """한 줄에 한 행씩, API 와 같은 JSON 객체"""
+    for batch in _batches(queryset, chunk_size):
+        lines = (
+            json.dumps(projection.to_representation(row), ensure_ascii=False, separators=(',', ':'))
+            for row in batch
+        )
+        yield ('\n'.join(lines) + '\n').encode()
+
+
+def iter_csv(queryset: QuerySet, projection: 'DrugProjection', chunk_size: int) -> typing.Iterator[bytes]:
+    """첫 줄은 헤더. None 은 빈 칸으로 쓴다."""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(projection.fields)
+    yield buffer.getvalue().encode()
+    for batch in _batches(queryset, chunk_size):
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(projection.to_representation(row).values() for row in batch)
+        yield buffer.getvalue().encode()
+
+
+def iter_rows(output: str, queryset: QuerySet, projection: 'DrugProjection', chunk_size: int) -> typing.Iterator[bytes]:
+    return {'ndjson': iter_ndjson, 'csv': iter_csv}[output](queryset, projection, chunk_size)
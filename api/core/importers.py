@@ -0,0 +1,211 @@
+"""약품 목록 시트(xlsx/xls/csv)를 스트리밍으로 읽어 `DrugFullSpecification` 에 반영
+
+행을 일정 개수씩 묶어 열 단위로 검증하고, ITEM_SEQ 기준 upsert 로 한 번에 기록한다.
+같은 시트를 다시 올리면 기존 행이 갱신된다.
+"""
+import codecs
+import csv
+import dataclasses
+import io
+import itertools
+import os.path
+import time
+import typing
+
+import pandas
+
+from django.core.files import File
+from django.db import models
+
+from api.models import DrugFullSpecification
+
+
+CHUNK_SIZE = 2000
+MAX_ERRORS = 20
+
+Row = typing.Sequence[typing.Any]
+
+
+@dataclasses.dataclass
+class ImportResult:
+    inserted: int = 0
+    updated: int = 0
+    rejected: int = 0
+    elapsed: float = 0.0
+    errors: typing.List[str] = dataclasses.field(default_factory=list)
+
+    @property
+    def rows_per_second(self) -> float:
+        total = self.inserted + self.updated + self.rejected
+        return total / self.elapsed if self.elapsed else 0.0
+
+    def merge(self, other: 'ImportResult') -> None:
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.rejected += other.rejected
+        self.elapsed += other.elapsed
+        self.errors.extend(other.errors[:MAX_ERRORS - len(self.errors)])
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        return {
+            'inserted': self.inserted,
+            'updated': self.updated,
+            'rejected': self.rejected,
+            'rows_per_second': round(self.rows_per_second, 1),
+            'errors': self.errors,
+        }
+
+
+# 시트에 있는 열. `catalogue_version` 은 시트가 아니라 `import_sheet` 의 인자로 채운다.
+FIELDS: typing.List[models.Field] = [
+    f for f in DrugFullSpecification._meta.concrete_fields if not f.primary_key and f.editable
+]
+UPDATE_FIELDS = [f.name for f in FIELDS if f.name != 'ITEM_SEQ'] + ['catalogue_version']
+
+
+def iter_rows(file: File) -> typing.Tuple[typing.List[str], typing.Iterator[Row]]:
+    """(헤더, 행 iterator). xlsx 는 openpyxl read-only 모드로, csv 는 한 줄씩 읽는다."""
+    extension = os.path.splitext(file.name or '')[1].lower()
+    if extension == '.csv':
+        return _iter_csv_rows(file)
+    if extension == '.xls':
+        # xlrd 는 스트리밍을 지원하지 않으므로 예전 형식은 한 번에 읽는다.
+        df = pandas.read_excel(file, dtype=object)
+        return list(df.columns), df.itertuples(index=False, name=None)
+    return _iter_xlsx_rows(file)
+
+
+def _iter_xlsx_rows(file: File) -> typing.Tuple[typing.List[str], typing.Iterator[Row]]:
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(file, read_only=True, data_only=True)
+    rows = workbook.worksheets[0].iter_rows(values_only=True)
+    header = [str(name).strip() if name is not None else '' for name in next(rows, ())]
+    return header, rows
+
+
+def _iter_csv_rows(file: File) -> typing.Tuple[typing.List[str], typing.Iterator[Row]]:
+    f = file.file if hasattr(file, 'file') else file
+    f.seek(0)
+    head = f.read(64 * 1024)
+    f.seek(0)
+    # 식약처 CSV 는 cp949 로 배포되는 경우가 많다.
+    encoding = 'utf-8-sig'
+    try:
+        codecs.getincrementaldecoder('utf-8-sig')().decode(head, final=False)
+    except UnicodeDecodeError:
+        encoding = 'cp949'
+    reader = csv.reader(io.TextIOWrapper(f, encoding=encoding, newline=''))
+    header = [name.strip() for name in next(reader, [])]
+    return header, reader
+
+
+def _to_int(column: pandas.Series) -> pandas.Series:
+    number = pandas.to_numeric(column, errors='coerce')
+    # 소수(예: 1.5)는 `Int64` 로 바꿀 수 없으므로 결측으로 두어 그 행을 거부한다.
+    return number.where(number % 1 == 0).astype('Int64')
+
+
+def _to_date(column: pandas.Series) -> pandas.Series:
+    text = column.astype('string').str.strip().str.replace(r'(\.0|\s.*)$', '', regex=True)
+    compact = pandas.to_datetime(text.where(text.str.fullmatch(r'\d{8}')), format='%Y%m%d', errors='coerce')
+    iso = pandas.to_datetime(text.where(~text.str.fullmatch(r'\d{8}').fillna(False)), format='ISO8601', errors='coerce')
+    return compact.fillna(iso).dt.date
+
+
+def _to_str(column: pandas.Series) -> pandas.Series:
+    text = column.astype('string').str.strip()
+    # 엑셀이 숫자로 읽은 값(예: 보험코드)이 '123.0' 이 되지 않도록 한다.
+    return text.str.replace(r'^(\d+)\.0$', r'\1', regex=True).replace('', pandas.NA)
+
+
+def _validate(df: pandas.DataFrame) -> typing.Tuple[pandas.DataFrame, typing.List[str]]:
+    """열 단위로 형 변환과 검증을 하고, (통과한 행, 오류 메시지) 를 반환. `df` 의 index 는 시트의 행 번호"""
+    invalid = pandas.Series(False, index=df.index)
+    reasons = pandas.Series('', index=df.index)
+    for field in FIELDS:
+        name = field.name
+        raw = df[name] if name in df else pandas.Series(pandas.NA, index=df.index, dtype=object)
+        present = raw.notna() & (raw.astype('string').str.strip() != '')
+        if isinstance(field, models.IntegerField):
+            value = _to_int(raw)
+        elif isinstance(field, models.DateField):
+            value = _to_date(raw)
+        else:
+            value = _to_str(raw)
+        bad = present & value.isna()
+        if not field.null:
+            bad |= value.isna()
+        if isinstance(field, models.CharField):
+            bad |= value.str.len().fillna(0) > field.max_length
+        reasons = reasons.mask(bad & ~invalid, name)
+        invalid |= bad
+        df[name] = value
+    errors = [
+        f'{row_number}행: {reason} 값이 올바르지 않습니다.'
+        for row_number, reason in reasons[invalid].items()
+    ]
+    return df[~invalid], errors
+
+
+def _to_instances(df: pandas.DataFrame, catalogue_version: int) -> typing.List[DrugFullSpecification]:
+    names = [f.name for f in FIELDS]
+    df = df[names].astype(object).where(df[names].notna(), None)
+    return [
+        DrugFullSpecification(**dict(zip(names, row)), catalogue_version=catalogue_version)
+        for row in df.itertuples(index=False, name=None)
+    ]
+
+
+def import_chunk(
+    header: typing.List[str],
+    rows: typing.List[Row],
+    row_numbers: typing.Sequence[int],
+    catalogue_version: int,
+) -> ImportResult:
+    """`row_numbers` 는 각 행의 시트 행 번호 (오류 메시지에 사용)"""
+    started_at = time.perf_counter()
+    result = ImportResult()
+    df = pandas.DataFrame.from_records(rows, columns=header, index=pandas.Index(row_numbers))
+    df = df.loc[:, ~df.columns.duplicated()]
+    df, result.errors = _validate(df)
+    result.rejected = len(rows) - len(df)
+    # 같은 묶음 안에서 ITEM_SEQ 가 겹치면 나중 행을 사용한다.
+    df = df.drop_duplicates('ITEM_SEQ', keep='last')
+    seqs = [int(seq) for seq in df['ITEM_SEQ']]
+    existing = set(DrugFullSpecification.objects.filter(ITEM_SEQ__in=seqs).values_list('ITEM_SEQ', flat=True))
+    DrugFullSpecification.objects.bulk_create(
+        _to_instances(df, catalogue_version),
+        batch_size=500,
+        update_conflicts=True,
+        unique_fields=['ITEM_SEQ'],
+        update_fields=UPDATE_FIELDS,
+    )
+    result.updated = len(existing)
+    result.inserted = len(seqs) - len(existing)
+    result.elapsed = time.perf_counter() - started_at
+    return result
+
+
+def import_sheet(file: File, catalogue_version: int, chunk_size: int = CHUNK_SIZE) -> ImportResult:
+    """호출하는 쪽에서 transaction 으로 감싸고, 그 안에서 올린 버전(`catalogue.bump()`)을 넘긴다."""
+    result = ImportResult()
+    started_at = time.perf_counter()
+    header, rows = iter_rows(file)
+    row_number = 2 # 1행은 헤더
+    while True:
+        chunk = list(itertools.islice(rows, chunk_size))
+        if not chunk:
+            break
+        # 행마다 칸 수를 헤더에 맞추고, 완전히 빈 행은 건너뛴다. 오류에는 건너뛰기 전의 행 번호를 쓴다.
+        records, row_numbers = [], []
+        for i, row in enumerate(chunk):
+            record = (tuple(row) + (None,) * len(header))[:len(header)]
+            if any(v is not None and v != '' for v in record):
+                records.append(record)
+                row_numbers.append(row_number + i)
+        if records:
+            result.merge(import_chunk(header, records, row_numbers, catalogue_version))
+        row_number += len(chunk)
+    result.elapsed = time.perf_counter() - started_at
+    return result
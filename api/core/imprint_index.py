@@ -0,0 +1,210 @@
+"""각인(식별 표시) 문자 n-gram 역색인
+
+`PRINT_FRONT`, `PRINT_BACK`, `MARK_CODE_FRONT_ANAL`, `MARK_CODE_BACK_ANAL` 을 정규화하여
+문자 3-gram 별로 약품 목록(posting)을 만들어 두고, 질의와 공유하는 n-gram 수로 Dice 유사도를 계산한다.
+`icontains` 처럼 테이블 전체를 읽지 않고, 오타나 일부만 읽힌 각인도 순위를 매겨 찾을 수 있다.
+
+각인은 다음과 같은 특성이 있어 질의와 색인을 모두 같은 방식으로 다룬다.
+
+- 대소문자, 공백, 구분 기호('|', '-', '/')는 구분하지 않는다. '분할선' 처럼 표시가 아닌 설명은 지운다.
+- 사용자는 어느 면이 앞면인지 모르므로 앞면, 뒷면, 두 면을 이어 붙인 것을 각각 문서로 색인한다.
+- 알약을 거꾸로 들고 읽은 경우를 위해 180도 돌린 질의('6' ↔ '9', 'M' ↔ 'W', 순서 반대)도 함께 찾는다.
+
+`drug_index` 와 마찬가지로 프로세스마다 메모리에 두고, `UploadView` 가 시트를 반영하면 다시 만든다.
+다른 프로세스에서 반영된 시트는 약품 목록 버전(`catalogue`)이 바뀐 것으로 알아채므로, 버전별로 캐시되는
+검색 응답이 이전 색인으로 만들어지지 않는다.
+"""
+import dataclasses
+import re
+import threading
+import typing
+import unicodedata
+
+import numpy
+
+from django.conf import settings
+
+from api.core import catalogue, drug_index
+from api.models import ColorChoices, DrugFullSpecification, ShapeChoices
+
+
+N = 3
+PAD = '\x00'
+SIDES = ('front', 'back', 'both')
+
+# 긴 단어부터 지운다. ('십자분할선' 이 '십자' 로 남지 않도록)
+_NOISE_WORDS = ('십자분할선', '분할선', '마크', '없음')
+_ROTATED = str.maketrans('69MW', '96WM')
+_SHAPES = list(ShapeChoices.values)
+_COLORS = list(ColorChoices.values)
+
+
+def normalize(text: typing.Optional[str]) -> str:
+    """'dw | 10' → 'DW10'"""
+    text = unicodedata.normalize('NFKC', text or '').upper()
+    for word in _NOISE_WORDS:
+        text = text.replace(word, ' ')
+    return re.sub(r'[^0-9A-Z가-힣]+', '', text)
+
+
+def rotate(text: str) -> str:
+    """180도 돌려 읽은 각인 ('6M' → 'W9')"""
+    return text.translate(_ROTATED)[::-1]
+
+
+def ngrams(text: str) -> typing.Set[str]:
+    """앞뒤를 채운 문자 n-gram. 한두 글자 각인도 n-gram 이 생기고, 시작 부분이 일치하면 점수가 더 높다."""
+    if not text:
+        return set()
+    padded = PAD * (N - 1) + text + PAD
+    return {padded[i:i + N] for i in range(len(padded) - N + 1)}
+
+
+@dataclasses.dataclass
+class Match:
+    pk: int
+    score: float
+    side: str
+
+
+class ImprintIndex:
+    """n-gram → 문서 번호 배열 (CSR). 문서 번호는 `약품 위치 * len(SIDES) + 면` 이다."""
+
+    def __init__(
+        self,
+        pks: numpy.ndarray,
+        shapes: numpy.ndarray,
+        colors: numpy.ndarray,
+        vocabulary: typing.Dict[str, int],
+        offsets: numpy.ndarray,
+        postings: numpy.ndarray,
+        lengths: numpy.ndarray,
+    ) -> None:
+        # 약품은 ITEM_SEQ 오름차순이며, 점수가 같으면 이 순서를 따른다.
+        self.pks = pks
+        self._shapes = shapes
+        self._colors = colors
+        self._vocabulary = vocabulary
+        self._offsets = offsets
+        self._postings = postings
+        self._lengths = lengths
+        self.size = len(pks)
+
+    @classmethod
+    def build(cls) -> 'ImprintIndex':
+        rows = DrugFullSpecification.objects.order_by('ITEM_SEQ').values_list(
+            'pk', 'DRUG_SHAPE', 'COLOR_CLASS1', 'COLOR_CLASS2',
+            'PRINT_FRONT', 'PRINT_BACK', 'MARK_CODE_FRONT_ANAL', 'MARK_CODE_BACK_ANAL',
+        )
+        pks, shapes, colors, lengths = [], [], [], []
+        vocabulary: typing.Dict[str, int] = {}
+        postings: typing.List[typing.List[int]] = []
+        doc = 0
+        for pk, drug_shape, color_front, color_back, print_front, print_back, mark_front, mark_back in rows.iterator(chunk_size=2000):
+            pks.append(pk)
+            shapes.append(_SHAPES.index(drug_index.parse_shape(drug_shape)))
+            mask = 0
+            for color in drug_index.parse_colors(color_front) + drug_index.parse_colors(color_back):
+                mask |= 1 << _COLORS.index(color)
+            colors.append(mask)
+
+            front = normalize(print_front) + normalize(mark_front)
+            back = normalize(print_back) + normalize(mark_back)
+            for text in (front, back, front + back):
+                grams = ngrams(text)
+                lengths.append(len(grams))
+                for gram in grams:
+                    gram_id = vocabulary.setdefault(gram, len(vocabulary))
+                    if gram_id == len(postings):
+                        postings.append([])
+                    postings[gram_id].append(doc)
+                doc += 1
+
+        offsets = numpy.zeros(len(postings) + 1, dtype=numpy.int64)
+        offsets[1:] = numpy.cumsum([len(docs) for docs in postings])
+        return cls(
+            pks=numpy.array(pks, dtype=numpy.int64),
+            shapes=numpy.array(shapes, dtype=numpy.int8),
+            colors=numpy.array(colors, dtype=numpy.uint32),
+            vocabulary=vocabulary,
+            offsets=offsets,
+            postings=numpy.fromiter((d for docs in postings for d in docs), dtype=numpy.int32, count=int(offsets[-1])),
+            lengths=numpy.array(lengths, dtype=numpy.float32),
+        )
+
+    def _scores(self, text: str) -> numpy.ndarray:
+        """문서별 Dice 유사도 2|A∩B| / (|A| + |B|), (약품 수, len(SIDES)) 배열"""
+        grams = ngrams(text)
+        ids = [self._vocabulary[gram] for gram in grams if gram in self._vocabulary]
+        if not ids:
+            return numpy.zeros((self.size, len(SIDES)), dtype=numpy.float32)
+        docs = numpy.concatenate([self._postings[self._offsets[i]:self._offsets[i + 1]] for i in ids])
+        shared = numpy.bincount(docs, minlength=len(self._lengths)).astype(numpy.float32)
+        return (2 * shared / (len(grams) + self._lengths)).reshape(self.size, len(SIDES))
+
+    def search(
+        self,
+        query: str,
+        shape: typing.Optional[str] = None,
+        color: typing.Optional[str] = None,
+        limit: int = 20,
+        min_score: float = 0.0,
+    ) -> typing.List[Match]:
+        """유사도 내림차순으로 정렬된 일치 항목. `shape`, `color` 가 주어지면 해당 약품만 찾는다."""
+        text = normalize(query)
+        if not text or not self.size:
+            return []
+        scores = self._scores(text)
+        if rotate(text) != text:
+            scores = numpy.maximum(scores, self._scores(rotate(text)))
+        sides = scores.argmax(axis=1)
+        best = scores[numpy.arange(self.size), sides]
+
+        if shape is not None:
+            best[self._shapes != _SHAPES.index(shape)] = 0
+        if color is not None:
+            best[(self._colors & numpy.uint32(1 << _COLORS.index(color))) == 0] = 0
+
+        positions = numpy.flatnonzero((best > 0) & (best >= min_score))
+        if len(positions) > limit:
+            positions = positions[numpy.argpartition(-best[positions], limit - 1)[:limit]]
+        positions = positions[numpy.lexsort((positions, -best[positions]))]
+        return [Match(pk=int(self.pks[i]), score=float(best[i]), side=SIDES[sides[i]]) for i in positions]
+
+
+_index: typing.Optional[ImprintIndex] = None
+_version: typing.Optional[int] = None
+_lock = threading.Lock()
+
+
+def get_index() -> ImprintIndex:
+    """현재 프로세스의 색인. 아직 없거나 약품 목록 버전이 바뀌었으면 다시 만든다."""
+    global _index, _version
+    version = catalogue.get_version()
+    with _lock:
+        if _index is None or version != _version:
+            _index = ImprintIndex.build()
+            _version = version
+        return _index
+
+
+def rebuild() -> None:
+    """업로드가 반영된 직후 색인을 새로 만든다. 첫 검색이 만드는 시간을 기다리지 않도록 업로드 요청에서 호출한다."""
+    global _index, _version
+    # 만드는 도중에 다른 시트가 반영되면 버전이 달라 다음 조회 때 다시 만든다.
+    version = catalogue.get_version()
+    index = ImprintIndex.build()
+    with _lock:
+        _index = index
+        _version = version
+
+
+def search(
+    query: str,
+    shape: typing.Optional[str] = None,
+    color: typing.Optional[str] = None,
+    limit: typing.Optional[int] = None,
+) -> typing.List[Match]:
+    if limit is None:
+        limit = settings.IMPRINT_INDEX['LIMIT']
+    return get_index().search(query, shape, color, limit, settings.IMPRINT_INDEX['MIN_SCORE'])
@@ -0,0 +1,99 @@
+"""비동기 예측 작업 큐
+
+별도의 브로커 없이 `Prediction` 테이블을 큐로 사용한다. 작업은 조건부 UPDATE 로
+선점(claim)하므로 여러 워커 프로세스가 동시에 실행되어도 같은 작업을 두 번 처리하지 않는다.
+"""
+import datetime
+import logging
+import os.path
+import time
+import typing
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+
+from api.core import analytics, converters, executor, media
+from api.models import Prediction, PredictionStatusChoices
+
+
+logger = logging.getLogger(__name__)
+
+TERMINAL_STATUSES = analytics.TERMINAL_STATUSES
+
+# `process` 가 결과로 저장하는 필드
+RESULT_FIELDS = ('image', 'mask_image', 'shape', 'color', 'mask_strategy', 'candidates', 'status', 'error', 'created_at')
+
+
+def claim_next(lease: datetime.timedelta) -> typing.Optional[Prediction]:
+    """대기 중인 작업(또는 `lease` 보다 오래 처리 중인 작업)을 하나 선점한다."""
+    now = timezone.now()
+    claimable = Q(status=PredictionStatusChoices.PENDING) \
+        | Q(status=PredictionStatusChoices.RUNNING, claimed_at__lt=now - lease)
+    for pk, claimed_at in Prediction.objects.filter(claimable).order_by('pk').values_list('pk', 'claimed_at')[:10]:
+        # 조회 이후 다른 워커가 먼저 선점했다면 UPDATE 되는 행이 없다.
+        n_updated = Prediction.objects.filter(claimable, pk=pk, claimed_at=claimed_at).update(
+            status=PredictionStatusChoices.RUNNING,
+            claimed_at=now,
+        )
+        if n_updated:
+            return Prediction.objects.get(pk=pk)
+    return None
+
+
+def _output_filename(prediction: Prediction) -> str:
+    """`get_upload_path_of_raw` 로 저장된 원본 파일명에서 업로드 당시의 이름을 복원한 PNG 파일명"""
+    basename = os.path.splitext(os.path.basename(prediction.raw_image.name))[0]
+    return media.png_filename(basename.rsplit('-raw', 1)[0])
+
+
+def process(prediction: Prediction) -> Prediction:
+    try:
+        with prediction.raw_image.open('rb'), converters.open_file_buffer(prediction.raw_image) as data:
+            result = executor.run(data)
+    except APIException as e:
+        prediction.status = PredictionStatusChoices.FAILED
+        prediction.error = str(e.detail)
+    except Exception as e:
+        logger.exception('Prediction %s failed', prediction.pk)
+        prediction.status = PredictionStatusChoices.FAILED
+        prediction.error = repr(e)
+    else:
+        # 작업자 프로세스는 요청을 기다리게 하지 않으므로 writer 를 거치지 않고 바로 저장한다.
+        if settings.PREDICTION_MEDIA['STORE_DERIVED']:
+            filename = _output_filename(prediction)
+            prediction.image.save(filename, ContentFile(media.encode_image(result.image)), save=False)
+            prediction.mask_image.save(filename, ContentFile(media.encode_mask(result.mask_image)), save=False)
+        prediction.shape = result.shape
+        prediction.color = result.color
+        prediction.mask_strategy = result.mask_strategy
+        prediction.candidates = result.candidates
+        prediction.status = PredictionStatusChoices.DONE
+        prediction.error = None
+    prediction.created_at = timezone.now()
+    # 처리하는 동안 lease 가 지나 다른 워커가 다시 선점했으면 claimed_at 이 달라 UPDATE 되는 행이 없다.
+    # 먼저 끝낸 워커의 결과만 저장하고 집계하므로 같은 작업이 두 번 집계되지 않는다.
+    n_updated = Prediction.objects.filter(
+        pk=prediction.pk,
+        status=PredictionStatusChoices.RUNNING,
+        claimed_at=prediction.claimed_at,
+    ).update(**{name: getattr(prediction, name) for name in RESULT_FIELDS})
+    if n_updated:
+        analytics.record([prediction])
+    else:
+        logger.warning('Prediction %s was finished by another worker; discarding this result', prediction.pk)
+    return prediction
+
+
+def run_worker(poll_interval: float, lease: datetime.timedelta, once: bool = False) -> None:
+    executor.warm_up()
+    while True:
+        prediction = claim_next(lease)
+        if prediction is not None:
+            process(prediction)
+        elif once:
+            return
+        else:
+            time.sleep(poll_interval)
@@ -0,0 +1,233 @@
+"""예측 결과 이미지 저장
+
+요청 스레드에서는 저장할 이름을 정해 `Prediction` 에 기록하고, PNG 인코딩과 내용 쓰기는 백그라운드 writer 가 처리한다.
+이름은 `<이름>.tmp` 를 만들어 차지하므로 다른 프로세스와 겹치지 않고, 나중에 `Prediction` 의 파일 이름을 고칠 일이 없다.
+내용은 `.tmp` 에 다 쓴 뒤에 바꿔 끼우므로 최종 경로에는 완성된 파일만 보인다. (그 전에는 404)
+쓰기에 실패하면 `Prediction` 의 파일 필드를 비운다.
+밀려 있는 쓰기가 `QUEUE_SIZE` 를 넘으면 요청 스레드에서 바로 써서 메모리 사용량을 제한하고,
+프로세스가 종료될 때는 남은 쓰기를 모두 마친다.
+
+마스크는 1비트(bilevel) PNG 로 저장한다. 8비트 PNG 와 똑같이 열리지만 크기는 절반 이하이다.
+"""
+import atexit
+import concurrent.futures
+import contextlib
+import functools
+import io
+import logging
+import os.path
+import threading
+import typing
+
+import numpy
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.core.files.base import ContentFile, File
+from django.core.files.move import file_move_safe
+from django.core.files.uploadedfile import UploadedFile
+
+from api.core import converters
+from api.models import Prediction
+
+
+logger = logging.getLogger(__name__)
+
+
+def encode_image(mat: numpy.ndarray) -> bytes:
+    return converters.convert_mat_to_bytes(mat)
+
+
+def encode_mask(mat: numpy.ndarray) -> bytes:
+    import cv2
+
+    return converters.convert_mat_to_bytes(mat, params=(cv2.IMWRITE_PNG_BILEVEL, 1, cv2.IMWRITE_PNG_COMPRESSION, 9))
+
+
+class MediaWriter:
+    """동시에 밀려 있는 쓰기 수를 제한하는 스레드 풀"""
+
+    def __init__(self, threads: int, queue_size: int) -> None:
+        self._slots = threading.BoundedSemaphore(queue_size)
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=threads, thread_name_prefix='media-writer')
+        self._lock = threading.Lock()
+        self._pending: typing.Set[concurrent.futures.Future] = set()
+
+    def submit(self, func: typing.Callable, *args) -> None:
+        if not self._slots.acquire(blocking=False):
+            func(*args)
+            return
+        try:
+            future = self._pool.submit(self._run, func, *args)
+        except BaseException:
+            self._slots.release()
+            raise
+        with self._lock:
+            self._pending.add(future)
+        future.add_done_callback(self._done)
+
+    @staticmethod
+    def _run(func: typing.Callable, *args) -> None:
+        try:
+            func(*args)
+        finally:
+            # 쓰기에 실패하면 `Prediction` 을 고치므로 writer 스레드의 DB 연결을 작업마다 정리한다.
+            close_old_connections()
+
+    def _done(self, future: concurrent.futures.Future) -> None:
+        with self._lock:
+            self._pending.discard(future)
+        self._slots.release()
+        if future.exception() is not None:
+            logger.error('Failed to write prediction media', exc_info=future.exception())
+
+    def flush(self, timeout: typing.Optional[float] = None) -> None:
+        """지금까지 요청된 쓰기가 모두 끝날 때까지 기다린다."""
+        with self._lock:
+            pending = list(self._pending)
+        concurrent.futures.wait(pending, timeout=timeout)
+
+    def shutdown(self) -> None:
+        self._pool.shutdown(wait=True)
+
+
+@functools.cache
+def get_writer() -> typing.Optional[MediaWriter]:
+    """설정된 writer. `PREDICTION_MEDIA['WRITER_THREADS']` 가 0 이면 None (요청 스레드에서 저장)"""
+    config = settings.PREDICTION_MEDIA
+    if not config['WRITER_THREADS']:
+        return None
+    writer = MediaWriter(threads=config['WRITER_THREADS'], queue_size=config['QUEUE_SIZE'])
+    atexit.register(writer.shutdown)
+    return writer
+
+
+def flush() -> None:
+    writer = get_writer()
+    if writer is not None:
+        writer.flush()
+
+
+def save(field_name: str, filename: str, content: typing.Callable[[], bytes]) -> str:
+    """`Prediction` 의 파일 필드 경로 규칙대로 저장할 이름을 정해 반환하고, `content()` 는 writer 에서 저장한다."""
+    field = Prediction._meta.get_field(field_name)
+    name = _reserve(field, field.generate_filename(None, filename))
+    writer = get_writer()
+    if writer is None:
+        _write(field_name, name, content)
+    else:
+        writer.submit(_write, field_name, name, content)
+    return name
+
+
+def save_upload(field_name: str, file: UploadedFile) -> str:
+    """업로드된 원본을 내용을 복사하지 않고 저장한다.
+
+    디스크에 있는 임시 업로드는 요청이 끝나면 지워지므로 요청 스레드에서 바로 옮긴다. (같은 파일 시스템이면 이름만 바뀐다)
+    메모리에 있는 업로드는 `BytesIO` 의 내부 bytes 를 그대로 writer 에 넘긴다. `open_file_buffer` 를 닫은 뒤에 호출한다.
+    """
+    if hasattr(file, 'temporary_file_path'):
+        field = Prediction._meta.get_field(field_name)
+        name = _reserve(field, field.generate_filename(None, file.name))
+        _write(field_name, name, lambda: file)
+        return name
+    f = getattr(file, 'file', file)
+    if isinstance(f, io.BytesIO):
+        # 내보낸 버퍼가 없으면 복사하지 않고 내부 bytes 를 돌려준다.
+        content = f.getvalue()
+    else:
+        file.seek(0)
+        content = file.read()
+    return save(field_name, file.name, lambda: content)
+
+
+def save_derived(field_name: str, filename: str, content: typing.Callable[[], bytes]) -> str:
+    """원본에서 만든 이미지(마스킹된 사진, 마스크). `STORE_DERIVED` 가 꺼져 있으면 저장하지 않고 빈 이름을 반환
+
+    PNG 로 인코딩하므로 업로드한 파일의 확장자와 관계없이 `.png` 로 저장한다.
+    """
+    if not settings.PREDICTION_MEDIA['STORE_DERIVED']:
+        return ''
+    return save(field_name, png_filename(filename), content)
+
+
+def png_filename(filename: str) -> str:
+    return os.path.splitext(filename)[0] + '.png'
+
+
+# 로컬 경로가 없는 저장소에서 이 프로세스가 쓰고 있는 이름
+_reserved: typing.Set[str] = set()
+_reserved_lock = threading.Lock()
+
+
+def _local_path(storage, name: str) -> typing.Optional[str]:
+    try:
+        return storage.path(name)
+    except NotImplementedError:
+        return None
+
+
+def _alternative_name(field, name: str) -> str:
+    dir_name, file_name = os.path.split(name)
+    file_root, file_ext = os.path.splitext(file_name)
+    alternative = os.path.join(dir_name, field.storage.get_alternative_name(file_root, file_ext))
+    return field.storage.get_available_name(alternative, max_length=field.max_length)
+
+
+def _reserve(field, name: str) -> str:
+    """저장할 이름을 정한다. 최종 경로에는 아무것도 만들지 않는다.
+
+    로컬 저장소는 `<이름>.tmp` 를 O_EXCL 로 만들어 차지하므로 프로세스 사이에서도 겹치지 않는다.
+    """
+    storage = field.storage
+    name = storage.get_available_name(name, max_length=field.max_length)
+    if _local_path(storage, name) is None:
+        with _reserved_lock:
+            while name in _reserved:
+                name = _alternative_name(field, name)
+            _reserved.add(name)
+        return name
+    while True:
+        path = storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.close(os.open(f'{path}.tmp', os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o666))
+            return name
+        except FileExistsError:
+            name = _alternative_name(field, name)
+
+
+def _write(field_name: str, name: str, content: typing.Callable[[], typing.Union[bytes, File]]) -> None:
+    """`_reserve` 로 정한 이름에 내용을 쓴다. 실패하면 없는 파일을 가리키지 않도록 `Prediction` 의 파일 필드를 비운다."""
+    storage = Prediction._meta.get_field(field_name).storage
+    path = _local_path(storage, name)
+    try:
+        data = content()
+        if not isinstance(data, File):
+            data = ContentFile(data)
+        if path is None:
+            saved = storage.save(name, data)
+            if saved != name:
+                logger.error('Prediction media %s was saved as %s', name, saved)
+            return
+        if hasattr(data, 'temporary_file_path'):
+            file_move_safe(data.temporary_file_path(), f'{path}.tmp', allow_overwrite=True)
+        else:
+            with open(f'{path}.tmp', 'wb') as f:
+                for chunk in data.chunks():
+                    f.write(chunk)
+        mode = getattr(storage, 'file_permissions_mode', None)
+        if mode is not None:
+            os.chmod(f'{path}.tmp', mode)
+        os.replace(f'{path}.tmp', path)
+    except Exception:
+        if path is not None:
+            with contextlib.suppress(FileNotFoundError):
+                os.remove(f'{path}.tmp')
+        # 아직 커밋되지 않은 `Prediction` 은 바뀌지 않지만, 파일이 없으므로 빈 파일 대신 404 가 된다.
+        Prediction.objects.filter(**{field_name: name}).update(**{field_name: ''})
+        raise
+    finally:
+        if path is None:
+            with _reserved_lock:
+                _reserved.discard(name)
@@ -0,0 +1,309 @@
+"""예측 파이프라인 계측
+
+`timed` 로 감싼 구간의 소요 시간을
+- 요청 단위로 모아 `Server-Timing` 헤더로 돌려주고 (`ServerTimingMiddleware`),
+- 프로세스별 히스토그램에 누적하여 `/api/v1/metrics` 에서 Prometheus 형식으로 보여준다.
+
+히스토그램과 카운터는 `METRICS['DIR']` 아래 프로세스마다 하나씩 있는 memory-map 파일에 기록하고,
+조회할 때 모든 파일을 합산하므로 gunicorn 워커나 예측 프로세스 풀이 여러 개여도 한 곳에서 볼 수 있다.
+종료된 프로세스의 파일은 조회할 때 `metrics-<layout>-dead.bin` 에 더하고 지우므로, 파일이 계속 늘지 않고
+카운터도 줄어들지 않는다. 관리 명령처럼 `/metrics` 에 섞이면 안 되는 프로세스는 `keep_local()` 을 호출한다.
+"""
+import contextlib
+import contextvars
+import fcntl
+import functools
+import glob
+import os
+import threading
+import time
+import typing
+
+import numpy
+
+from django.conf import settings
+
+
+STAGES = (
+    'decode',
+    'resize',
+    'white_balance',
+    'denoise',
+    'mask',
+    'shape',
+    'color',
+    'munsell',
+    'drug',
+    'encode',
+    'save',
+)
+OUTCOMES = (
+    'detected',
+    'NotDetectedException',
+    'ShapeNotDetectedException',
+    'ColorNotDetectedException',
+    'MultipleDetectedException',
+)
+MASK_STRATEGIES = (
+    'chromakey',
+    'contour',
+)
+CATALOGUE_CACHE_RESULTS = (
+    'hit',
+    'miss',
+    'not_modified',
+)
+PREDICTION_CACHE_RESULTS = (
+    'hit',
+    'perceptual_hit',
+    'miss',
+)
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# 히스토그램 한 줄: 버킷별 개수(+Inf 포함), 합계
+_ROW = len(BUCKETS) + 2
+_COUNTERS = OUTCOMES + MASK_STRATEGIES + CATALOGUE_CACHE_RESULTS + PREDICTION_CACHE_RESULTS
+_SIZE = len(STAGES) * _ROW + len(_COUNTERS)
+_LAYOUT = (
+    f'v1-{len(STAGES)}-{len(BUCKETS)}-{len(OUTCOMES)}-{len(MASK_STRATEGIES)}'
+    f'-{len(CATALOGUE_CACHE_RESULTS)}-{len(PREDICTION_CACHE_RESULTS)}'
+)
+
+Timings = typing.List[typing.Tuple[str, float]]
+
+_timings: contextvars.ContextVar[typing.Optional[Timings]] = contextvars.ContextVar('timings', default=None)
+
+
+class _Store:
+    """현재 프로세스의 히스토그램/카운터 배열"""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._pid: typing.Optional[int] = None
+        self._values: typing.Optional[numpy.ndarray] = None
+
+    def reset(self) -> None:
+        """다음 기록 때 `METRICS['DIR']` 을 다시 읽어 파일을 연다."""
+        with self._lock:
+            self._pid = None
+
+    def values(self) -> numpy.ndarray:
+        # fork 된 자식 프로세스는 부모의 파일을 이어 쓰지 않도록 새 파일을 연다.
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            self._values = self._open()
+        return self._values
+
+    def _open(self) -> numpy.ndarray:
+        directory = settings.METRICS['DIR']
+        if directory is None:
+            return numpy.zeros(_SIZE, dtype=numpy.float64)
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f'metrics-{_LAYOUT}-{os.getpid()}.bin')
+        mode = 'r+' if os.path.exists(path) else 'w+'
+        return numpy.memmap(path, dtype=numpy.float64, mode=mode, shape=(_SIZE,))
+
+    def observe(self, stage: int, seconds: float) -> None:
+        offset = stage * _ROW
+        bucket = numpy.searchsorted(BUCKETS, seconds)
+        with self._lock:
+            values = self.values()
+            values[offset + bucket] += 1
+            values[offset + _ROW - 1] += seconds
+
+    def count(self, counter: int) -> None:
+        with self._lock:
+            self.values()[len(STAGES) * _ROW + counter] += 1
+
+
+_store = _Store()
+
+
+def keep_local() -> None:
+    """이 프로세스의 계측을 공유 디렉터리에 기록하지 않고 프로세스 안에만 둔다. (벤치마크, 오프라인 예측)"""
+    settings.METRICS = {**settings.METRICS, 'DIR': None}
+    _store.reset()
+
+
+def observe(stage: str, seconds: float) -> None:
+    timings = _timings.get()
+    if timings is not None:
+        timings.append((stage, seconds))
+    if settings.METRICS['ENABLED']:
+        _store.observe(STAGES.index(stage), seconds)
+
+
+def count(outcome: str) -> None:
+    if settings.METRICS['ENABLED']:
+        _store.count(OUTCOMES.index(outcome))
+
+
+def count_mask_strategy(strategy: str) -> None:
+    if settings.METRICS['ENABLED']:
+        _store.count(len(OUTCOMES) + MASK_STRATEGIES.index(strategy))
+
+
+def count_catalogue_cache(result: str) -> None:
+    if settings.METRICS['ENABLED']:
+        _store.count(len(OUTCOMES) + len(MASK_STRATEGIES) + CATALOGUE_CACHE_RESULTS.index(result))
+
+
+def count_prediction_cache(result: str) -> None:
+    if settings.METRICS['ENABLED']:
+        offset = len(OUTCOMES) + len(MASK_STRATEGIES) + len(CATALOGUE_CACHE_RESULTS)
+        _store.count(offset + PREDICTION_CACHE_RESULTS.index(result))
+
+
+def timed(stage: str):
+    """함수의 실행 시간을 `stage` 로 기록하는 decorator"""
+    if stage not in STAGES:
+        raise ValueError(f'Unknown stage: {stage}')
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            started_at = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe(stage, time.perf_counter() - started_at)
+        return wrapper
+    return decorator
+
+
+@contextlib.contextmanager
+def timing(stage: str) -> typing.Iterator[None]:
+    started_at = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe(stage, time.perf_counter() - started_at)
+
+
+@contextlib.contextmanager
+def collect() -> typing.Iterator[Timings]:
+    """블록 안에서 기록된 구간들을 모은다. 바깥에서도 모으고 있었다면 끝날 때 그쪽으로 넘긴다."""
+    parent = _timings.get()
+    timings: Timings = []
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+        if parent is not None:
+            parent.extend(timings)
+
+
+def extend(timings: Timings) -> None:
+    """다른 프로세스(예측 프로세스 풀)에서 기록된 구간을 현재 요청에 덧붙인다."""
+    current = _timings.get()
+    if current is not None:
+        current.extend(timings)
+
+
+def format_server_timing(timings: Timings, total: float) -> str:
+    entries = [f'{stage};dur={seconds * 1000:.2f}' for stage, seconds in timings]
+    entries.append(f'total;dur={total * 1000:.2f}')
+    return ', '.join(entries)
+
+
+def aggregate() -> numpy.ndarray:
+    """모든 프로세스의 값을 합산"""
+    directory = settings.METRICS['DIR']
+    if directory is None:
+        return numpy.array(_store.values())
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, f'metrics-{_LAYOUT}-')
+    total = numpy.zeros(_SIZE, dtype=numpy.float64)
+    # 다른 프로세스가 같은 파일을 옮기는 도중에 합산하지 않도록, 조회하는 동안 dead 파일을 잠근다.
+    fd = os.open(f'{prefix}dead.bin', os.O_RDWR | os.O_CREAT, 0o644)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        data = os.pread(fd, _SIZE * 8, 0)
+        dead = numpy.frombuffer(data, dtype=numpy.float64).copy() if len(data) == _SIZE * 8 else numpy.zeros(_SIZE)
+        merged = []
+        for path in glob.glob(f'{prefix}*.bin'):
+            pid = path[len(prefix):-len('.bin')]
+            if not pid.isdigit():
+                continue
+            try:
+                values = numpy.fromfile(path, dtype=numpy.float64, count=_SIZE)
+                if _is_alive(int(pid)):
+                    total += values
+                    continue
+                dead += values
+                merged.append(path)
+            except ValueError:
+                # 막 만들어지는 중인 파일
+                continue
+        if merged:
+            # 더한 값을 먼저 기록하고 지운다. 그 사이에 중단되면 그 프로세스의 값이 두 번 더해질 수 있다.
+            os.pwrite(fd, dead.tobytes(), 0)
+            for path in merged:
+                os.remove(path)
+        total += dead
+    finally:
+        os.close(fd)
+    return total
+
+
+def _is_alive(pid: int) -> bool:
+    """같은 PID 네임스페이스(호스트, 컨테이너)의 프로세스만 확인할 수 있다."""
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def catalogue_cache_counts() -> typing.Dict[str, float]:
+    values = aggregate()
+    offset = len(STAGES) * _ROW + len(OUTCOMES) + len(MASK_STRATEGIES)
+    return {result: values[offset + i] for i, result in enumerate(CATALOGUE_CACHE_RESULTS)}
+
+
+def render_prometheus() -> str:
+    values = aggregate()
+    lines = [
+        '# HELP prediction_stage_seconds Time spent in each prediction pipeline stage.',
+        '# TYPE prediction_stage_seconds histogram',
+    ]
+    for i, stage in enumerate(STAGES):
+        row = values[i * _ROW:(i + 1) * _ROW]
+        cumulative = numpy.cumsum(row[:-1])
+        for le, n in zip(BUCKETS, cumulative):
+            lines.append(f'prediction_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {n:.0f}')
+        lines.append(f'prediction_stage_seconds_bucket{{stage="{stage}",le="+Inf"}} {cumulative[-1]:.0f}')
+        lines.append(f'prediction_stage_seconds_sum{{stage="{stage}"}} {row[-1]}')
+        lines.append(f'prediction_stage_seconds_count{{stage="{stage}"}} {cumulative[-1]:.0f}')
+    lines += [
+        '# HELP prediction_outcomes_total Prediction results by outcome.',
+        '# TYPE prediction_outcomes_total counter',
+    ]
+    offset = len(STAGES) * _ROW
+    for i, outcome in enumerate(OUTCOMES):
+        lines.append(f'prediction_outcomes_total{{outcome="{outcome}"}} {values[offset + i]:.0f}')
+    lines += [
+        '# HELP prediction_mask_strategy_total Detected predictions by the mask strategy that was used.',
+        '# TYPE prediction_mask_strategy_total counter',
+    ]
+    offset += len(OUTCOMES)
+    for i, strategy in enumerate(MASK_STRATEGIES):
+        lines.append(f'prediction_mask_strategy_total{{strategy="{strategy}"}} {values[offset + i]:.0f}')
+    lines += [
+        '# HELP catalogue_cache_requests_total Catalogue reads by response cache result.',
+        '# TYPE catalogue_cache_requests_total counter',
+    ]
+    offset += len(MASK_STRATEGIES)
+    for i, result in enumerate(CATALOGUE_CACHE_RESULTS):
+        lines.append(f'catalogue_cache_requests_total{{result="{result}"}} {values[offset + i]:.0f}')
+    lines += [
+        '# HELP prediction_cache_lookups_total Prediction cache lookups by result.',
+        '# TYPE prediction_cache_lookups_total counter',
+    ]
+    offset += len(CATALOGUE_CACHE_RESULTS)
+    for i, result in enumerate(PREDICTION_CACHE_RESULTS):
+        lines.append(f'prediction_cache_lookups_total{{result="{result}"}} {values[offset + i]:.0f}')
+    return '\n'.join(lines) + '\n'
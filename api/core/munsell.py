@@ -0,0 +1,170 @@
+"""sRGB → Munsell 변환 테이블
+
+`colour.notation.munsell.xyY_to_munsell_specification` 은 반복적인 수치 역산이므로
+요청마다 호출하기에는 느리다. 양자화된 RGB 큐브의 각 셀에 대해 미리 계산한 결과를
+바이너리 파일(.npy)로 저장해두고, 워커들이 memory-map 으로 하나의 사본을 공유한다.
+"""
+import dataclasses
+import multiprocessing
+import os
+import threading
+import typing
+
+import numpy
+
+from django.conf import settings
+
+
+BITS = 5
+LEVELS = 1 << BITS
+SHIFT = 8 - BITS
+
+DTYPE = numpy.dtype([
+    ('hue', '<f4'),
+    ('value', '<f4'),
+    ('chroma', '<f4'),
+    ('code', '<f4'),
+])
+
+# `build_munsell_table --verify` 와 테스트가 허용하는 양자화 오차 (표본의 95 백분위수, ColorChoices 일치율)
+MAX_VALUE_ERROR = 0.2
+MAX_CHROMA_ERROR = 1.0
+MIN_MATCH_RATE = 0.9
+
+
+def to_munsell_specification(rgb: typing.Sequence[float]) -> numpy.ndarray:
+    """0~255 범위의 sRGB 색상을 Munsell specification (hue, value, chroma, code)으로 변환"""
+    import colour
+
+    color_rgb = numpy.asarray(rgb, dtype=numpy.float64) / 255.0
+    color_XYZ = colour.RGB_to_XYZ(color_rgb, colour.models.RGB_COLOURSPACE_sRGB)
+    color_xyY = colour.XYZ_to_xyY(color_XYZ)
+    return colour.notation.munsell.xyY_to_munsell_specification(color_xyY)
+
+
+def cell_centers() -> numpy.ndarray:
+    """각 셀의 대표 RGB 값, shape=(LEVELS, LEVELS, LEVELS, 3)"""
+    axis = (numpy.arange(LEVELS) << SHIFT) + (1 << SHIFT) // 2
+    return numpy.stack(numpy.meshgrid(axis, axis, axis, indexing='ij'), axis=-1)
+
+
+def _to_cell(rgb: numpy.ndarray) -> typing.Tuple[float, float, float, float]:
+    try:
+        return tuple(to_munsell_specification(rgb))
+    except (AssertionError, ValueError, RuntimeError):
+        # Munsell Renotation 범위 밖의 색상은 NaN 으로 남겨두고, 조회 시 직접 계산한다.
+        return (numpy.nan,) * 4
+
+
+def build_table(
+    processes: typing.Optional[int] = None,
+    progress: typing.Optional[typing.Callable[[int, int], None]] = None,
+) -> numpy.ndarray:
+    table = numpy.full((LEVELS, LEVELS, LEVELS), numpy.nan, dtype=DTYPE)
+    centers = cell_centers().reshape(-1, 3)
+    flat = table.reshape(-1)
+    with multiprocessing.Pool(processes) as pool:
+        for i, cell in enumerate(pool.imap(_to_cell, centers, chunksize=LEVELS)):
+            flat[i] = cell
+            if progress is not None:
+                progress(i + 1, len(centers))
+    return table
+
+
+def save_table(table: numpy.ndarray, path: typing.Union[str, os.PathLike]) -> None:
+    os.makedirs(os.path.dirname(os.fspath(path)), exist_ok=True)
+    tmp_path = f'{os.fspath(path)}.tmp'
+    with open(tmp_path, 'wb') as f:
+        numpy.save(f, table)
+    os.replace(tmp_path, path)
+
+
+_table: typing.Optional[numpy.ndarray] = None
+_loaded = False
+_lock = threading.Lock()
+
+
+def get_table() -> typing.Optional[numpy.ndarray]:
+    """memory-map 된 변환 테이블. 프로세스마다 처음 한 번만 파일을 열고 이후에는 같은 배열을 쓴다. 파일이 없으면 None"""
+    global _table, _loaded
+    if _loaded:
+        return _table
+    with _lock:
+        if not _loaded:
+            path = settings.MUNSELL_TABLE_PATH
+            table = numpy.load(path, mmap_mode='r') if os.path.exists(path) else None
+            if table is not None and (table.dtype != DTYPE or table.shape != (LEVELS, LEVELS, LEVELS)):
+                table = None
+            _table = table
+            _loaded = True
+        return _table
+
+
+def reset() -> None:
+    """테이블 파일을 새로 저장한 뒤 호출하면 다음 조회 때 다시 연다."""
+    global _table, _loaded
+    with _lock:
+        _table = None
+        _loaded = False
+
+
+def lookup(rgb: numpy.ndarray) -> numpy.ndarray:
+    """(..., 3) 모양의 uint8 sRGB 배열을 한 번에 조회한다.
+
+    테이블이 없거나 셀 값이 NaN 이면 해당 색상만 colour-science 로 직접 계산한다.
+    직접 계산해도 변환할 수 없는 색상(Munsell Renotation 범위 밖)은 NaN 으로 남는다.
+    """
+    rgb = numpy.asarray(rgb, dtype=numpy.uint8)
+    flat_rgb = rgb.reshape(-1, 3)
+    table = get_table()
+    if table is None:
+        result = numpy.full(len(flat_rgb), numpy.nan, dtype=DTYPE)
+    else:
+        index = flat_rgb >> SHIFT
+        result = numpy.array(table[index[:, 0], index[:, 1], index[:, 2]])
+    for i in numpy.flatnonzero(numpy.isnan(result['value'])):
+        result[i] = _to_cell(flat_rgb[i])
+    return result.reshape(rgb.shape[:-1])
+
+
+@dataclasses.dataclass
+class Error:
+    n_compared: int
+    value: float
+    chroma: float
+    match_rate: float
+
+    @property
+    def ok(self) -> bool:
+        return self.value <= MAX_VALUE_ERROR and self.chroma <= MAX_CHROMA_ERROR and self.match_rate >= MIN_MATCH_RATE
+
+
+def measure_error(samples: numpy.ndarray) -> Error:
+    """`lookup` 결과를 colour-science 의 정확한 값과 비교한다. value/chroma 오차는 95 백분위수"""
+    from api.core.algorithms import _MunsellColor
+
+    approx = lookup(samples)
+    value_errors, chroma_errors = [], []
+    n_compared = n_classified = n_matched = 0
+    for rgb, spec in zip(samples, approx):
+        try:
+            exact = to_munsell_specification(rgb)
+        except (AssertionError, ValueError, RuntimeError):
+            continue
+        n_compared += 1
+        value_errors.append(abs(exact[1] - spec['value']))
+        if not numpy.isnan(exact[2]) and not numpy.isnan(spec['chroma']):
+            chroma_errors.append(abs(exact[2] - spec['chroma']))
+        try:
+            exact_choice = _MunsellColor.from_specification(exact).to_color_choice()
+            approx_choice = _MunsellColor.from_specification(spec.tolist()).to_color_choice()
+        except KeyError:
+            continue
+        n_classified += 1
+        n_matched += exact_choice == approx_choice
+    return Error(
+        n_compared=n_compared,
+        value=float(numpy.percentile(value_errors, 95)) if value_errors else 0.0,
+        chroma=float(numpy.percentile(chroma_errors, 95)) if chroma_errors else 0.0,
+        match_rate=n_matched / n_classified if n_classified else 1.0,
+    )
@@ -0,0 +1,236 @@
+"""저장된 사진을 한꺼번에 예측하는 오프라인 일괄 예측 (`predict_dir`)
+
+알고리즘을 바꾼 뒤 검증하거나 데이터셋에 라벨을 붙일 때, HTTP 요청 없이 디렉터리나 목록 파일의 사진을
+프로세스 풀에서 예측한다. 경로는 `chunk_size` 개씩 묶어 워커에 넘기고, 끝난 순서대로 결과를 받아
+CSV 파일에 덧붙이거나 Parquet 조각 파일로 저장한다.
+
+결과에는 사진마다 걸린 시간(읽기, 예측, 단계별)과 실패한 경우 예외 종류가 남는다.
+이미 결과가 있는 경로는 건너뛰므로, 중단된 작업은 같은 명령으로 다시 실행하면 이어서 처리한다.
+"""
+import csv
+import dataclasses
+import json
+import multiprocessing
+import os
+import time
+import typing
+
+from rest_framework.exceptions import APIException
+
+
+IMAGE_EXTENSIONS = ('.jpg', '.jpeg', '.png')
+
+COLUMNS = [
+    'path', 'status', 'shape', 'color', 'mask_strategy', 'candidates',
+    'error_type', 'error', 'read_seconds', 'predict_seconds', 'stages', 'worker',
+]
+
+
+def iter_paths(source: str) -> typing.Iterator[str]:
+    """디렉터리면 그 아래의 사진을 이름 순서로, 파일이면 한 줄에 하나씩 적힌 경로(목록 파일 기준 상대 경로)"""
+    if os.path.isdir(source):
+        for root, dirs, files in os.walk(source):
+            dirs.sort()
+            for name in sorted(files):
+                if name.lower().endswith(IMAGE_EXTENSIONS):
+                    yield os.path.join(root, name)
+        return
+    base = os.path.dirname(os.path.abspath(source))
+    with open(source, encoding='utf-8') as manifest:
+        for line in manifest:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                yield os.path.join(base, line)
+
+
+def cpu_count() -> int:
+    """현재 프로세스가 사용할 수 있는 코어 수 (컨테이너의 CPU 제한을 반영한다)"""
+    if hasattr(os, 'sched_getaffinity'):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def _init_worker() -> None:
+    from api.core import executor
+
+    # 서버의 /metrics 에 오프라인 예측이 섞이지 않도록 워커의 계측은 프로세스 안에만 둔다.
+    executor._init_worker(keep_metrics_local=True)
+
+
+def predict_path(path: str) -> typing.Dict[str, typing.Any]:
+    """워커 프로세스에서 사진 한 장을 예측한다. 예외는 결과 행으로 바꾸어 돌려준다."""
+    from api.core import executor
+
+    row: typing.Dict[str, typing.Any] = dict.fromkeys(COLUMNS)
+    row.update(path=path, worker=os.getpid())
+    started_at = time.perf_counter()
+    try:
+        with open(path, 'rb') as file:
+            data = file.read()
+        row['read_seconds'] = time.perf_counter() - started_at
+        started_at = time.perf_counter()
+        result = executor.run(data)
+    except Exception as e:
+        row.update(
+            status='failed',
+            error_type=type(e).__name__,
+            error=str(e.detail) if isinstance(e, APIException) else str(e),
+        )
+    else:
+        row.update(
+            status='done',
+            shape=result.shape,
+            color=result.color,
+            mask_strategy=result.mask_strategy,
+            candidates=' '.join(map(str, result.candidates)) if result.candidates is not None else None,
+            stages=json.dumps({stage: round(seconds, 6) for stage, seconds in result.timings}),
+        )
+    if row['read_seconds'] is not None:
+        row['predict_seconds'] = time.perf_counter() - started_at
+    return row
+
+
+class CsvOutput:
+    """결과를 한 파일에 덧붙인다. 중단되어 잘린 마지막 줄은 다시 열 때 지운다."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+
+    def done_paths(self) -> typing.Set[str]:
+        if not os.path.exists(self.path):
+            return set()
+        with open(self.path, 'rb+') as file:
+            data = file.read()
+            end = data.rfind(b'\n') + 1
+            if end != len(data):
+                file.truncate(end)
+        with open(self.path, newline='', encoding='utf-8') as file:
+            return {row['path'] for row in csv.DictReader(file)}
+
+    def clear(self) -> None:
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def open(self) -> None:
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, 'a', newline='', encoding='utf-8')
+        self._writer = csv.DictWriter(self._file, COLUMNS)
+        if new:
+            self._writer.writeheader()
+
+    def write(self, rows: typing.List[typing.Dict[str, typing.Any]]) -> None:
+        self._writer.writerows(rows)
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class ParquetOutput:
+    """`path` 디렉터리에 묶음마다 `part-NNNNN.parquet` 를 쓴다. (pandas/pyarrow 로 디렉터리째 읽을 수 있다)"""
+
+    def __init__(self, path: str) -> None:
+        # pyarrow 는 Parquet 로 저장할 때만 필요하다.
+        import pyarrow
+        import pyarrow.parquet
+
+        self.path = path
+        self._pyarrow = pyarrow
+        self._parquet = pyarrow.parquet
+        self._schema = pyarrow.schema([
+            (name, pyarrow.float64() if name.endswith('_seconds') else pyarrow.int64() if name == 'worker' else pyarrow.string())
+            for name in COLUMNS
+        ])
+
+    def _parts(self) -> typing.List[str]:
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name for name in os.listdir(self.path) if name.startswith('part-') and name.endswith('.parquet'))
+
+    def done_paths(self) -> typing.Set[str]:
+        paths: typing.Set[str] = set()
+        for name in self._parts():
+            paths.update(self._parquet.read_table(os.path.join(self.path, name), columns=['path']).column('path').to_pylist())
+        return paths
+
+    def clear(self) -> None:
+        for name in self._parts():
+            os.remove(os.path.join(self.path, name))
+
+    def open(self) -> None:
+        os.makedirs(self.path, exist_ok=True)
+        parts = self._parts()
+        self._next = int(parts[-1][len('part-'):-len('.parquet')]) + 1 if parts else 0
+
+    def write(self, rows: typing.List[typing.Dict[str, typing.Any]]) -> None:
+        table = self._pyarrow.Table.from_pylist(rows, schema=self._schema)
+        path = os.path.join(self.path, f'part-{self._next:05d}.parquet')
+        # 중단되어도 읽을 수 없는 조각 파일이 남지 않도록 다 쓴 뒤 이름을 바꾼다.
+        self._parquet.write_table(table, path + '.tmp')
+        os.replace(path + '.tmp', path)
+        self._next += 1
+
+    def close(self) -> None:
+        pass
+
+
+OUTPUTS = {'csv': CsvOutput, 'parquet': ParquetOutput}
+
+
+@dataclasses.dataclass
+class Progress:
+    done: int = 0
+    failed: int = 0
+    skipped: int = 0
+    elapsed: float = 0.0
+    predict_seconds: float = 0.0
+    errors: typing.Dict[str, int] = dataclasses.field(default_factory=dict)
+
+    @property
+    def images_per_second(self) -> float:
+        return self.done / self.elapsed if self.elapsed else 0.0
+
+
+def run(
+    paths: typing.Iterable[str],
+    output: typing.Union[CsvOutput, ParquetOutput],
+    workers: int,
+    chunk_size: int,
+    flush_every: int,
+    start_method: str = 'spawn',
+    progress: typing.Optional[typing.Callable[[Progress], None]] = None,
+) -> Progress:
+    """`output` 에 없는 경로만 예측하여 `flush_every` 행마다 저장한다."""
+    done_paths = output.done_paths()
+    state = Progress(skipped=len(done_paths))
+
+    def pending() -> typing.Iterator[str]:
+        for path in paths:
+            if path not in done_paths:
+                yield path
+
+    output.open()
+    buffer: typing.List[typing.Dict[str, typing.Any]] = []
+    started_at = time.perf_counter()
+    try:
+        with multiprocessing.get_context(start_method).Pool(workers, initializer=_init_worker) as pool:
+            for row in pool.imap_unordered(predict_path, pending(), chunksize=chunk_size):
+                buffer.append(row)
+                state.done += 1
+                state.predict_seconds += row['predict_seconds'] or 0.0
+                if row['status'] == 'failed':
+                    state.failed += 1
+                    state.errors[row['error_type']] = state.errors.get(row['error_type'], 0) + 1
+                if len(buffer) >= flush_every:
+                    output.write(buffer)
+                    buffer = []
+                    state.elapsed = time.perf_counter() - started_at
+                    if progress is not None:
+                        progress(state)
+    finally:
+        # Ctrl+C 로 중단해도 이미 받은 결과는 저장하여 다음 실행에서 건너뛴다.
+        if buffer:
+            output.write(buffer)
+        output.close()
+        state.elapsed = time.perf_counter() - started_at
+    return state
@@ -0,0 +1,80 @@
+"""마스크 영역 안의 대표 색상 추출
+
+colorgram 과 같은 방식(채널당 상위 비트로 양자화한 히스토그램)을 NumPy 로 벡터화하되,
+마스크가 설정된 픽셀만 집계하므로 배경 색상을 추측하여 건너뛸 필요가 없다.
+"""
+import dataclasses
+import typing
+
+import cv2
+import cv2.typing
+import numpy
+
+
+QUANTIZE_BITS = 4
+SHIFT = 8 - QUANTIZE_BITS
+
+
+@dataclasses.dataclass
+class Color:
+    rgb: typing.Tuple[int, int, int]
+    proportion: float
+
+
+def extract(
+    mat: cv2.typing.MatLike,
+    mask: cv2.typing.MatLike,
+    n: int,
+    min_proportion: float = 0.0,
+) -> typing.List[Color]:
+    """BGR 이미지 `mat` 에서 `mask` 가 설정된 픽셀의 대표 색상을 많은 순서대로 최대 `n`개 반환"""
+    pixels = mat[mask > 0]
+    if len(pixels) == 0:
+        return []
+    pixels = pixels[:, ::-1].astype(numpy.int64) # BGR -> RGB
+    quantized = pixels >> SHIFT
+    keys = (quantized[:, 0] << (2 * QUANTIZE_BITS)) | (quantized[:, 1] << QUANTIZE_BITS) | quantized[:, 2]
+    n_bins = 1 << (3 * QUANTIZE_BITS)
+    counts = numpy.bincount(keys, minlength=n_bins)
+    sums = numpy.stack([numpy.bincount(keys, weights=pixels[:, c], minlength=n_bins) for c in range(3)], axis=-1)
+
+    ranked = numpy.argsort(counts, kind='stable')[::-1][:n]
+    ranked = ranked[counts[ranked] > 0]
+    total = len(pixels)
+    colors = []
+    for key in ranked:
+        proportion = counts[key] / total
+        if proportion < min_proportion:
+            break
+        mean = sums[key] / counts[key]
+        colors.append(Color(rgb=tuple(int(round(v)) for v in mean), proportion=float(proportion)))
+    return colors
+
+
+def extract_by_label(
+    mat: cv2.typing.MatLike,
+    labels: cv2.typing.MatLike,
+    n_labels: int,
+) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+    """연결 요소 label 마다 가장 많은 색상을 한 번에 구한다.
+
+    (label 별 대표 sRGB, shape=(n_labels, 3) uint8), (대표 색상의 픽셀 수, shape=(n_labels,)) 를 반환.
+    label 0(배경)도 포함된다.
+    """
+    pixels = mat.reshape(-1, 3)[:, ::-1].astype(numpy.int64) # BGR -> RGB
+    quantized = pixels >> SHIFT
+    n_bins = 1 << (3 * QUANTIZE_BITS)
+    keys = labels.reshape(-1).astype(numpy.int64) * n_bins \
+        + ((quantized[:, 0] << (2 * QUANTIZE_BITS)) | (quantized[:, 1] << QUANTIZE_BITS) | quantized[:, 2])
+    size = n_labels * n_bins
+    counts = numpy.bincount(keys, minlength=size).reshape(n_labels, n_bins)
+    top = counts.argmax(axis=1)
+    top_keys = numpy.arange(n_labels) * n_bins + top
+    # 대표 bin 에 속한 픽셀만 다시 모아 평균 색상을 구한다.
+    in_top = numpy.isin(keys, top_keys)
+    sums = numpy.stack([
+        numpy.bincount(keys[in_top] // n_bins, weights=pixels[in_top, c], minlength=n_labels) for c in range(3)
+    ], axis=-1)
+    top_counts = counts[numpy.arange(n_labels), top]
+    rgbs = numpy.round(sums / numpy.maximum(top_counts, 1)[:, None]).astype(numpy.uint8)
+    return rgbs, top_counts
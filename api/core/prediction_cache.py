@@ -0,0 +1,169 @@
+"""예측 결과 캐시
+
+같은 사진을 다시 보내거나 거의 같은 사진을 연달아 보내는 경우, 파이프라인을 다시 실행하지 않고
+이전 결과(모양, 색상, 이미 저장된 이미지/마스크 파일)를 그대로 돌려준다.
+원본 바이트의 해시로 정확히 일치하는 경우를 찾고, 설정에 따라 지각 해시(dHash)의
+해밍 거리로 거의 같은 사진도 찾는다. dHash 는 밝기만 보므로 모양이 같고 색상만 다른 알약을 구분하지 못한다.
+그래서 8x8 Lab 축소 이미지도 함께 비교하여, 칸마다의 색차(ΔE)가 `PERCEPTUAL_COLOR_DISTANCE` 이하일 때만 같은 사진으로 본다.
+
+후보 약품(`candidates`)은 예측할 때의 약품 목록과 시각 색인에 따라 달라지므로, 조회할 때 그 세대(`generation`)를
+함께 넘기고 세대가 다른 항목은 사용하지 않는다.
+"""
+import collections
+import dataclasses
+import functools
+import hashlib
+import threading
+import time
+import typing
+
+import numpy
+
+from django.conf import settings
+
+from api.core import converters, metrics
+
+
+@dataclasses.dataclass
+class CachedPrediction:
+    shape: str
+    color: str
+    mask_strategy: typing.Optional[str]
+    candidates: typing.Optional[typing.List[int]]
+    image_name: str
+    mask_image_name: str
+
+
+@dataclasses.dataclass(frozen=True, eq=False)
+class Fingerprint:
+    """거의 같은 사진을 찾기 위한 값: 64비트 dHash 와 8x8 Lab 축소 이미지"""
+    dhash: int
+    lab: numpy.ndarray
+
+    def distance(self, other: 'Fingerprint') -> typing.Tuple[int, float]:
+        """(dHash 의 해밍 거리, 칸마다의 색차 중 최댓값)"""
+        delta_e = numpy.sqrt(((self.lab - other.lab) ** 2).sum(axis=-1)).max()
+        return bin(self.dhash ^ other.dhash).count('1'), float(delta_e)
+
+
+@dataclasses.dataclass(frozen=True)
+class CacheKey:
+    digest: bytes
+    fingerprint: typing.Optional[Fingerprint]
+    generation: typing.Hashable = None
+
+
+@dataclasses.dataclass
+class _Entry:
+    value: CachedPrediction
+    fingerprint: typing.Optional[Fingerprint]
+    generation: typing.Hashable
+    expires_at: float
+
+
+def fingerprint(data: converters.Buffer, shape: typing.Tuple[int, int] = (256, 256)) -> typing.Optional[Fingerprint]:
+    """원본을 축소 디코딩한 뒤 `shape` 로 맞추고, 9x8 흑백으로 dHash 를, 8x8 로 Lab 축소 이미지를 만든다."""
+    import cv2
+
+    buf = numpy.frombuffer(data, dtype=numpy.uint8)
+    mat = cv2.imdecode(buf, cv2.IMREAD_REDUCED_COLOR_8)
+    if mat is None:
+        return None
+    mat = cv2.resize(mat, shape)
+    gray = cv2.resize(cv2.cvtColor(mat, cv2.COLOR_BGR2GRAY), (9, 8), interpolation=cv2.INTER_AREA)
+    bits = (gray[:, 1:] > gray[:, :-1]).flatten()
+    # float32 로 변환하면 L 0~100, a/b 는 약 -127~127 이므로 거리가 ΔE(CIE76) 가 된다.
+    small = cv2.resize(mat, (8, 8), interpolation=cv2.INTER_AREA).astype(numpy.float32) / 255
+    return Fingerprint(
+        dhash=int.from_bytes(numpy.packbits(bits).tobytes(), 'big'),
+        lab=cv2.cvtColor(small, cv2.COLOR_BGR2Lab),
+    )
+
+
+class PredictionCache:
+    """LRU + TTL 로 관리되는 프로세스 내 캐시"""
+
+    def __init__(
+        self,
+        max_size: int,
+        ttl: float,
+        max_distance: typing.Optional[int],
+        max_color_distance: float = 0.0,
+    ) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self.max_distance = max_distance
+        self.max_color_distance = max_color_distance
+        self._entries: collections.OrderedDict[bytes, _Entry] = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def lookup(
+        self,
+        data: converters.Buffer,
+        generation: typing.Hashable = None,
+    ) -> typing.Tuple[CacheKey, typing.Optional[CachedPrediction]]:
+        """`generation` 이 다른 항목은 없는 것으로 본다."""
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        with self._lock:
+            self._evict_expired()
+            entry = self._entries.get(digest)
+            if entry is not None and (entry.expires_at <= time.monotonic() or entry.generation != generation):
+                del self._entries[digest]
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(digest)
+                metrics.count_prediction_cache('hit')
+                return CacheKey(digest, entry.fingerprint, generation), entry.value
+
+        if self.max_distance is None:
+            metrics.count_prediction_cache('miss')
+            return CacheKey(digest, None, generation), None
+
+        key = CacheKey(digest, fingerprint(data), generation)
+        with self._lock:
+            if key.fingerprint is not None:
+                now = time.monotonic()
+                for other_digest, entry in reversed(self._entries.items()):
+                    if entry.fingerprint is None or entry.expires_at <= now or entry.generation != generation:
+                        continue
+                    distance, color_distance = key.fingerprint.distance(entry.fingerprint)
+                    if distance <= self.max_distance and color_distance <= self.max_color_distance:
+                        self._entries.move_to_end(other_digest)
+                        metrics.count_prediction_cache('perceptual_hit')
+                        return key, entry.value
+        metrics.count_prediction_cache('miss')
+        return key, None
+
+    def store(self, key: CacheKey, value: CachedPrediction) -> None:
+        with self._lock:
+            self._entries[key.digest] = _Entry(value, key.fingerprint, key.generation, time.monotonic() + self.ttl)
+            self._entries.move_to_end(key.digest)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _evict_expired(self) -> None:
+        """가장 오래 사용되지 않은 쪽부터 만료된 항목을 정리한다. (남은 항목은 조회 시 만료 여부를 확인)"""
+        now = time.monotonic()
+        while self._entries:
+            digest, entry = next(iter(self._entries.items()))
+            if entry.expires_at > now:
+                break
+            del self._entries[digest]
+
+
+@functools.cache
+def get_cache() -> typing.Optional[PredictionCache]:
+    """`PREDICTION_CACHE['ENABLED']` 가 거짓이면 None"""
+    config = settings.PREDICTION_CACHE
+    if not config['ENABLED']:
+        return None
+    return PredictionCache(
+        max_size=config['MAX_SIZE'],
+        ttl=config['TTL'],
+        max_distance=config['PERCEPTUAL_DISTANCE'],
+        max_color_distance=config['PERCEPTUAL_COLOR_DISTANCE'],
+    )
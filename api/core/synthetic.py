@@ -0,0 +1,143 @@
+"""벤치마크용 합성 데이터"""
+import dataclasses
+import datetime
+import typing
+
+import cv2
+import numpy
+
+from api.models import ColorChoices, DrugFullSpecification, ShapeChoices
+
+
+MFDS_SHAPES = ['원형', '타원형', '장방형', '반원형', '삼각형', '사각형', '마름모형', '오각형', '육각형', '팔각형', '기타']
+MFDS_COLORS = ['하양', '노랑', '주황', '분홍', '빨강', '갈색', '연두', '초록', '청록', '파랑', '남색', '자주', '보라', '회색', '검정', '투명']
+
+
+def make_specifications(n: int, seed: int = 0, first_item_seq: int = 200000000) -> typing.List[DrugFullSpecification]:
+    """MFDS 낱알식별 시트와 비슷한 분포의 `DrugFullSpecification` n개 (저장하지 않음)"""
+    rng = numpy.random.default_rng(seed)
+    # 실제 목록처럼 원형/하양 등 일부 값에 몰리도록 지수적으로 감소하는 가중치를 준다.
+    shape_p = 0.6 ** numpy.arange(len(MFDS_SHAPES))
+    color_p = 0.7 ** numpy.arange(len(MFDS_COLORS))
+    shapes = rng.choice(MFDS_SHAPES, size=n, p=shape_p / shape_p.sum())
+    fronts = rng.choice(MFDS_COLORS, size=n, p=color_p / color_p.sum())
+    backs = rng.choice(MFDS_COLORS, size=n, p=color_p / color_p.sum())
+    entps = rng.integers(0, 500, size=n)
+    return [
+        DrugFullSpecification(
+            ITEM_SEQ=first_item_seq + i,
+            ITEM_NAME=f'합성약품{i}정 {rng.integers(1, 500)}밀리그램',
+            ENTP_SEQ=int(entps[i]),
+            ENTP_NAME=f'제약회사{entps[i]}',
+            CHARTN=f'{fronts[i]}색의 {shapes[i]} 정제',
+            ITEM_IMAGE=f'https://nedrug.mfds.go.kr/pbp/cmn/itemImageDownload/{first_item_seq + i}',
+            PRINT_FRONT=''.join(rng.choice(list('ABCDEHKMPTXY0123456789'), size=rng.integers(1, 6))),
+            PRINT_BACK=None if rng.random() < 0.5 else str(rng.integers(1, 1000)),
+            DRUG_SHAPE=shapes[i],
+            COLOR_CLASS1=fronts[i],
+            COLOR_CLASS2=None if rng.random() < 0.7 else backs[i],
+            IMG_REGIST_TS=datetime.date(2010, 1, 1) + datetime.timedelta(days=int(rng.integers(0, 5000))),
+            CLASS_NO=int(rng.integers(100, 900)),
+            ETC_OTC_CODE=int(rng.integers(0, 2)),
+            ITEM_PERMIT_DATE=datetime.date(1990, 1, 1) + datetime.timedelta(days=int(rng.integers(0, 12000))),
+            SHAPE_CODE=int(rng.integers(1, 20)),
+        )
+        for i in range(n)
+    ]
+
+
+# Munsell 표기(예: 5R 5/14)를 sRGB 로 옮긴 값. 정답 색상은 PredictionModel 이 쓰는 Munsell 색상 기준이다.
+PILL_COLORS_RGB = {
+    ColorChoices.RED: (220, 63, 78), # 5R 5/14
+    ColorChoices.ORANGE: (221, 122, 29), # 5YR 6/12
+    ColorChoices.YELLOW: (234, 196, 62), # 5Y 8/10
+    ColorChoices.YELLOW_GREEN: (159, 184, 47), # 5GY 7/10
+    ColorChoices.GREEN: (19, 138, 103), # 5G 5/8
+    ColorChoices.BLUE: (0, 133, 173), # 5B 5/8
+    ColorChoices.BLUISH_VIOLET: (37, 96, 170), # 5PB 4/10
+    ColorChoices.BLUISH_PURPLE: (126, 75, 152), # 5P 4/10
+    ColorChoices.REDDISH_PURPLE: (198, 77, 139), # 5RP 5/12
+    ColorChoices.WHITE: (235, 235, 235), # N9.3
+}
+PILL_SHAPES = [
+    ShapeChoices.CIRCLE,
+    ShapeChoices.OVAL,
+    ShapeChoices.OBLONG,
+    ShapeChoices.RECTANGLE,
+    ShapeChoices.TRIANGLE,
+    ShapeChoices.PENTAGON,
+]
+BACKGROUNDS_RGB = [(35, 35, 35), (90, 90, 95), (60, 40, 30)]
+RESOLUTIONS = [(800, 600), (1600, 1200), (4000, 3000)]
+
+
+@dataclasses.dataclass
+class PillImage:
+    data: bytes
+    shape: ShapeChoices
+    color: ColorChoices
+    resolution: typing.Tuple[int, int]
+    background: typing.Tuple[int, int, int]
+    noise: float
+
+
+def _regular_polygon(n: int, center: numpy.ndarray, radius: float, angle: float) -> numpy.ndarray:
+    theta = angle + numpy.arange(n) * 2 * numpy.pi / n
+    return center + radius * numpy.stack([numpy.cos(theta), numpy.sin(theta)], axis=-1)
+
+
+def _draw_pill(
+    mat: numpy.ndarray,
+    shape: ShapeChoices,
+    color_bgr: typing.Tuple[int, int, int],
+    rng: numpy.random.Generator,
+) -> None:
+    height, width = mat.shape[:2]
+    # 원본 이미지는 PredictionModel 에서 정사각형으로 늘려지므로, 그 이후에 모양이 유지되도록 가로/세로 비율을 보정한다.
+    scale = numpy.array([width, height]) / min(width, height)
+    size = min(width, height) * rng.uniform(0.2, 0.3)
+    center = numpy.array([width, height]) / 2 + rng.uniform(-0.1, 0.1, size=2) * min(width, height)
+    angle = rng.uniform(0, 2 * numpy.pi)
+    rotation = numpy.array([[numpy.cos(angle), -numpy.sin(angle)], [numpy.sin(angle), numpy.cos(angle)]])
+
+    t = numpy.linspace(0, 2 * numpy.pi, 180, endpoint=False)
+    if shape == ShapeChoices.CIRCLE:
+        points = numpy.stack([numpy.cos(t), numpy.sin(t)], axis=-1) * size
+    elif shape == ShapeChoices.OVAL:
+        points = numpy.stack([numpy.cos(t), 0.6 * numpy.sin(t)], axis=-1) * size
+    elif shape == ShapeChoices.OBLONG:
+        # 양 끝이 반원인 캡슐(stadium) 모양
+        half = 0.55 * size
+        radius = 0.4 * size
+        right = numpy.stack([half + radius * numpy.cos(t[:90] - numpy.pi / 2), radius * numpy.sin(t[:90] - numpy.pi / 2)], axis=-1)
+        points = numpy.concatenate([right, -right])
+    elif shape == ShapeChoices.RECTANGLE:
+        points = numpy.array([[-1, -0.6], [1, -0.6], [1, 0.6], [-1, 0.6]]) * size
+    elif shape == ShapeChoices.TRIANGLE:
+        points = _regular_polygon(3, numpy.zeros(2), size, 0)
+    elif shape == ShapeChoices.PENTAGON:
+        points = _regular_polygon(5, numpy.zeros(2), size, 0)
+    else:
+        raise ValueError(shape)
+    points = center + (points @ rotation.T) * scale
+    cv2.fillPoly(mat, [numpy.round(points).astype(numpy.int32)], color_bgr, lineType=cv2.LINE_AA)
+
+
+def make_pill_images(n: int, seed: int = 0, resolutions: typing.Sequence[typing.Tuple[int, int]] = RESOLUTIONS) -> typing.Iterator[PillImage]:
+    """정답(모양, 색상)이 붙은 합성 알약 사진 n장을 JPEG 로 만든다. 같은 seed 면 항상 같은 이미지"""
+    rng = numpy.random.default_rng(seed)
+    colors = list(PILL_COLORS_RGB)
+    for i in range(n):
+        shape = PILL_SHAPES[i % len(PILL_SHAPES)]
+        color = colors[(i // len(PILL_SHAPES)) % len(colors)]
+        width, height = resolutions[rng.integers(len(resolutions))]
+        background = BACKGROUNDS_RGB[rng.integers(len(BACKGROUNDS_RGB))]
+        noise = float(rng.choice([0.0, 4.0, 8.0]))
+
+        mat = numpy.empty((height, width, 3), dtype=numpy.uint8)
+        mat[:] = background[::-1]
+        _draw_pill(mat, shape, PILL_COLORS_RGB[color][::-1], rng)
+        if noise:
+            mat = numpy.clip(mat + rng.normal(0, noise, mat.shape), 0, 255).astype(numpy.uint8)
+        ret, buf = cv2.imencode('.jpg', mat, [cv2.IMWRITE_JPEG_QUALITY, 90])
+        yield PillImage(buf.tobytes(), shape, color, (width, height), background, noise)
@@ -0,0 +1,98 @@
+"""업로드된 사진 한 장을 예측하여 `Prediction` 에 채울 값을 만든다.
+
+캐시에 있으면 이전에 저장된 이미지/마스크 파일을 그대로 참조하고, 없으면 파이프라인을 실행한다.
+파일 쓰기는 `media` 를 통해 응답 이후로 미룬다.
+단건(`PredictView`)과 일괄(`BatchPredictView`) 예측이 함께 사용한다.
+"""
+import dataclasses
+import functools
+import typing
+
+from django.core.files.uploadedfile import UploadedFile
+
+from api.core import catalogue, converters, executor, media, prediction_cache, visual_index
+from api.models import Prediction
+
+
+@dataclasses.dataclass
+class Outcome:
+    fields: typing.Dict[str, typing.Any]
+    cache_key: typing.Optional[prediction_cache.CacheKey] = None
+    cached: bool = False
+
+
+def predict(file: UploadedFile) -> Outcome:
+    """`raw_image` 를 포함한 `Prediction` 의 값. 파일은 이름만 정하고 내용은 `media` writer 가 저장한다."""
+    cache = prediction_cache.get_cache()
+    key = cached = None
+    with converters.open_file_buffer(file) as data:
+        if cache is not None:
+            # 약품 목록이나 시각 색인이 바뀌면 캐시된 후보가 달라지므로 다시 예측한다.
+            key, cached = cache.lookup(data, (catalogue.get_version(), visual_index.index_mtime()))
+        if cached is None:
+            result = executor.predict(data)
+    raw_image = media.save_upload('raw_image', file)
+    if cached is not None:
+        return Outcome(
+            fields={
+                'raw_image': raw_image,
+                'image': cached.image_name,
+                'mask_image': cached.mask_image_name,
+                'shape': cached.shape,
+                'color': cached.color,
+                'mask_strategy': cached.mask_strategy,
+                'candidates': cached.candidates,
+            },
+            cache_key=key,
+            cached=True,
+        )
+    return Outcome(
+        fields={
+            'raw_image': raw_image,
+            'image': media.save_derived('image', file.name, functools.partial(media.encode_image, result.image)),
+            'mask_image': media.save_derived('mask_image', file.name, functools.partial(media.encode_mask, result.mask_image)),
+            'shape': result.shape,
+            'color': result.color,
+            'mask_strategy': result.mask_strategy,
+            'candidates': result.candidates,
+        },
+        cache_key=key,
+    )
+
+
+def remember(outcome: Outcome, prediction: Prediction) -> None:
+    """새로 예측하여 저장한 결과를 캐시에 넣는다."""
+    cache = prediction_cache.get_cache()
+    if cache is None or outcome.cached or outcome.cache_key is None:
+        return
+    cache.store(outcome.cache_key, prediction_cache.CachedPrediction(
+        shape=prediction.shape,
+        color=prediction.color,
+        mask_strategy=prediction.mask_strategy,
+        candidates=prediction.candidates,
+        image_name=prediction.image.name,
+        mask_image_name=prediction.mask_image.name,
+    ))
+
+
+def predict_multiple(file: UploadedFile) -> typing.List[typing.Dict[str, typing.Any]]:
+    """사진 속 알약마다 `Prediction` 에 채울 값
+
+    원본과 마스킹된 이미지는 한 번만 저장하여 모든 알약이 같은 파일을 참조하고, 마스크만 알약별로 저장한다.
+    """
+    with converters.open_file_buffer(file) as data:
+        result = executor.predict_multiple(data)
+    raw_image = media.save_upload('raw_image', file)
+    image = media.save_derived('image', file.name, functools.partial(media.encode_image, result.image))
+    return [
+        {
+            'raw_image': raw_image,
+            'image': image,
+            'mask_image': media.save_derived('mask_image', file.name, functools.partial(media.encode_mask, pill.mask_image)),
+            'shape': pill.shape,
+            'color': pill.color,
+            'mask_strategy': result.mask_strategy,
+            'bounding_box': list(pill.bounding_box),
+        }
+        for pill in result.pills
+    ]
@@ -0,0 +1,327 @@
+"""약품 사진(`ITEM_IMAGE`) 기반 시각 유사도 색인
+
+`build_visual_index` 명령이 참고 사진마다 예측과 같은 마스크 단계를 거쳐 알약 영역의 특징 벡터를 계산하고,
+ITEM_SEQ 와 함께 `VISUAL_INDEX['PATH']` 에 저장한다. 특징 벡터는 다음을 이어 붙인 float32 배열이다.
+
+- Lab 색 공간의 3차원 히스토그램 (제곱근을 취해 유클리드 거리가 Hellinger 거리가 되도록 한다)
+- 원본 비율로 되돌린 윤곽선의 Hu moments (로그 스케일)
+- 최소 외접 사각형의 장축/단축 비 (로그)
+
+색인 파일은 memory-map 하므로 여러 워커가 같은 페이지를 공유하고, 파일이 바뀌면 다음 조회 때 다시 연다.
+예측 시에는 (모양, 색상)이 일치하는 후보를 질의 사진과의 거리 순으로 다시 정렬한다.
+"""
+import dataclasses
+import functools
+import logging
+import os
+import threading
+import typing
+import zlib
+
+import numpy
+
+from django.conf import settings
+from django.db import close_old_connections
+
+if typing.TYPE_CHECKING:
+    from api.core.algorithms import PredictionModel
+
+
+logger = logging.getLogger(__name__)
+
+
+HIST_BINS = (4, 6, 6)
+N_HU_MOMENTS = 7
+DIM = int(numpy.prod(HIST_BINS)) + N_HU_MOMENTS + 1
+
+# 특징 묶음별 가중치. 색상 히스토그램은 길이 1 로 정규화되어 있다.
+HU_WEIGHT = 0.5
+ASPECT_WEIGHT = 1.0
+# Hu moments 는 1e-12 보다 작으면 같은 값으로 본다. (로그 스케일 0~12 를 0~1 로)
+HU_MIN = 1e-12
+
+DTYPE = numpy.dtype([
+    ('item_seq', '<i8'),
+    ('source', '<u4'),
+    ('descriptor', '<f4', (DIM,)),
+])
+
+
+def describe(model: 'PredictionModel') -> numpy.ndarray:
+    """마스크까지 계산된 `PredictionModel` 에서 특징 벡터를 만든다."""
+    import cv2
+
+    lab = cv2.cvtColor(model.raw_mat, cv2.COLOR_BGR2LAB)
+    hist = cv2.calcHist([lab], [0, 1, 2], model.bin_mat, list(HIST_BINS), [0, 256] * 3).ravel()
+    hist = numpy.sqrt(hist / max(float(hist.sum()), 1.0))
+
+    # IMG_SHAPE 로 늘리거나 줄인 비율을 되돌려, 사진의 가로세로 비와 관계없는 모양 특징을 얻는다.
+    height, width = model.bin_mat.shape[:2]
+    scale = numpy.array([model.raw_shape[1] / width, model.raw_shape[0] / height], dtype=numpy.float32)
+    points = model.contour.points.reshape(-1, 2).astype(numpy.float32) * scale
+    hu = cv2.HuMoments(cv2.moments(points)).ravel()
+    hu = numpy.sign(hu) * (numpy.log10(numpy.maximum(numpy.abs(hu), HU_MIN)) - numpy.log10(HU_MIN)) / -numpy.log10(HU_MIN)
+    sides = sorted(cv2.minAreaRect(points)[1])
+    aspect = numpy.log(sides[1] / sides[0]) if sides[0] > 0 else 0.0
+
+    return numpy.concatenate([hist, HU_WEIGHT * hu, [ASPECT_WEIGHT * aspect]]).astype(numpy.float32)
+
+
+def source_of(item_image: typing.Optional[str]) -> int:
+    """참고 사진이 바뀌었는지 확인하기 위한 `ITEM_IMAGE` 의 체크섬"""
+    return zlib.crc32((item_image or '').encode())
+
+
+class VisualIndex:
+    def __init__(self, rows: numpy.ndarray) -> None:
+        # rows 는 ITEM_SEQ 오름차순으로 저장되어 있다.
+        self.rows = rows
+        self.item_seqs = rows['item_seq']
+        self._descriptors = rows['descriptor']
+        self._norms = numpy.einsum('ij,ij->i', self._descriptors, self._descriptors)
+
+    def __len__(self) -> int:
+        return len(self.rows)
+
+    def _distances(self, descriptor: numpy.ndarray, positions: typing.Optional[numpy.ndarray] = None) -> numpy.ndarray:
+        """제곱 유클리드 거리 |x|² - 2x·q + |q|²"""
+        descriptors, norms = self._descriptors, self._norms
+        if positions is not None:
+            descriptors, norms = descriptors[positions], norms[positions]
+        return norms - 2 * (descriptors @ descriptor) + descriptor @ descriptor
+
+    def search(self, descriptor: numpy.ndarray, k: int) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        """가장 가까운 k개의 (ITEM_SEQ, 거리), 거리 오름차순"""
+        distances = self._distances(descriptor)
+        return self._top_k(self.item_seqs, distances, k)
+
+    def rank(self, descriptor: numpy.ndarray, item_seqs: numpy.ndarray) -> numpy.ndarray:
+        """`item_seqs` 를 거리 오름차순으로 정렬하는 순서. 색인에 없는 항목은 원래 순서대로 뒤에 둔다."""
+        positions = numpy.searchsorted(self.item_seqs, item_seqs)
+        positions = numpy.minimum(positions, max(len(self) - 1, 0))
+        found = self.item_seqs[positions] == item_seqs if len(self) else numpy.zeros(len(item_seqs), dtype=bool)
+        distances = numpy.full(len(item_seqs), numpy.inf, dtype=numpy.float32)
+        distances[found] = self._distances(descriptor, positions[found])
+        return numpy.argsort(distances, kind='stable')
+
+    @staticmethod
+    def _top_k(keys: numpy.ndarray, distances: numpy.ndarray, k: int) -> typing.Tuple[numpy.ndarray, numpy.ndarray]:
+        k = min(k, len(distances))
+        if k < len(distances):
+            nearest = numpy.argpartition(distances, k - 1)[:k]
+        else:
+            nearest = numpy.arange(len(distances))
+        nearest = nearest[numpy.argsort(distances[nearest], kind='stable')]
+        return numpy.asarray(keys[nearest]), distances[nearest]
+
+
+def index_path() -> str:
+    return os.fspath(settings.VISUAL_INDEX['PATH'])
+
+
+def load_rows(path: typing.Optional[str] = None) -> numpy.ndarray:
+    """저장된 색인의 행. 파일이 없거나 형식이 다르면 빈 배열"""
+    path = path or index_path()
+    if not os.path.exists(path):
+        return numpy.empty(0, dtype=DTYPE)
+    rows = numpy.load(path, mmap_mode='r')
+    if rows.dtype != DTYPE:
+        return numpy.empty(0, dtype=DTYPE)
+    return rows
+
+
+def save_rows(rows: numpy.ndarray, path: typing.Optional[str] = None) -> None:
+    """ITEM_SEQ 순으로 정렬하여 저장한다. 기존 파일을 memory-map 한 프로세스는 바꾸기 전 파일을 계속 읽는다."""
+    path = path or index_path()
+    rows = rows[numpy.argsort(rows['item_seq'], kind='stable')]
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        numpy.save(f, rows)
+    os.replace(tmp_path, path)
+
+
+def merge_rows(rows: numpy.ndarray, updates: numpy.ndarray, keep: typing.Optional[numpy.ndarray] = None) -> numpy.ndarray:
+    """`rows` 에 `updates` 를 덮어쓴다. `keep` 이 주어지면 그 ITEM_SEQ 만 남긴다. (삭제된 약품 정리)"""
+    rows = numpy.asarray(rows)
+    rows = rows[~numpy.isin(rows['item_seq'], updates['item_seq'])]
+    if keep is not None:
+        rows = rows[numpy.isin(rows['item_seq'], keep)]
+    return numpy.concatenate([rows, updates])
+
+
+_index: typing.Optional[VisualIndex] = None
+_index_mtime: typing.Optional[int] = None
+_lock = threading.Lock()
+
+
+def index_mtime() -> typing.Optional[int]:
+    """색인 파일의 수정 시각(ns). 파일이 없으면 None"""
+    try:
+        return os.stat(index_path()).st_mtime_ns
+    except FileNotFoundError:
+        return None
+
+
+def get_index() -> typing.Optional[VisualIndex]:
+    """현재 색인. 파일이 없거나 비어 있으면 None, 파일이 바뀌었으면 다시 연다."""
+    global _index, _index_mtime
+    path = index_path()
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None
+    with _lock:
+        if mtime != _index_mtime:
+            rows = load_rows(path)
+            _index = VisualIndex(rows) if len(rows) else None
+            _index_mtime = mtime
+        return _index
+
+
+@dataclasses.dataclass
+class UpdateResult:
+    indexed: int = 0
+    removed: int = 0
+    failed: int = 0
+    errors: typing.List[str] = dataclasses.field(default_factory=list)
+
+
+def describe_image(data: bytes) -> numpy.ndarray:
+    from api.core import converters
+    from api.core.algorithms import ReferenceImageModel
+
+    mat = converters.convert_bytes_to_mat(data, ReferenceImageModel.IMG_SHAPE)
+    if mat is None:
+        raise ValueError('이미지를 읽을 수 없습니다.')
+    return describe(ReferenceImageModel(mat))
+
+
+DOWNLOAD_SCHEMES = ('http', 'https')
+
+
+def _check_url(url: str) -> None:
+    """시트에 적힌 주소로 로컬 파일(file://)이나 다른 프로토콜을 읽지 않도록 http(s) 만 허용한다."""
+    import urllib.parse
+
+    if urllib.parse.urlsplit(url).scheme.lower() not in DOWNLOAD_SCHEMES:
+        raise ValueError(f'http(s) 주소가 아닙니다: {url}')
+
+
+@functools.cache
+def _get_opener():
+    import urllib.request
+
+    class RedirectHandler(urllib.request.HTTPRedirectHandler):
+        # 기본 처리기는 ftp 로의 redirect 도 따라가므로 redirect 된 주소도 확인한다.
+        def redirect_request(self, req, fp, code, msg, headers, newurl):
+            _check_url(newurl)
+            return super().redirect_request(req, fp, code, msg, headers, newurl)
+
+    return urllib.request.build_opener(RedirectHandler)
+
+
+def _read_image(item_seq: int, item_image: str, image_dir: typing.Optional[str]) -> bytes:
+    """`image_dir` 이 주어지면 미리 받아 둔 `<ITEM_SEQ>.jpg|png` 를, 아니면 `ITEM_IMAGE` URL 을 읽는다.
+
+    URL 은 http(s) 만 허용하고, `VISUAL_INDEX['MAX_DOWNLOAD_SIZE']` 바이트를 넘으면 읽지 않는다.
+    """
+    if image_dir is not None:
+        for ext in ('.jpg', '.jpeg', '.png'):
+            path = os.path.join(image_dir, f'{item_seq}{ext}')
+            if os.path.exists(path):
+                with open(path, 'rb') as f:
+                    return f.read()
+        raise FileNotFoundError(f'{item_seq} 의 사진이 {image_dir} 에 없습니다.')
+    _check_url(item_image)
+    max_size = settings.VISUAL_INDEX['MAX_DOWNLOAD_SIZE']
+    with _get_opener().open(item_image, timeout=settings.VISUAL_INDEX['DOWNLOAD_TIMEOUT']) as response:
+        # Content-Length 가 없거나 틀릴 수 있으므로 한도보다 1 바이트 더 읽어 확인한다.
+        data = response.read(max_size + 1)
+    if len(data) > max_size:
+        raise ValueError(f'사진이 {max_size} 바이트보다 큽니다.')
+    return data
+
+
+def update(
+    rebuild: bool = False,
+    image_dir: typing.Optional[str] = None,
+    threads: int = 4,
+    progress: typing.Optional[typing.Callable[[int, int], None]] = None,
+) -> UpdateResult:
+    """색인에 없거나 `ITEM_IMAGE` 가 바뀐 약품만 계산하여 반영하고, DB 에서 삭제된 약품은 뺀다.
+
+    사진을 받거나 알약을 찾지 못한 약품은 색인에 넣지 않으므로 다음 갱신 때 다시 시도한다.
+    """
+    import concurrent.futures
+
+    import cv2
+
+    from api.core import exceptions
+    from api.models import DrugFullSpecification
+
+    rows = numpy.empty(0, dtype=DTYPE) if rebuild else numpy.array(load_rows())
+    sources = dict(zip(rows['item_seq'].tolist(), rows['source'].tolist()))
+    item_seqs, pending = [], []
+    specs = DrugFullSpecification.objects.values_list('ITEM_SEQ', 'ITEM_IMAGE')
+    for item_seq, item_image in specs.iterator(chunk_size=2000):
+        item_seqs.append(item_seq)
+        if item_image and sources.get(item_seq) != source_of(item_image):
+            pending.append((item_seq, item_image))
+
+    result = UpdateResult()
+
+    def run(spec: typing.Tuple[int, str]) -> typing.Optional[numpy.ndarray]:
+        item_seq, item_image = spec
+        try:
+            return describe_image(_read_image(item_seq, item_image, image_dir))
+        except (OSError, ValueError, cv2.error, exceptions.NotDetectedException) as e:
+            result.errors.append(f'{item_seq}: {e}')
+            return None
+
+    updates = numpy.zeros(len(pending), dtype=DTYPE)
+    n_described = 0
+    with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+        for i, ((item_seq, item_image), descriptor) in enumerate(zip(pending, pool.map(run, pending))):
+            if descriptor is not None:
+                updates[n_described] = (item_seq, source_of(item_image), descriptor)
+                n_described += 1
+            if progress is not None:
+                progress(i + 1, len(pending))
+    updates = updates[:n_described]
+
+    keep = numpy.array(item_seqs, dtype=numpy.int64)
+    merged = merge_rows(rows, updates, keep)
+    result.indexed = n_described
+    result.failed = len(pending) - n_described
+    result.removed = int((~numpy.isin(rows['item_seq'], keep)).sum())
+    if n_described or len(merged) != len(rows):
+        save_rows(merged)
+    return result
+
+
+@functools.cache
+def get_updater():
+    """업로드 후 증분 갱신을 하나씩 실행하는 스레드 (`VISUAL_INDEX['UPDATE_ON_UPLOAD']`)"""
+    import concurrent.futures
+
+    return concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix='visual-index')
+
+
+def schedule_update() -> None:
+    """새로 올라온 약품의 참고 사진을 백그라운드에서 색인에 추가한다."""
+    if settings.VISUAL_INDEX['UPDATE_ON_UPLOAD']:
+        get_updater().submit(_update).add_done_callback(_log_failure)
+
+
+def _update() -> None:
+    close_old_connections()
+    try:
+        update()
+    finally:
+        close_old_connections()
+
+
+def _log_failure(future) -> None:
+    if future.exception() is not None:
+        logger.error('Visual index update failed', exc_info=future.exception())
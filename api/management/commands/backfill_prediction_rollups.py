@@ -0,0 +1,45 @@
+import datetime
+import time
+import typing
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from api.core import analytics
+
+
+class Command(BaseCommand):
+    help = '저장된 예측(Prediction)으로 한 시간 단위 예측 통계(PredictionRollup)를 다시 만듭니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', default=None, help='이 시각(ISO 8601)이 속한 구간부터 다시 만듭니다. (기본값: 처음부터)')
+        parser.add_argument('--until', default=None, help='이 시각(ISO 8601) 이전 구간까지 다시 만듭니다. (기본값: 현재 구간의 시작)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='한 번에 읽어 더할 예측 수')
+
+    def handle(self, *args, **options):
+        since = self._parse(options, 'since')
+        until = analytics.bucket_of(self._parse(options, 'until') or timezone.now())
+        if since is not None and since >= until:
+            raise CommandError('--since 는 --until 보다 이전이어야 합니다.')
+
+        def progress(done: int):
+            self.stdout.write(f'{done}', ending='\r')
+            self.stdout.flush()
+
+        started_at = time.perf_counter()
+        done = analytics.backfill(since, until, options['batch_size'], progress)
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"{since.isoformat() if since else '처음'} ~ {until.isoformat()}: 예측 {done}개 ({elapsed:.1f} s)"
+        ))
+        self.stdout.write('Prediction 이 남지 않는 동기 예측 실패 건수는 다시 만들 수 없어 이 구간에서 빠집니다.')
+
+    def _parse(self, options, name: str) -> typing.Optional[datetime.datetime]:
+        if options[name] is None:
+            return None
+        value = parse_datetime(options[name])
+        if value is None:
+            raise CommandError(f'--{name} 는 ISO 8601 형식의 시각이어야 합니다.')
+        return timezone.make_aware(value) if timezone.is_naive(value) else value
@@ -0,0 +1,186 @@
+import asyncio
+import concurrent.futures
+import importlib
+import io
+import tempfile
+import time
+import typing
+
+import numpy
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from django.urls import clear_url_caches
+
+from api.core import media, metrics, synthetic
+from api.models import Prediction
+
+
+PATH = '/api/v1/predict/'
+
+
+class _SlowInput(io.RawIOBase):
+    """`chunks` 를 하나씩, 매번 `delay` 초를 기다린 뒤 내주는 wsgi.input (느린 모바일 업로드)"""
+
+    def __init__(self, chunks: typing.List[bytes], delay: float) -> None:
+        self._chunks = list(chunks)
+        self._delay = delay
+        self._buffer = b''
+
+    def readable(self) -> bool:
+        return True
+
+    def read(self, size: int = -1) -> bytes:
+        if not self._buffer and self._chunks:
+            time.sleep(self._delay)
+            self._buffer = self._chunks.pop(0)
+        if size is None or size < 0:
+            size = len(self._buffer)
+        data, self._buffer = self._buffer[:size], self._buffer[size:]
+        return data
+
+
+def _split(body: bytes, n: int) -> typing.List[bytes]:
+    size = -(-len(body) // n)
+    return [body[i:i + size] for i in range(0, len(body), size)]
+
+
+def _reload_urls() -> None:
+    """`ASYNC_VIEWS` 에 따라 view 를 고르는 URLconf 를 다시 불러온다."""
+    from api import urls as api_urls
+    from config import urls as config_urls
+
+    importlib.reload(api_urls)
+    importlib.reload(config_urls)
+    clear_url_caches()
+
+
+class Command(BaseCommand):
+    help = '느린 업로드를 보내는 동시 클라이언트 N개로 WSGI(동기 view)와 ASGI(비동기 view)의 /predict/ 처리량을 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=100, help='동시에 업로드하는 클라이언트 수')
+        parser.add_argument('--upload-seconds', type=float, default=1.0, help='업로드 하나를 보내는 데 걸리는 시간')
+        parser.add_argument('--chunks', type=int, default=10, help='업로드를 나누어 보낼 조각 수')
+        parser.add_argument('--threads', type=int, default=8, help='WSGI 서버의 요청 처리 스레드 수 (gunicorn --threads)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        image = next(synthetic.make_pill_images(1, seed=options['seed']))
+        body = encode_multipart(BOUNDARY, {'raw_image': SimpleUploadedFile('pill.jpg', image.data)})
+        chunks = _split(body, options['chunks'])
+        delay = options['upload_seconds'] / len(chunks)
+
+        last_pk = Prediction.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+        # 같은 사진이므로 두 번째 요청부터는 예측 캐시가 처리한다. 측정 대상은 업로드 동안의 동시성이다.
+        with tempfile.TemporaryDirectory() as media_root, override_settings(MEDIA_ROOT=media_root):
+            try:
+                with override_settings(ASYNC_VIEWS=False):
+                    _reload_urls()
+                    wsgi = self._run_wsgi(chunks, delay, options['clients'], options['threads'])
+                with override_settings(ASYNC_VIEWS=True):
+                    _reload_urls()
+                    asgi = asyncio.run(self._run_asgi(chunks, delay, options['clients']))
+            finally:
+                _reload_urls()
+                media.flush()
+                Prediction.objects.filter(pk__gt=last_pk).delete()
+
+        self.stdout.write(
+            f"{options['clients']} clients, {options['upload_seconds']:.1f} s uploads, {len(body)} bytes each"
+        )
+        self._print(f"WSGI ({options['threads']} threads)", *wsgi)
+        self._print('ASGI (async views)', *asgi)
+
+    def _print(self, label: str, elapsed: float, latencies: typing.List[float], statuses: typing.List[int]):
+        ok = sum(200 <= s < 300 for s in statuses)
+        self.stdout.write(
+            f'{label:>22}: {len(latencies) / elapsed:7.1f} req/s, '
+            f'p50 {numpy.percentile(latencies, 50):6.2f} s, p95 {numpy.percentile(latencies, 95):6.2f} s, '
+            f'{ok}/{len(statuses)} ok ({elapsed:.1f} s)'
+        )
+
+    def _run_wsgi(self, chunks: typing.List[bytes], delay: float, clients: int, threads: int):
+        application = WSGIHandler()
+        length = sum(map(len, chunks))
+
+        def request(started_at: float) -> typing.Tuple[float, int]:
+            statuses = []
+            environ = {
+                'REQUEST_METHOD': 'POST',
+                'PATH_INFO': PATH,
+                'QUERY_STRING': '',
+                'CONTENT_TYPE': MULTIPART_CONTENT,
+                'CONTENT_LENGTH': str(length),
+                'SERVER_NAME': 'testserver',
+                'SERVER_PORT': '80',
+                'SERVER_PROTOCOL': 'HTTP/1.1',
+                'wsgi.url_scheme': 'http',
+                'wsgi.input': _SlowInput(chunks, delay),
+                'wsgi.errors': io.StringIO(),
+            }
+            response = application(environ, lambda status, headers: statuses.append(int(status.split()[0])))
+            b''.join(response)
+            response.close()
+            return time.perf_counter() - started_at, statuses[0]
+
+        started_at = time.perf_counter()
+        with concurrent.futures.ThreadPoolExecutor(threads) as pool:
+            # 모든 클라이언트가 동시에 접속하고, 처리 스레드가 빌 때까지 기다리는 시간도 지연 시간에 포함한다.
+            results = list(pool.map(request, [started_at] * clients))
+        elapsed = time.perf_counter() - started_at
+        return elapsed, [r[0] for r in results], [r[1] for r in results]
+
+    async def _run_asgi(self, chunks: typing.List[bytes], delay: float, clients: int):
+        application = ASGIHandler()
+        length = sum(map(len, chunks))
+
+        async def request(started_at: float) -> typing.Tuple[float, int]:
+            pending = list(chunks)
+            done = asyncio.Event()
+            statuses = []
+
+            async def receive():
+                if pending:
+                    await asyncio.sleep(delay)
+                    chunk = pending.pop(0)
+                    return {'type': 'http.request', 'body': chunk, 'more_body': bool(pending)}
+                await done.wait()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    statuses.append(message['status'])
+                elif not message.get('more_body'):
+                    done.set()
+
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': 'POST',
+                'scheme': 'http',
+                'path': PATH,
+                'raw_path': PATH.encode(),
+                'query_string': b'',
+                'root_path': '',
+                'headers': [
+                    (b'host', b'testserver'),
+                    (b'content-type', MULTIPART_CONTENT.encode()),
+                    (b'content-length', str(length).encode()),
+                ],
+                'client': ('127.0.0.1', 0),
+                'server': ('testserver', 80),
+            }
+            await application(scope, receive, send)
+            return time.perf_counter() - started_at, statuses[0]
+
+        started_at = time.perf_counter()
+        results = await asyncio.gather(*(request(started_at) for _ in range(clients)))
+        elapsed = time.perf_counter() - started_at
+        return elapsed, [r[0] for r in results], [r[1] for r in results]
@@ -0,0 +1,48 @@
+import tempfile
+import time
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import Client, override_settings
+
+from api.core import media, metrics, prediction_cache, synthetic
+
+
+class Command(BaseCommand):
+    help = '사진 N장을 /predict/ 로 한 장씩 보낼 때와 /predict/batch/ 로 한 번에 보낼 때의 처리량을 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=12)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        images = [
+            (f'pill-{i}.jpg', image.data)
+            for i, image in enumerate(synthetic.make_pill_images(options['images'], seed=options['seed']))
+        ]
+        client = Client()
+        # 같은 사진이 캐시로 처리되지 않도록 캐시를 끄고, 저장된 파일과 행은 측정 후 버린다.
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root, PREDICTION_CACHE={'ENABLED': False}), \
+                transaction.atomic():
+            prediction_cache.get_cache.cache_clear()
+
+            started_at = time.perf_counter()
+            for name, data in images:
+                client.post('/api/v1/predict/', {'raw_image': SimpleUploadedFile(name, data)})
+            sequential = time.perf_counter() - started_at
+
+            started_at = time.perf_counter()
+            client.post('/api/v1/predict/batch/', {'raw_image': [SimpleUploadedFile(name, data) for name, data in images]})
+            batch = time.perf_counter() - started_at
+
+            # 임시 디렉터리가 지워지기 전에 백그라운드 쓰기를 마친다.
+            media.flush()
+            transaction.set_rollback(True)
+        prediction_cache.get_cache.cache_clear()
+
+        n = len(images)
+        self.stdout.write(f'sequential: {n / sequential:6.2f} images/s ({sequential:.2f} s)')
+        self.stdout.write(f'     batch: {n / batch:6.2f} images/s ({batch:.2f} s)')
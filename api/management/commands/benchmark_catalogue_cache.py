@@ -0,0 +1,94 @@
+import csv
+import io
+import time
+import typing
+
+from django.db import connection, transaction
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from api.core import catalogue, metrics, synthetic
+from api.models import DrugFullSpecification
+
+
+SEARCH = '/api/v1/search/'
+
+
+class Command(BaseCommand):
+    help = '검색 응답 캐시의 miss/hit/304 지연 시간을 재고, 시트를 올리면 바로 새 응답이 나가는지 확인합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=20000, help='모자라면 합성 데이터를 추가하고 끝나면 롤백합니다.')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--page-size', type=int, default=100)
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        client = Client()
+        with transaction.atomic():
+            missing = options['rows'] - DrugFullSpecification.objects.count()
+            if missing > 0:
+                DrugFullSpecification.objects.bulk_create(synthetic.make_specifications(missing), batch_size=1000)
+            catalogue.bump()
+            params = {'DRUG_SHAPE': '원형', 'page_size': options['page_size']}
+            self._benchmark(client, params, options['requests'])
+            self._verify_invalidation(client, params)
+            transaction.set_rollback(True)
+
+    def _benchmark(self, client: Client, params: typing.Dict[str, typing.Any], n: int):
+        before = metrics.catalogue_cache_counts()
+        # 버전을 올리면 캐시를 비우지 않고도 매번 miss 가 된다. (롤백되므로 남지 않는다)
+        miss = self._time(lambda: client.get(SEARCH, params), n, setup=catalogue.bump)
+        response = client.get(SEARCH, params)
+        etag = response['ETag']
+        hit = self._time(lambda: client.get(SEARCH, params), n)
+        not_modified = self._time(lambda: client.get(SEARCH, params, HTTP_IF_NONE_MATCH=etag), n)
+
+        with CaptureQueriesContext(connection) as queries:
+            status = client.get(SEARCH, params, HTTP_IF_NONE_MATCH=etag).status_code
+        self.stdout.write(f"{DrugFullSpecification.objects.count()} rows, page_size {params['page_size']}")
+        self.stdout.write(f'{"miss":>14}: {miss * 1000:8.2f} ms')
+        self.stdout.write(f'{"hit":>14}: {hit * 1000:8.2f} ms')
+        self.stdout.write(f'{"304":>14}: {not_modified * 1000:8.2f} ms  (status {status}, {len(queries)} query: 약품 목록 버전)')
+
+        after = metrics.catalogue_cache_counts()
+        total = sum(after.values()) - sum(before.values())
+        if total:
+            self.stdout.write('  ' + ', '.join(
+                f'{name} {(after[name] - before[name]) / total:.1%}' for name in metrics.CATALOGUE_CACHE_RESULTS
+            ))
+
+    def _verify_invalidation(self, client: Client, params: typing.Dict[str, typing.Any]):
+        """시트를 올린 직후 같은 요청이 캐시나 이전 ETag 로 처리되지 않는지 확인한다."""
+        old = client.get(SEARCH, params)
+        spec = synthetic.make_specifications(1, seed=1, first_item_seq=1)[0]
+        spec.DRUG_SHAPE = params['DRUG_SHAPE']
+        fields = [f.name for f in DrugFullSpecification._meta.concrete_fields if f.editable and not f.primary_key]
+        sheet = io.StringIO()
+        writer = csv.writer(sheet)
+        writer.writerow(fields)
+        writer.writerow(['' if getattr(spec, name) is None else getattr(spec, name) for name in fields])
+        response = client.post('/api/v1/upload/', {'sheet': SimpleUploadedFile('sheet.csv', sheet.getvalue().encode())})
+        if response.status_code != 201 or response.json()['inserted'] != 1:
+            raise CommandError(f'시트를 올리지 못했습니다: {response.status_code} {response.content[:200]}')
+
+        new = client.get(SEARCH, params, HTTP_IF_NONE_MATCH=old['ETag'])
+        if new.status_code != 200 or new['ETag'] == old['ETag']:
+            raise CommandError(f'업로드 후에도 이전 응답이 나갔습니다: {new.status_code} {new.get("ETag")}')
+        if new.json()['results'][0]['ITEM_SEQ'] != spec.ITEM_SEQ:
+            raise CommandError('업로드한 약품이 검색 결과에 없습니다.')
+        self.stdout.write(self.style.SUCCESS(
+            f"업로드 직후 ETag {old['ETag']} → {new['ETag']}, 새 약품이 첫 결과로 나옴"
+        ))
+
+    def _time(self, request: typing.Callable[[], typing.Any], n: int, setup: typing.Callable[[], None] = lambda: None) -> float:
+        elapsed = 0.0
+        for _ in range(n):
+            setup()
+            started_at = time.perf_counter()
+            request()
+            elapsed += time.perf_counter() - started_at
+        return elapsed / n
+
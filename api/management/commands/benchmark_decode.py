@@ -0,0 +1,45 @@
+import multiprocessing
+import resource
+import time
+import typing
+
+import cv2
+import numpy
+
+from django.core.files import File
+from django.core.management.base import BaseCommand
+
+from api.core import converters, metrics
+
+
+def _decode(mode: str, paths: typing.List[str], repeat: int) -> typing.Tuple[float, int]:
+    """자식 프로세스에서 실행: (이미지당 평균 디코딩 시간, 최대 RSS KiB)"""
+    started_at = time.perf_counter()
+    for _ in range(repeat):
+        for path in paths:
+            with open(path, 'rb') as f:
+                if mode == 'full':
+                    buf = numpy.asarray(bytearray(f.read()), dtype=numpy.uint8)
+                    mat = cv2.imdecode(buf, cv2.IMREAD_COLOR)
+                else:
+                    mat = converters.convert_file_to_mat(File(f))
+            cv2.resize(mat, converters.DECODE_MIN_SHAPE)
+    elapsed = (time.perf_counter() - started_at) / (repeat * len(paths))
+    return elapsed, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+class Command(BaseCommand):
+    help = '기존 전체 해상도 디코딩과 축소/zero-copy 디코딩의 시간, 최대 RSS 를 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+', help='측정에 사용할 (큰) JPEG 파일들')
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        context = multiprocessing.get_context('spawn')
+        for mode in ('full', 'reduced'):
+            # 모드마다 새 프로세스에서 측정해야 최대 RSS 가 서로 섞이지 않는다.
+            with context.Pool(1) as pool:
+                elapsed, max_rss = pool.apply(_decode, (mode, options['paths'], options['repeat']))
+            self.stdout.write(f'{mode:>8}: {elapsed * 1000:8.2f} ms/image, max RSS {max_rss / 1024:8.1f} MiB')
@@ -0,0 +1,59 @@
+import time
+
+import numpy
+
+from django.db import connection, transaction
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext
+
+from api.core import drug_index, metrics, synthetic
+from api.models import ColorChoices, DrugFullSpecification, ShapeChoices
+
+
+class Command(BaseCommand):
+    help = '(모양, 색상) 후보 조회를 ORM 과 메모리 내 색인으로 각각 수행하여 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--synthetic', type=int, default=0, metavar='N',
+                            help='합성 데이터 N행을 추가한 상태로 측정하고 롤백합니다. (예: 25000)')
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        with transaction.atomic():
+            if options['synthetic']:
+                DrugFullSpecification.objects.bulk_create(synthetic.make_specifications(options['synthetic']), batch_size=1000)
+            self._benchmark(options['queries'], options['limit'])
+            transaction.set_rollback(True)
+        drug_index.invalidate()
+
+    def _benchmark(self, n_queries: int, limit: int):
+        rng = numpy.random.default_rng(0)
+        shapes = [c for c in ShapeChoices if c != ShapeChoices.UNKNOWN]
+        colors = [c for c in ColorChoices if c != ColorChoices.UNKNOWN]
+        keys = [(shapes[rng.integers(len(shapes))], colors[rng.integers(len(colors))]) for _ in range(n_queries)]
+        self.stdout.write(f'{DrugFullSpecification.objects.count()} rows, {n_queries} queries')
+
+        started_at = time.perf_counter()
+        for shape, color in keys:
+            list(DrugFullSpecification.objects.filter(
+                DRUG_SHAPE=shape.label,
+                COLOR_CLASS1__contains=color.label.split(' - ')[1].split('(')[0],
+            ).values_list('pk', flat=True)[:limit])
+        self._report('orm', time.perf_counter() - started_at, n_queries)
+
+        drug_index.invalidate()
+        started_at = time.perf_counter()
+        drug_index.get_index()
+        self.stdout.write(f'{"build":>8}: {(time.perf_counter() - started_at) * 1000:10.1f} ms')
+
+        with CaptureQueriesContext(connection) as queries:
+            started_at = time.perf_counter()
+            for shape, color in keys:
+                drug_index.lookup(shape, color, limit)
+            self._report('index', time.perf_counter() - started_at, n_queries)
+        self.stdout.write(f'{"":>8}  DB queries during lookups: {len(queries)}')
+
+    def _report(self, name: str, elapsed: float, n: int):
+        self.stdout.write(f'{name:>8}: {elapsed / n * 1e6:10.1f} us/query')
@@ -0,0 +1,79 @@
+import time
+import tracemalloc
+import typing
+
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+from api import views
+from api.core import metrics, synthetic
+from api.models import DrugFullSpecification
+from api.serializers import DrugSerializer
+
+
+class Command(BaseCommand):
+    help = '표가 커질 때 스트리밍 내보내기(/export/)와 serializer 로 목록 전체를 만드는 방식의 첫 바이트 시간과 최대 메모리를 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='2000,10000,40000',
+                            help='측정할 행 수 (쉼표로 구분). 모자란 만큼 합성 데이터를 추가하고 끝나면 롤백합니다.')
+        parser.add_argument('--output', choices=['ndjson', 'csv'], default='ndjson')
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        sizes = sorted(int(size) for size in options['sizes'].split(','))
+        self.stdout.write(f"{'rows':>8} | {'export TTFB':>11} {'total':>9} {'peak':>9} | {'serializer TTFB':>15} {'peak':>9}")
+        with transaction.atomic():
+            first_item_seq = 900000000
+            for size in sizes:
+                missing = size - DrugFullSpecification.objects.count()
+                if missing > 0:
+                    specs = synthetic.make_specifications(missing, seed=size, first_item_seq=first_item_seq)
+                    DrugFullSpecification.objects.bulk_create(specs, batch_size=1000)
+                    first_item_seq += missing
+                self._measure(size, options['output'])
+            transaction.set_rollback(True)
+
+    def _measure(self, size: int, output: str):
+        ttfb, total, n_bytes = self._time(lambda: self._stream(output))
+        peak = self._trace(lambda: self._stream(output))
+        serializer_ttfb, _, _ = self._time(self._serialize)
+        serializer_peak = self._trace(self._serialize)
+        self.stdout.write(
+            f'{size:>8} | {ttfb * 1000:>8.1f} ms {total:>7.2f} s {peak / 2**20:>5.1f} MiB '
+            f'| {serializer_ttfb * 1000:>12.1f} ms {serializer_peak / 2**20:>5.1f} MiB  ({n_bytes / 2**20:.1f} MiB sent)'
+        )
+
+    def _stream(self, output: str) -> typing.Iterator[bytes]:
+        request = APIRequestFactory().get('/api/v1/export/', {'output': output})
+        response = views.ExportView.as_view()(request)
+        yield from response.streaming_content
+
+    def _serialize(self) -> typing.Iterator[bytes]:
+        """`SearchView` 처럼 모든 행을 serializer 로 만든 뒤 한 번에 렌더링한다."""
+        yield JSONRenderer().render(DrugSerializer(DrugFullSpecification.objects.order_by('ITEM_SEQ'), many=True).data)
+
+    def _time(self, chunks: typing.Callable[[], typing.Iterator[bytes]]) -> typing.Tuple[float, float, int]:
+        """(첫 행을 받을 때까지의 시간, 전체 시간, 바이트 수). CSV 헤더처럼 행이 아닌 조각은 건너뛴다."""
+        started_at = time.perf_counter()
+        ttfb = None
+        n_bytes = 0
+        for chunk in chunks():
+            n_bytes += len(chunk)
+            if ttfb is None and chunk.count(b'\n') > 1:
+                ttfb = time.perf_counter() - started_at
+        total = time.perf_counter() - started_at
+        return ttfb if ttfb is not None else total, total, n_bytes
+
+    def _trace(self, chunks: typing.Callable[[], typing.Iterator[bytes]]) -> int:
+        """받은 조각을 바로 버리면서 잰 Python 힙의 최대 사용량"""
+        tracemalloc.start()
+        try:
+            for _ in chunks():
+                pass
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
@@ -0,0 +1,82 @@
+import time
+
+import numpy
+
+from django.db import connection, transaction
+from django.db.models import Q
+from django.core.management.base import BaseCommand
+from django.test.utils import CaptureQueriesContext
+
+from api.core import imprint_index, metrics, synthetic
+from api.models import DrugFullSpecification
+
+
+FIELDS = ['PRINT_FRONT', 'PRINT_BACK', 'MARK_CODE_FRONT_ANAL', 'MARK_CODE_BACK_ANAL']
+
+
+class Command(BaseCommand):
+    help = '각인 검색을 ORM(icontains)과 n-gram 색인으로 각각 수행하여 지연 시간과 재현율을 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--queries', type=int, default=1000)
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument('--synthetic', type=int, default=0, metavar='N',
+                            help='합성 데이터 N행을 추가한 상태로 측정하고 롤백합니다. (예: 25000)')
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        with transaction.atomic():
+            if options['synthetic']:
+                DrugFullSpecification.objects.bulk_create(synthetic.make_specifications(options['synthetic']), batch_size=1000)
+            self._benchmark(options['queries'], options['limit'])
+            transaction.set_rollback(True)
+        imprint_index.rebuild()
+
+    def _queries(self, n: int):
+        """실제 각인에서 만든 (질의, 정답 pk). 소문자, 앞뒤 바꿈, 공백 추가, 한 글자 빠뜨림, 180도 회전을 섞는다."""
+        rng = numpy.random.default_rng(0)
+        rows = list(DrugFullSpecification.objects.exclude(PRINT_FRONT=None).values_list('pk', 'PRINT_FRONT', 'PRINT_BACK'))
+        queries = []
+        for i in rng.integers(0, len(rows), size=n):
+            pk, front, back = rows[i]
+            text = front if not back or rng.random() < 0.5 else f'{back} {front}'
+            variant = rng.integers(0, 5)
+            if variant == 0:
+                text = text.lower()
+            elif variant == 1:
+                text = ' '.join(text)
+            elif variant == 2 and len(text) > 3:
+                j = rng.integers(len(text))
+                text = text[:j] + text[j + 1:]
+            elif variant == 3:
+                text = imprint_index.rotate(imprint_index.normalize(text))
+            queries.append((text, pk))
+        return queries
+
+    def _benchmark(self, n_queries: int, limit: int):
+        queries = self._queries(n_queries)
+        self.stdout.write(f'{DrugFullSpecification.objects.count()} rows, {n_queries} queries')
+
+        hits = 0
+        started_at = time.perf_counter()
+        for text, pk in queries:
+            condition = Q()
+            for field in FIELDS:
+                condition |= Q(**{f'{field}__icontains': text})
+            hits += pk in DrugFullSpecification.objects.filter(condition).values_list('pk', flat=True)[:limit]
+        self._report('orm', time.perf_counter() - started_at, n_queries, hits)
+
+        started_at = time.perf_counter()
+        imprint_index.rebuild()
+        self.stdout.write(f'{"build":>8}: {(time.perf_counter() - started_at) * 1000:10.1f} ms')
+
+        hits = 0
+        with CaptureQueriesContext(connection) as captured:
+            started_at = time.perf_counter()
+            for text, pk in queries:
+                hits += any(match.pk == pk for match in imprint_index.search(text, limit=limit))
+            self._report('index', time.perf_counter() - started_at, n_queries, hits)
+        self.stdout.write(f'{"":>8}  DB queries during searches: {len(captured)}')
+
+    def _report(self, name: str, elapsed: float, n: int, hits: int):
+        self.stdout.write(f'{name:>8}: {elapsed / n * 1e6:10.1f} us/query, 정답이 상위 목록에 있음 {hits / n:.1%}')
@@ -0,0 +1,150 @@
+import collections
+import functools
+import json
+import platform
+import time
+import typing
+
+import cv2
+import numpy
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.core import converters, media, metrics, synthetic
+from api.core.algorithms import PredictionModel
+from api.core.exceptions import NotDetectedException
+
+
+STAGES = [
+    'decode',
+    '_resize',
+    '_draw_mask',
+    '_draw_mask_via_chromakey',
+    '_white_balance',
+    '_denoise',
+    '_draw_mask_via_edges',
+    '_predict_shape',
+    '_predict_color',
+    '_to_munsell',
+    'encode',
+]
+
+
+class _StageTimer:
+    def __init__(self) -> None:
+        self.samples: typing.Dict[str, typing.List[float]] = collections.defaultdict(list)
+
+    def __call__(self, stage: str, func: typing.Callable, *args):
+        started_at = time.perf_counter()
+        result = func(*args)
+        self.samples[stage].append(time.perf_counter() - started_at)
+        return result
+
+
+def _run(timer: _StageTimer, data: bytes) -> PredictionModel:
+    """단계별 method 를 시간을 재는 함수로 바꿔 끼운 뒤 `PredictionModel.__init__` 을 그대로 실행한다."""
+    model = PredictionModel.__new__(PredictionModel)
+    for stage in STAGES:
+        method = getattr(model, stage, None)
+        if method is not None:
+            setattr(model, stage, functools.partial(timer, stage, method))
+    # 의약품 후보 조회는 DB 가 필요하므로 benchmark_drug_index 에서 따로 측정한다.
+    model._predict_drug = lambda: numpy.empty(0, dtype=numpy.int64)
+
+    mat = timer('decode', converters.convert_bytes_to_mat, data, PredictionModel.IMG_SHAPE)
+    model.__init__(mat)
+    timer('encode', lambda: (media.encode_image(model.mat), media.encode_mask(model.bin_mat)))
+    return model
+
+
+class Command(BaseCommand):
+    help = '합성 알약 사진으로 PredictionModel 의 단계별 지연 시간과 정확도를 측정합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--images', type=int, default=120)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--repeat', type=int, default=1, help='같은 이미지 묶음을 반복 측정할 횟수')
+        parser.add_argument('--save', metavar='PATH', help='결과를 JSON 기준값으로 저장합니다.')
+        parser.add_argument('--compare', metavar='PATH', help='저장된 기준값과 비교하여 성능 저하를 표시합니다.')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='p50 지연 시간이 기준보다 이 비율 이상 늘면 저하로 판단합니다. (기본 0.2)')
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        images = list(synthetic.make_pill_images(options['images'], seed=options['seed']))
+        timer = _StageTimer()
+        outcomes = collections.Counter()
+        strategies = collections.Counter()
+        n_shape = n_color = 0
+
+        # 첫 실행의 초기화 비용(모듈 로딩, 캐시 등)은 측정에서 제외한다.
+        _run(_StageTimer(), images[0].data)
+        started_at = time.perf_counter()
+        for _ in range(options['repeat']):
+            for image in images:
+                try:
+                    model = _run(timer, image.data)
+                except NotDetectedException as e:
+                    outcomes[type(e).__name__] += 1
+                    continue
+                outcomes['detected'] += 1
+                strategies[model.mask_strategy] += 1
+                n_shape += model.shape == image.shape
+                n_color += model.color == image.color
+        elapsed = time.perf_counter() - started_at
+        n_total = len(images) * options['repeat']
+
+        report = {
+            'environment': {'python': platform.python_version(), 'opencv': cv2.__version__, 'machine': platform.machine()},
+            'images': n_total,
+            'throughput': n_total / elapsed,
+            'stages': {
+                stage: {
+                    'p50_ms': float(numpy.percentile(timer.samples[stage], 50) * 1000),
+                    'p95_ms': float(numpy.percentile(timer.samples[stage], 95) * 1000),
+                }
+                for stage in STAGES if timer.samples[stage]
+            },
+            'accuracy': {
+                'detection': outcomes['detected'] / n_total,
+                'shape': n_shape / n_total,
+                'color': n_color / n_total,
+            },
+            'outcomes': dict(outcomes),
+            'mask_strategies': dict(strategies),
+        }
+        self._print(report)
+        if options['save']:
+            with open(options['save'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['compare']:
+            with open(options['compare']) as f:
+                baseline = json.load(f)
+            regressions = self._compare(report, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError('성능 저하: ' + ', '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('기준값 대비 성능 저하 없음'))
+
+    def _print(self, report: dict):
+        self.stdout.write(f"{report['images']} images, {report['throughput']:.1f} images/s")
+        for stage, stats in report['stages'].items():
+            self.stdout.write(f"{stage:>24}: p50 {stats['p50_ms']:8.2f} ms, p95 {stats['p95_ms']:8.2f} ms")
+        accuracy = report['accuracy']
+        self.stdout.write(
+            f"accuracy: detection {accuracy['detection']:.1%}, shape {accuracy['shape']:.1%}, color {accuracy['color']:.1%}"
+        )
+        self.stdout.write(f"outcomes: {report['outcomes']}")
+        self.stdout.write(f"mask strategies: {report.get('mask_strategies', {})}")
+
+    def _compare(self, report: dict, baseline: dict, tolerance: float) -> typing.List[str]:
+        regressions = []
+        for stage, stats in report['stages'].items():
+            before = baseline['stages'].get(stage)
+            if before and stats['p50_ms'] > before['p50_ms'] * (1 + tolerance):
+                regressions.append(f"{stage} p50 {before['p50_ms']:.2f} → {stats['p50_ms']:.2f} ms")
+        if report['throughput'] < baseline['throughput'] / (1 + tolerance):
+            regressions.append(f"throughput {baseline['throughput']:.1f} → {report['throughput']:.1f} images/s")
+        for key, value in report['accuracy'].items():
+            if value < baseline['accuracy'].get(key, 0):
+                regressions.append(f"{key} accuracy {baseline['accuracy'][key]:.1%} → {value:.1%}")
+        return regressions
@@ -0,0 +1,101 @@
+import datetime
+import time
+import typing
+
+import numpy
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.db.models.functions import TruncHour
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from api.core import analytics, metrics
+from api.core.exceptions import NotDetectedException
+from api.models import ColorChoices, Prediction, PredictionStatusChoices, ShapeChoices
+
+
+class Command(BaseCommand):
+    help = '예측이 쌓였을 때 Prediction 을 시간별로 GROUP BY 하는 조회와 집계(PredictionRollup) 조회를 비교하고 결과가 같은지 확인합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--predictions', type=int, default=500000, help='추가할 합성 예측 수. 끝나면 롤백합니다.')
+        parser.add_argument('--days', type=int, default=30, help='합성 예측의 요청 시각을 퍼뜨릴 기간')
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        until = analytics.bucket_of(timezone.now())
+        since = until - datetime.timedelta(days=options['days'])
+        with transaction.atomic():
+            self._populate(options['predictions'], since, until, options['seed'])
+
+            started_at = time.perf_counter()
+            done = analytics.backfill(None, until, options['batch_size'])
+            self.stdout.write(f'backfill: 예측 {done}개 {time.perf_counter() - started_at:.1f} s')
+
+            self.stdout.write(f"{'range':>8} | {'GROUP BY':>10} | {'rollup':>10}")
+            for days in (1, 7, options['days']):
+                window = (until - datetime.timedelta(days=days), until)
+                group_by = self._time(lambda: self._group_by(*window), options['repeat'])
+                rollup = self._time(lambda: analytics.summarize(*window), options['repeat'])
+                self.stdout.write(f'{days:>6} d | {group_by * 1000:>7.1f} ms | {rollup * 1000:>7.1f} ms')
+                self._verify(*window)
+            transaction.set_rollback(True)
+        self.stdout.write(self.style.SUCCESS('구간별 건수, 검출 수, 평균 지연 시간이 같음'))
+
+    def _populate(self, n: int, since: datetime.datetime, until: datetime.datetime, seed: int):
+        rng = numpy.random.default_rng(seed)
+        seconds = rng.uniform(0, (until - since).total_seconds(), size=n)
+        failed = rng.random(n) < 0.1
+        # 실제 요청처럼 흔한 모양, 색상(하양 원형 등)에 몰리도록 순위에 반비례하는 확률로 고른다.
+        shapes = rng.choice(ShapeChoices.values, size=n, p=self._skewed(len(ShapeChoices.values)))
+        colors = rng.choice(ColorChoices.values, size=n, p=self._skewed(len(ColorChoices.values)))
+        Prediction.objects.bulk_create((
+            Prediction(
+                shape=ShapeChoices.UNKNOWN if failed[i] else shapes[i],
+                color=ColorChoices.UNKNOWN if failed[i] else colors[i],
+                status=PredictionStatusChoices.FAILED if failed[i] else PredictionStatusChoices.DONE,
+                error=str(NotDetectedException.default_detail) if failed[i] else None,
+                requested_at=since + datetime.timedelta(seconds=float(seconds[i])),
+            )
+            for i in range(n)
+        ), batch_size=2000)
+        # created_at 은 auto_now 이므로 저장한 뒤에 요청 시각 기준으로 맞춘다.
+        Prediction.objects.update(created_at=F('requested_at') + datetime.timedelta(seconds=2))
+
+    def _skewed(self, n: int) -> numpy.ndarray:
+        p = 1 / numpy.arange(1, n + 1) ** 1.5
+        return p / p.sum()
+
+    def _group_by(self, since: datetime.datetime, until: datetime.datetime) -> typing.Dict[datetime.datetime, typing.Tuple[int, int]]:
+        """집계 없이 대시보드를 만들 때의 조회: 구간별 (건수, 검출 수)"""
+        rows = Prediction.objects.filter(
+            status__in=analytics.TERMINAL_STATUSES,
+            requested_at__gte=analytics.bucket_of(since),
+            requested_at__lt=until,
+        ).annotate(bucket=TruncHour('requested_at', tzinfo=datetime.timezone.utc)).values('bucket').annotate(
+            count=Count('pk'),
+            detected=Count('pk', filter=Q(status=PredictionStatusChoices.DONE)),
+        )
+        return {analytics.bucket_of(row['bucket']): (row['count'], row['detected']) for row in rows}
+
+    def _verify(self, since: datetime.datetime, until: datetime.datetime):
+        expected = self._group_by(since, until)
+        for summary in analytics.summarize(since, until):
+            bucket = datetime.datetime.fromisoformat(summary['bucket'].replace('Z', '+00:00'))
+            count, detected = expected.get(bucket, (0, 0))
+            if (summary['count'], summary['detected']) != (count, detected):
+                raise CommandError(f"{summary['bucket']}: 집계 {summary['count']}/{summary['detected']}, 예측 {count}/{detected}")
+            if count and abs(summary['mean_latency'] - 2) > 1e-6:
+                raise CommandError(f"{summary['bucket']}: 평균 지연 시간 {summary['mean_latency']}")
+
+    def _time(self, query: typing.Callable[[], typing.Any], n: int) -> float:
+        elapsed = 0.0
+        for _ in range(n):
+            started_at = time.perf_counter()
+            query()
+            elapsed += time.perf_counter() - started_at
+        return elapsed / n
@@ -0,0 +1,66 @@
+import time
+import typing
+
+from django.db import transaction
+from django.core.management.base import BaseCommand
+from rest_framework.renderers import JSONRenderer
+
+from api.core import metrics, synthetic
+from api.models import DrugFullSpecification
+from api.serializers import DrugProjection, DrugSerializer
+
+
+class Command(BaseCommand):
+    help = '약품 목록 직렬화를 DrugSerializer 와 DrugProjection(.values() + 필드별 변환)으로 각각 수행하여 초당 행 수를 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=5000, help='측정할 행 수. 모자라면 합성 데이터를 추가하고 끝나면 롤백합니다.')
+        parser.add_argument('--repeat', type=int, default=3)
+        parser.add_argument('--fields', default='ITEM_SEQ,ITEM_NAME,ITEM_IMAGE', help='투영(projection) 측정에 사용할 필드')
+
+    def handle(self, *args, **options):
+        metrics.keep_local()
+        with transaction.atomic():
+            missing = options['rows'] - DrugFullSpecification.objects.count()
+            if missing > 0:
+                DrugFullSpecification.objects.bulk_create(synthetic.make_specifications(missing), batch_size=1000)
+            self._benchmark(options['rows'], options['repeat'], options['fields'].split(','))
+            transaction.set_rollback(True)
+
+    def _benchmark(self, n_rows: int, repeat: int, fields: typing.List[str]):
+        queryset = DrugFullSpecification.objects.order_by('ITEM_SEQ')[:n_rows]
+        renderer = JSONRenderer()
+        full, projected = DrugProjection(), DrugProjection(fields)
+
+        expected = renderer.render(DrugSerializer(queryset, many=True).data)
+        if renderer.render(full.to_representation_many(queryset.values(*full.columns()))) != expected:
+            raise AssertionError('DrugProjection 의 출력이 DrugSerializer 와 다릅니다.')
+        expected = renderer.render([{name: row[name] for name in fields} for row in DrugSerializer(queryset, many=True).data])
+        if renderer.render(projected.to_representation_many(queryset.values(*projected.columns()))) != expected:
+            raise AssertionError(f'{fields} 투영의 출력이 DrugSerializer 와 다릅니다.')
+        self.stdout.write(f'{n_rows} rows, 렌더링한 JSON 이 DrugSerializer 와 바이트 단위로 같음')
+
+        instances = list(queryset)
+        full_rows = list(queryset.values(*full.columns()))
+        projected_rows = list(queryset.values(*projected.columns()))
+        cases = [
+            ('DrugSerializer', lambda: DrugSerializer(instances, many=True).data,
+             lambda: DrugSerializer(queryset.all(), many=True).data),
+            ('DrugProjection (all)', lambda: full.to_representation_many(full_rows),
+             lambda: full.to_representation_many(queryset.values(*full.columns()))),
+            (f'DrugProjection ({len(fields)} fields)', lambda: projected.to_representation_many(projected_rows),
+             lambda: projected.to_representation_many(queryset.values(*projected.columns()))),
+        ]
+        self.stdout.write(f"{'':>26} {'serialize':>14} {'query + serialize + render':>28}")
+        for name, serialize, end_to_end in cases:
+            serialize_time = self._best(serialize, repeat)
+            total_time = self._best(lambda: renderer.render(end_to_end()), repeat)
+            self.stdout.write(f'{name:>26} {n_rows / serialize_time:>9.0f} rows/s {n_rows / total_time:>18.0f} rows/s')
+
+    def _best(self, func: typing.Callable[[], typing.Any], repeat: int) -> float:
+        best = float('inf')
+        for _ in range(repeat):
+            started_at = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started_at)
+        return best
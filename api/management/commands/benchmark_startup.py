@@ -0,0 +1,95 @@
+import json
+import os
+import subprocess
+import sys
+import textwrap
+
+from django.core.management.base import BaseCommand
+
+
+# 새 인터프리터에서 WSGI 애플리케이션을 불러오는 시간을 재고, gunicorn 처럼 fork 한 워커에서
+# 첫 예측의 지연 시간과 워커별 메모리(PSS/USS)를 잰다.
+_SCRIPT = textwrap.dedent('''
+    import importlib, json, os, sys, time
+
+    started_at = time.perf_counter()
+    config_settings = importlib.import_module(os.environ['DJANGO_SETTINGS_MODULE'])
+    config_settings.WARM_UP_ON_READY = {warm_up}
+    config_settings.METRICS = dict(config_settings.METRICS, DIR=None)
+    import config.wsgi  # noqa: F401
+    import config.urls  # noqa: F401
+    boot = time.perf_counter() - started_at
+    modules = [name for name in ('cv2', 'colour', 'pandas', 'openpyxl') if name in sys.modules]
+
+    def memory():
+        values = {{}}
+        try:
+            with open('/proc/self/smaps_rollup') as f:
+                for line in f:
+                    key, _, value = line.partition(':')
+                    if key in ('Rss', 'Pss', 'Private_Clean', 'Private_Dirty'):
+                        values[key] = int(value.split()[0])
+        except OSError:
+            return {{}}
+        return {{'rss_kb': values['Rss'], 'pss_kb': values['Pss'], 'uss_kb': values['Private_Clean'] + values['Private_Dirty']}}
+
+    from api.core import executor, synthetic
+    data = next(synthetic.make_pill_images(1, seed=0)).data
+    workers = []
+    for _ in range({workers}):
+        read_fd, write_fd = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            os.close(read_fd)
+            started_at = time.perf_counter()
+            try:
+                executor.run(data)
+            except Exception:
+                pass
+            first = time.perf_counter() - started_at
+            with os.fdopen(write_fd, 'w') as f:
+                json.dump({{'first_prediction': first, **memory()}}, f)
+                f.flush()
+                # 모든 워커가 살아 있는 동안 잰 PSS 가 공유 정도를 보여주도록 부모가 다 읽을 때까지 기다린다.
+                time.sleep(1.0)
+            os._exit(0)
+        os.close(write_fd)
+        workers.append((pid, read_fd))
+    results = []
+    for pid, read_fd in workers:
+        with os.fdopen(read_fd) as f:
+            results.append(json.load(f))
+        os.waitpid(pid, 0)
+    print(json.dumps({{'boot': boot, 'modules': modules, 'master': memory(), 'workers': results}}))
+''')
+
+
+class Command(BaseCommand):
+    help = 'WSGI 워커의 기동 시간, 첫 예측 지연 시간, 워커별 메모리를 `WARM_UP_ON_READY` 를 끄고 켠 상태로 비교합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='fork 할 워커 수 (gunicorn --workers)')
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        for warm_up in (False, True):
+            runs = [self._run(warm_up, options['workers']) for _ in range(options['repeat'])]
+            boot = min(run['boot'] for run in runs)
+            workers = [worker for run in runs for worker in run['workers']]
+            first = min(worker['first_prediction'] for worker in workers)
+            self.stdout.write(f"WARM_UP_ON_READY={warm_up}: boot {boot * 1000:7.1f} ms, loaded {runs[0]['modules']}")
+            self.stdout.write(f"    first prediction in a worker: {first * 1000:7.1f} ms")
+            if runs[0]['master']:
+                rss = sum(worker['rss_kb'] for worker in workers) / len(workers)
+                pss = sum(worker['pss_kb'] for worker in workers) / len(workers)
+                uss = sum(worker['uss_kb'] for worker in workers) / len(workers)
+                self.stdout.write(f"    master RSS {runs[0]['master']['rss_kb'] / 1024:6.1f} MiB")
+                self.stdout.write(f"    per worker RSS {rss / 1024:6.1f} MiB, PSS {pss / 1024:6.1f} MiB, USS {uss / 1024:6.1f} MiB")
+
+    def _run(self, warm_up: bool, workers: int) -> dict:
+        env = dict(os.environ, PYTHONWARNINGS='ignore')
+        script = _SCRIPT.format(warm_up=warm_up, workers=workers)
+        output = subprocess.run(
+            [sys.executable, '-c', script], env=env, check=True, capture_output=True, text=True,
+        ).stdout
+        return json.loads(output.strip().splitlines()[-1])
@@ -0,0 +1,49 @@
+import numpy
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.core import munsell
+
+
+class Command(BaseCommand):
+    help = 'sRGB → Munsell 변환 테이블을 미리 계산하여 MUNSELL_TABLE_PATH 에 저장합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', default=settings.MUNSELL_TABLE_PATH)
+        parser.add_argument('--verify', type=int, default=1000, metavar='N',
+                            help='무작위 색상 N개를 colour-science 의 결과와 비교하여 허용 오차를 넘으면 실패합니다. (0: 생략)')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--processes', type=int, default=None,
+                            help='테이블 계산에 사용할 프로세스 수 (기본값: CPU 코어 수)')
+
+    def handle(self, *args, **options):
+        def progress(done: int, total: int):
+            if done % munsell.LEVELS**2 == 0 or done == total:
+                self.stdout.write(f'{done}/{total}', ending='\r')
+                self.stdout.flush()
+
+        table = munsell.build_table(options['processes'], progress)
+        munsell.save_table(table, options['output'])
+        n_missing = int(numpy.isnan(table['value']).sum())
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f"{options['output']} 저장 완료 ({table.nbytes} bytes, 범위 밖 셀 {n_missing}개)"
+        ))
+        munsell.reset()
+        if options['verify']:
+            self._verify(options['verify'], options['seed'])
+
+    def _verify(self, n: int, seed: int):
+        """무작위 색상 n개의 양자화 오차가 `munsell` 의 허용 오차를 넘으면 실패한다."""
+        rng = numpy.random.default_rng(seed)
+        error = munsell.measure_error(rng.integers(0, 256, size=(n, 3), dtype=numpy.uint8))
+        message = (
+            f'검증: {error.n_compared}개 비교, '
+            f'value 오차 {error.value:.3f} (허용 {munsell.MAX_VALUE_ERROR}), '
+            f'chroma 오차 {error.chroma:.3f} (허용 {munsell.MAX_CHROMA_ERROR}), '
+            f'ColorChoices 일치율 {error.match_rate:.2%} (최소 {munsell.MIN_MATCH_RATE:.0%})'
+        )
+        if not error.ok:
+            raise CommandError(message)
+        self.stdout.write(self.style.SUCCESS(message))
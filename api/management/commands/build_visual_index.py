@@ -0,0 +1,67 @@
+import time
+
+import numpy
+
+from django.core.management.base import BaseCommand
+
+from api.core import visual_index
+
+
+class Command(BaseCommand):
+    help = '약품 참고 사진(ITEM_IMAGE)의 특징 벡터를 계산하여 VISUAL_INDEX["PATH"] 의 시각 색인을 만들거나 갱신합니다.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rebuild', action='store_true', help='기존 색인을 버리고 모든 약품을 다시 계산합니다.')
+        parser.add_argument('--image-dir', default=None,
+                            help='ITEM_IMAGE 를 내려받는 대신 <ITEM_SEQ>.jpg|png 파일을 읽을 디렉터리')
+        parser.add_argument('--threads', type=int, default=4, help='사진을 내려받고 계산할 스레드 수')
+        parser.add_argument('--queries', type=int, default=100, metavar='N',
+                            help='갱신 후 무작위 질의 N개로 검색 지연 시간을 잽니다. (0: 생략)')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        def progress(done: int, total: int):
+            if done % 100 == 0 or done == total:
+                self.stdout.write(f'{done}/{total}', ending='\r')
+                self.stdout.flush()
+
+        started_at = time.perf_counter()
+        result = visual_index.update(options['rebuild'], options['image_dir'], options['threads'], progress)
+        elapsed = time.perf_counter() - started_at
+        self.stdout.write('')
+        for error in result.errors[:10]:
+            self.stderr.write(error)
+        if len(result.errors) > 10:
+            self.stderr.write(f'... 외 {len(result.errors) - 10}개')
+
+        index = visual_index.get_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'{visual_index.index_path()}: {len(index) if index is not None else 0}개 '
+            f'(추가/갱신 {result.indexed}, 삭제 {result.removed}, 실패 {result.failed}, {elapsed:.1f} s)'
+        ))
+        if index is not None and options['queries']:
+            self._measure(index, options['queries'], options['seed'])
+
+    def _measure(self, index: visual_index.VisualIndex, n: int, seed: int):
+        """색인에 있는 벡터에 잡음을 더한 질의로 전체 top-k 검색과 후보 정렬의 지연 시간을 잰다."""
+        rng = numpy.random.default_rng(seed)
+        positions = rng.integers(0, len(index), size=n)
+        queries = index.rows['descriptor'][positions] + rng.normal(0, 0.01, size=(n, visual_index.DIM)).astype(numpy.float32)
+        candidates = index.item_seqs[rng.integers(0, len(index), size=min(len(index), 200))]
+
+        hits = 0
+        started_at = time.perf_counter()
+        for position, query in zip(positions, queries):
+            item_seqs, _ = index.search(query, 20)
+            hits += bool(len(item_seqs)) and item_seqs[0] == index.item_seqs[position]
+        search = (time.perf_counter() - started_at) / n
+
+        started_at = time.perf_counter()
+        for query in queries:
+            index.rank(query, candidates)
+        rank = (time.perf_counter() - started_at) / n
+
+        self.stdout.write(
+            f'top-20 검색 {search * 1e6:.0f} us/query (자기 자신이 1위 {hits / n:.0%}), '
+            f'후보 {len(candidates)}개 정렬 {rank * 1e6:.0f} us/query'
+        )
@@ -0,0 +1,60 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from api.core import offline
+
+
+class Command(BaseCommand):
+    help = ('디렉터리나 목록 파일(한 줄에 경로 하나)의 사진을 프로세스 풀에서 예측하여 CSV 또는 Parquet 로 저장합니다. '
+            '결과에 이미 있는 사진은 건너뛰므로 중단된 작업은 같은 명령으로 이어서 처리합니다.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('source', help='사진 디렉터리 또는 목록 파일')
+        parser.add_argument('output', help='결과 CSV 파일 또는 Parquet 디렉터리')
+        parser.add_argument('--format', choices=list(offline.OUTPUTS), default=None,
+                            help='기본값: output 이 .parquet 로 끝나면 parquet, 아니면 csv')
+        parser.add_argument('--workers', type=int, default=offline.cpu_count(), help='예측 프로세스 수 (기본값: 사용 가능한 코어 수)')
+        parser.add_argument('--chunk-size', type=int, default=16, help='워커에 한 번에 넘길 사진 수')
+        parser.add_argument('--flush-every', type=int, default=500, help='이만큼 끝날 때마다 결과를 저장합니다.')
+        parser.add_argument('--overwrite', action='store_true', help='기존 결과를 지우고 처음부터 예측합니다.')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['source']):
+            raise CommandError(f"{options['source']} 가 없습니다.")
+        output_format = options['format'] or ('parquet' if options['output'].endswith('.parquet') else 'csv')
+        try:
+            output = offline.OUTPUTS[output_format](options['output'])
+        except ImportError as e:
+            raise CommandError(f'Parquet 로 저장하려면 pyarrow 가 필요합니다: {e}')
+        if options['overwrite']:
+            output.clear()
+
+        def progress(state: offline.Progress):
+            self.stdout.write(f'{state.done} ({state.failed} failed) {state.images_per_second:.1f} images/s', ending='\r')
+            self.stdout.flush()
+
+        try:
+            state = offline.run(
+                offline.iter_paths(options['source']),
+                output,
+                workers=max(options['workers'], 1),
+                chunk_size=max(options['chunk_size'], 1),
+                flush_every=max(options['flush_every'], 1),
+                start_method=settings.PREDICTION_EXECUTOR['START_METHOD'],
+                progress=progress,
+            )
+        except KeyboardInterrupt:
+            self.stdout.write('')
+            raise CommandError('중단되었습니다. 저장된 결과는 다시 실행할 때 건너뜁니다.')
+
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'{state.done} images in {state.elapsed:.1f} s: {state.images_per_second:.2f} images/s '
+            f"with {options['workers']} workers (건너뜀 {state.skipped}, 실패 {state.failed})"
+        ))
+        if state.done:
+            self.stdout.write(f'사진당 예측 {state.predict_seconds / state.done * 1000:.1f} ms (워커 기준)')
+        for error_type, count in sorted(state.errors.items(), key=lambda item: -item[1]):
+            self.stdout.write(f'  {error_type}: {count}')
@@ -0,0 +1,24 @@
+import datetime
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.core import jobs
+
+
+class Command(BaseCommand):
+    help = '비동기 예측 작업(status=pending)을 처리합니다. 여러 프로세스를 동시에 실행할 수 있습니다.'
+
+    def add_arguments(self, parser):
+        config = settings.PREDICTION_JOBS
+        parser.add_argument('--poll-interval', type=float, default=config['POLL_INTERVAL'])
+        parser.add_argument('--lease', type=float, default=config['LEASE'],
+                            help='처리 중인 작업을 다른 워커가 다시 가져가기까지의 시간(초)')
+        parser.add_argument('--once', action='store_true', help='대기 중인 작업이 없으면 종료합니다.')
+
+    def handle(self, *args, **options):
+        jobs.run_worker(
+            poll_interval=options['poll_interval'],
+            lease=datetime.timedelta(seconds=options['lease']),
+            once=options['once'],
+        )
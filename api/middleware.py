@@ -0,0 +1,32 @@
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from api.core import metrics
+
+
+class ServerTimingMiddleware:
+    """요청 중 `metrics.timed` 로 기록된 구간을 `Server-Timing` 헤더로 돌려준다."""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started_at = time.perf_counter()
+        with metrics.collect() as timings:
+            response = self.get_response(request)
+        response['Server-Timing'] = metrics.format_server_timing(timings, time.perf_counter() - started_at)
+        return response
+
+    async def __acall__(self, request):
+        started_at = time.perf_counter()
+        with metrics.collect() as timings:
+            response = await self.get_response(request)
+        response['Server-Timing'] = metrics.format_server_timing(timings, time.perf_counter() - started_at)
+        return response
@@ -0,0 +1,79 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:36
+
+import api.models
+import django.core.validators
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DrugFullSpecification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ITEM_SEQ', models.IntegerField(verbose_name='품목일련번호')),
+                ('ITEM_NAME', models.CharField(max_length=4000, verbose_name='품목명')),
+                ('ENTP_SEQ', models.IntegerField(verbose_name='업체일련번호')),
+                ('ENTP_NAME', models.CharField(max_length=300, verbose_name='업체명')),
+                ('CHARTN', models.CharField(max_length=4000, verbose_name='성상')),
+                ('ITEM_IMAGE', models.CharField(max_length=100, null=True, verbose_name='큰제품이미지')),
+                ('PRINT_FRONT', models.CharField(max_length=200, null=True, verbose_name='표시(앞)')),
+                ('PRINT_BACK', models.CharField(max_length=200, null=True, verbose_name='표시(뒤)')),
+                ('DRUG_SHAPE', models.CharField(max_length=20, verbose_name='의약품모양')),
+                ('COLOR_CLASS1', models.CharField(max_length=200, verbose_name='색깔(앞)')),
+                ('COLOR_CLASS2', models.CharField(max_length=200, null=True, verbose_name='색깔(뒤)')),
+                ('LINE_FRONT', models.CharField(max_length=40, null=True, verbose_name='분할선(앞)')),
+                ('LINE_BACK', models.CharField(max_length=40, null=True, verbose_name='분할선(뒤)')),
+                ('LENG_LONG', models.CharField(max_length=20, null=True, verbose_name='크기(장축)')),
+                ('LENG_SHORT', models.CharField(max_length=20, null=True, verbose_name='크기(단축)')),
+                ('THICK', models.CharField(max_length=30, null=True, verbose_name='크기(두께)')),
+                ('IMG_REGIST_TS', models.DateField(verbose_name='약학정보원이미지생성일')),
+                ('CLASS_NO', models.IntegerField(verbose_name='분류번호')),
+                ('ETC_OTC_CODE', models.IntegerField(verbose_name='전문/일반')),
+                ('ITEM_PERMIT_DATE', models.DateField(verbose_name='품목허가일자')),
+                ('SHAPE_CODE', models.IntegerField(verbose_name='제형코드')),
+                ('MARK_CODE_FRONT_ANAL', models.CharField(max_length=30, null=True, verbose_name='마크내용(앞)')),
+                ('MARK_CODE_BACK_ANAL', models.CharField(max_length=30, null=True, verbose_name='마크내용(뒤)')),
+                ('MARK_CODE_FRONT_IMG', models.CharField(max_length=100, null=True, verbose_name='마크이미지(앞)')),
+                ('MARK_CODE_BACK_IMG', models.CharField(max_length=100, null=True, verbose_name='마크이미지(뒤)')),
+                ('ITEM_ENG_NAME', models.CharField(blank=True, max_length=2000, null=True, verbose_name='제품영문명')),
+                ('EDI_CODE', models.CharField(max_length=100, null=True, verbose_name='보험코드')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Prediction',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.ImageField(upload_to=api.models.get_upload_path)),
+                ('raw_image', models.ImageField(upload_to=api.models.get_upload_path_of_raw, validators=[django.core.validators.FileExtensionValidator(['jpg', 'png'])])),
+                ('mask_image', models.ImageField(upload_to=api.models.get_upload_path_of_mask)),
+                ('shape', models.TextField(choices=[('circle', '원형'), ('oval', '타원형'), ('semicircle', '반원형'), ('oblong', '장방형'), ('square', '정사각형'), ('rectangle', '직사각형'), ('diamond', '다이아몬드형'), ('triangle', '삼각형'), ('pentagon', '오각형'), ('hexagon', '육각형'), ('octagon', '팔각형'), ('unknown', '검출 실패')])),
+                ('color', models.TextField(choices=[('red', 'R - 빨강(적)'), ('orange', 'O - 주황'), ('yellow', 'Y - 노랑(황)'), ('yellow-green', 'YG - 연두'), ('green', 'G - 초록(녹)'), ('blue-green', 'BG - 청록'), ('blue', 'B - 파랑(청)'), ('bluish-violet', 'bV - 남색(남)'), ('bluish-purple', 'bP - 보라'), ('reddish-purple', 'rP - 자주(자)'), ('pink', 'Pk - 분홍'), ('brown', 'Br - 갈색(갈)'), ('white', 'W - 하양(백)'), ('gray', 'Gy - 회색(회)'), ('black', 'Bk - 검정(흑)'), ('unknown', '검출 실패')])),
+                ('created_at', models.DateTimeField(auto_now=True)),
+                ('requested_at', models.DateTimeField()),
+                ('status', models.TextField(choices=[('pending', '대기'), ('running', '처리 중'), ('done', '완료'), ('failed', '실패')], default='done')),
+                ('error', models.TextField(blank=True, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Drug',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=4000)),
+                ('dosage_form', models.TextField(choices=[('capsule', '캡슐'), ('tablet', '정제')])),
+                ('dosage', models.IntegerField(null=True)),
+                ('dosage_unit', models.TextField(choices=[('mg', '밀리그램'), ('mcg', '마이크로그램'), ('g', '그램'), ('mL', '밀리리터'), ('%', '퍼센트')], null=True)),
+                ('shape', models.TextField(choices=[('circle', '원형'), ('oval', '타원형'), ('semicircle', '반원형'), ('oblong', '장방형'), ('square', '정사각형'), ('rectangle', '직사각형'), ('diamond', '다이아몬드형'), ('triangle', '삼각형'), ('pentagon', '오각형'), ('hexagon', '육각형'), ('octagon', '팔각형'), ('unknown', '검출 실패')])),
+                ('color', models.TextField(choices=[('red', 'R - 빨강(적)'), ('orange', 'O - 주황'), ('yellow', 'Y - 노랑(황)'), ('yellow-green', 'YG - 연두'), ('green', 'G - 초록(녹)'), ('blue-green', 'BG - 청록'), ('blue', 'B - 파랑(청)'), ('bluish-violet', 'bV - 남색(남)'), ('bluish-purple', 'bP - 보라'), ('reddish-purple', 'rP - 자주(자)'), ('pink', 'Pk - 분홍'), ('brown', 'Br - 갈색(갈)'), ('white', 'W - 하양(백)'), ('gray', 'Gy - 회색(회)'), ('black', 'Bk - 검정(흑)'), ('unknown', '검출 실패')])),
+                ('specification', models.ForeignKey(null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='api.drugfullspecification')),
+            ],
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='drugfullspecification',
+            index=models.Index(fields=['ITEM_SEQ'], name='drug_item_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='drugfullspecification',
+            index=models.Index(fields=['DRUG_SHAPE', 'COLOR_CLASS1', 'ITEM_SEQ'], name='drug_shape_color1_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='drugfullspecification',
+            index=models.Index(fields=['COLOR_CLASS1', 'ITEM_SEQ'], name='drug_color1_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='drugfullspecification',
+            index=models.Index(fields=['COLOR_CLASS2', 'ITEM_SEQ'], name='drug_color2_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='drugfullspecification',
+            index=models.Index(fields=['ETC_OTC_CODE', 'ITEM_SEQ'], name='drug_etc_otc_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='drugfullspecification',
+            index=models.Index(fields=['ENTP_NAME', 'ITEM_SEQ'], name='drug_entp_name_seq_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='drugfullspecification',
+            index=models.Index(fields=['ITEM_NAME'], name='drug_item_name_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:37
+
+from django.db import migrations, models
+from django.db.models import Max
+
+
+def remove_duplicate_item_seqs(apps, schema_editor):
+    """같은 ITEM_SEQ 로 여러 번 올라온 행 중 가장 최근 행만 남긴다."""
+    DrugFullSpecification = apps.get_model('api', 'DrugFullSpecification')
+    Drug = apps.get_model('api', 'Drug')
+    duplicates = DrugFullSpecification.objects.values('ITEM_SEQ') \
+        .annotate(keep=Max('pk'), n=models.Count('pk')).filter(n__gt=1)
+    for row in duplicates.iterator():
+        stale = DrugFullSpecification.objects.filter(ITEM_SEQ=row['ITEM_SEQ']).exclude(pk=row['keep'])
+        Drug.objects.filter(specification__in=stale).update(specification_id=row['keep'])
+        stale.delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0002_drugfullspecification_search_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_item_seqs, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='drugfullspecification',
+            name='drug_item_seq_idx',
+        ),
+        migrations.AlterField(
+            model_name='drugfullspecification',
+            name='ITEM_SEQ',
+            field=models.IntegerField(unique=True, verbose_name='품목일련번호'),
+        ),
+    ]
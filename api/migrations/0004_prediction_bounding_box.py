@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_drugfullspecification_item_seq_unique'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='bounding_box',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 16:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0004_prediction_bounding_box'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='mask_strategy',
+            field=models.TextField(blank=True, choices=[('chromakey', '배경색 분리'), ('contour', '윤곽선 검출')], null=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_prediction_mask_strategy'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='prediction',
+            name='candidates',
+            field=models.JSONField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_prediction_candidates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='drugfullspecification',
+            name='catalogue_version',
+            field=models.PositiveBigIntegerField(default=0, editable=False, verbose_name='반영버전'),
+        ),
+        migrations.AddIndex(
+            model_name='drugfullspecification',
+            index=models.Index(fields=['catalogue_version', 'ITEM_SEQ'], name='drug_version_seq_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:19
+
+from django.db import migrations, models
+
+
+def create_version(apps, schema_editor):
+    CatalogueVersion = apps.get_model('api', 'CatalogueVersion')
+    CatalogueVersion.objects.get_or_create(pk=1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0007_drug_catalogue_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.RunPython(create_version, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.30 on 2026-10-18 17:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_catalogue_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PredictionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket', models.DateTimeField()),
+                ('shape', models.TextField(choices=[('circle', '원형'), ('oval', '타원형'), ('semicircle', '반원형'), ('oblong', '장방형'), ('square', '정사각형'), ('rectangle', '직사각형'), ('diamond', '다이아몬드형'), ('triangle', '삼각형'), ('pentagon', '오각형'), ('hexagon', '육각형'), ('octagon', '팔각형'), ('unknown', '검출 실패')])),
+                ('color', models.TextField(choices=[('red', 'R - 빨강(적)'), ('orange', 'O - 주황'), ('yellow', 'Y - 노랑(황)'), ('yellow-green', 'YG - 연두'), ('green', 'G - 초록(녹)'), ('blue-green', 'BG - 청록'), ('blue', 'B - 파랑(청)'), ('bluish-violet', 'bV - 남색(남)'), ('bluish-purple', 'bP - 보라'), ('reddish-purple', 'rP - 자주(자)'), ('pink', 'Pk - 분홍'), ('brown', 'Br - 갈색(갈)'), ('white', 'W - 하양(백)'), ('gray', 'Gy - 회색(회)'), ('black', 'Bk - 검정(흑)'), ('unknown', '검출 실패')])),
+                ('outcome', models.TextField(choices=[('detected', '검출'), ('not_detected', '검출 실패'), ('error', '오류')])),
+                ('count', models.PositiveBigIntegerField(default=0)),
+                ('latency_sum', models.FloatField(default=0.0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['requested_at'], name='prediction_requested_at_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='prediction',
+            index=models.Index(fields=['created_at'], name='prediction_created_at_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='predictionrollup',
+            constraint=models.UniqueConstraint(fields=('bucket', 'shape', 'color', 'outcome'), name='prediction_rollup_key'),
+        ),
+    ]
@@ -7,7 +7,7 @@ from django.db import models
 
 
 class DrugFullSpecification(models.Model):
-    ITEM_SEQ = models.IntegerField(verbose_name="품목일련번호")
+    ITEM_SEQ = models.IntegerField(verbose_name="품목일련번호", unique=True)
     ITEM_NAME = models.CharField(verbose_name="품목명", max_length=4000)
     ENTP_SEQ = models.IntegerField(verbose_name="업체일련번호")
     ENTP_NAME = models.CharField(verbose_name="업체명", max_length=300)
@@ -34,6 +34,27 @@ class DrugFullSpecification(models.Model):
     MARK_CODE_BACK_IMG = models.CharField(verbose_name="마크이미지(뒤)", max_length=100, null=True)
     ITEM_ENG_NAME = models.CharField(verbose_name="제품영문명", max_length=2000, null=True, blank=True)
     EDI_CODE = models.CharField(verbose_name="보험코드", max_length=100, null=True)
+    # 이 행을 마지막으로 반영한 시트의 약품 목록 버전(`CatalogueVersion`). 증분 내보내기(`ExportView`)의 기준이다.
+    # 버전은 행 잠금 아래에서 올리므로 커밋 순서와 같다. (저장 시각은 커밋 순서와 다를 수 있다)
+    catalogue_version = models.PositiveBigIntegerField(verbose_name="반영버전", default=0, editable=False)
+
+    class Meta:
+        # 검색 필터는 모두 ITEM_SEQ 순서의 keyset 페이지네이션과 함께 쓰인다.
+        indexes = [
+            models.Index(fields=['DRUG_SHAPE', 'COLOR_CLASS1', 'ITEM_SEQ'], name='drug_shape_color1_seq_idx'),
+            models.Index(fields=['COLOR_CLASS1', 'ITEM_SEQ'], name='drug_color1_seq_idx'),
+            models.Index(fields=['COLOR_CLASS2', 'ITEM_SEQ'], name='drug_color2_seq_idx'),
+            models.Index(fields=['ETC_OTC_CODE', 'ITEM_SEQ'], name='drug_etc_otc_seq_idx'),
+            models.Index(fields=['ENTP_NAME', 'ITEM_SEQ'], name='drug_entp_name_seq_idx'),
+            models.Index(fields=['ITEM_NAME'], name='drug_item_name_idx'),
+            models.Index(fields=['catalogue_version', 'ITEM_SEQ'], name='drug_version_seq_idx'),
+        ]
+
+
+class CatalogueVersion(models.Model):
+    """약품 목록(`DrugFullSpecification`)의 버전. 시트를 반영하는 transaction 안에서 1씩 올린다. (한 행만 사용)"""
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
 
 
 class ColorChoices(models.TextChoices):
@@ -108,6 +129,18 @@ def get_upload_path_of_mask(obj: Prediction, filename: str) -> str:
     return get_upload_dir()+basename+'-mask'+extension
 
 
+class MaskStrategyChoices(models.TextChoices):
+    CHROMAKEY = 'chromakey', '배경색 분리'
+    CONTOUR = 'contour', '윤곽선 검출'
+
+
+class PredictionStatusChoices(models.TextChoices):
+    PENDING = 'pending', '대기'
+    RUNNING = 'running', '처리 중'
+    DONE = 'done', '완료'
+    FAILED = 'failed', '실패'
+
+
 class Prediction(models.Model):
     image = models.ImageField(upload_to=get_upload_path)
     raw_image = models.ImageField(upload_to=get_upload_path_of_raw, validators=[FileExtensionValidator(['jpg', 'png'])])
@@ -116,3 +149,38 @@ class Prediction(models.Model):
     color = models.TextField(choices=ColorChoices.choices)
     created_at = models.DateTimeField(auto_now=True)
     requested_at = models.DateTimeField()
+    status = models.TextField(choices=PredictionStatusChoices.choices, default=PredictionStatusChoices.DONE)
+    error = models.TextField(null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    bounding_box = models.JSONField(null=True, blank=True)
+    mask_strategy = models.TextField(choices=MaskStrategyChoices.choices, null=True, blank=True)
+    # 예측 시 시각 색인으로 정렬한 후보 `DrugFullSpecification` pk. None 이면 (모양, 색상)으로 찾는다.
+    candidates = models.JSONField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['requested_at'], name='prediction_requested_at_idx'),
+            models.Index(fields=['created_at'], name='prediction_created_at_idx'),
+        ]
+
+
+class PredictionOutcomeChoices(models.TextChoices):
+    DETECTED = 'detected', '검출'
+    NOT_DETECTED = 'not_detected', '검출 실패'
+    ERROR = 'error', '오류'
+
+
+class PredictionRollup(models.Model):
+    """정시 단위 구간(`bucket`)별 예측 집계. 예측이 끝날 때마다 `analytics.record` 가 더한다."""
+    bucket = models.DateTimeField()
+    shape = models.TextField(choices=ShapeChoices.choices)
+    color = models.TextField(choices=ColorChoices.choices)
+    outcome = models.TextField(choices=PredictionOutcomeChoices.choices)
+    count = models.PositiveBigIntegerField(default=0)
+    # 요청부터 결과 저장까지 걸린 시간의 합계(초). 평균은 count 로 나눈다.
+    latency_sum = models.FloatField(default=0.0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['bucket', 'shape', 'color', 'outcome'], name='prediction_rollup_key'),
+        ]
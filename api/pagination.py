@@ -0,0 +1,9 @@
+from rest_framework.pagination import CursorPagination
+
+
+class ItemSeqCursorPagination(CursorPagination):
+    """ITEM_SEQ 기준 keyset(cursor) 페이지네이션. OFFSET 과 달리 페이지 깊이에 관계없이 일정한 시간이 걸린다."""
+    ordering = 'ITEM_SEQ'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -1,12 +1,69 @@
-from rest_framework import serializers
+import functools
+import typing
 
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+
+from api.core import drug_index
 from api.models import DrugFullSpecification, Prediction
 
 
 class DrugSerializer(serializers.ModelSerializer):
     class Meta:
         model = DrugFullSpecification
-        fields = '__all__'
+        # 증분 내보내기용 내부 값이므로 API 에는 내보내지 않는다.
+        exclude = ['catalogue_version']
+
+
+def _fast_converter(field: serializers.Field) -> typing.Callable[[typing.Any], typing.Any]:
+    """DRF 필드와 같은 값을 만드는 함수. 자주 쓰는 필드는 `to_representation` 을 거치지 않는다."""
+    if type(field) is serializers.IntegerField:
+        return int
+    if type(field) is serializers.CharField:
+        return str
+    if type(field) is serializers.DateField and getattr(field, 'format', api_settings.DATE_FORMAT) == ISO_8601:
+        return lambda value: value.isoformat()
+    return field.to_representation
+
+
+@functools.cache
+def _drug_fields() -> typing.Dict[str, serializers.Field]:
+    return dict(DrugSerializer().fields)
+
+
+class DrugProjection:
+    """`DrugSerializer` 와 같은 출력을 DRF 필드 객체 없이 만드는 읽기 전용 경로
+
+    `.values()` 로 필요한 열(`?fields=ITEM_SEQ,ITEM_NAME`)만 읽은 dict 를 받아, 필드마다 미리 골라 둔
+    변환 함수만 적용한다. 필드 순서와 값은 `DrugSerializer` 와 같으므로 렌더링한 JSON 도 같다.
+    """
+    query_param = 'fields'
+
+    def __init__(self, fields: typing.Optional[typing.Sequence[str]] = None) -> None:
+        drug_fields = _drug_fields()
+        # 요청한 순서와 관계없이 `DrugSerializer` 의 필드 순서를 따른다.
+        self.fields = [name for name in drug_fields if fields is None or name in fields]
+        self._converters = [(name, _fast_converter(drug_fields[name])) for name in self.fields]
+
+    @classmethod
+    def from_query_params(cls, params: typing.Mapping[str, str]) -> 'DrugProjection':
+        if not params.get(__class__.query_param):
+            return cls()
+        fields = [name.strip() for name in params[__class__.query_param].split(',') if name.strip()]
+        unknown = [name for name in fields if name not in _drug_fields()]
+        if unknown:
+            raise serializers.ValidationError({__class__.query_param: f'알 수 없는 필드입니다: {", ".join(unknown)}'})
+        return cls(fields)
+
+    def columns(self, *extra: str) -> typing.List[str]:
+        """`.values()` 에 넘길 열. 페이지네이션에 필요한 열(`extra`)도 함께 읽는다."""
+        return self.fields + [name for name in extra if name not in self.fields]
+
+    def to_representation(self, row: typing.Mapping[str, typing.Any]) -> typing.Dict[str, typing.Any]:
+        return {name: None if row[name] is None else convert(row[name]) for name, convert in self._converters}
+
+    def to_representation_many(self, rows: typing.Iterable[typing.Mapping[str, typing.Any]]) -> typing.List[typing.Dict[str, typing.Any]]:
+        return [self.to_representation(row) for row in rows]
 
 
 class PredictionSerializer(serializers.ModelSerializer):
@@ -14,8 +71,14 @@ class PredictionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Prediction
-        fields = '__all__'
-        read_only_fields = ['mask_image', 'color', 'drug', 'image', 'requested_at', 'shape']
+        exclude = ['candidates']
+        read_only_fields = ['mask_image', 'color', 'drug', 'image', 'requested_at', 'shape', 'status', 'error', 'claimed_at', 'bounding_box', 'mask_strategy']
 
     def get_drug(self, obj: Prediction):
-        return DrugSerializer(instance=[], many=True).data
+        # 비동기 view 는 후보를 미리 불러와 context 로 넘긴다.
+        if 'drugs' in self.context:
+            pks, drugs = self.context['drugs']
+        else:
+            pks = obj.candidates if obj.candidates is not None else drug_index.lookup(obj.shape, obj.color).tolist()
+            drugs = DrugFullSpecification.objects.in_bulk(pks)
+        return DrugSerializer(instance=[drugs[pk] for pk in pks if pk in drugs], many=True).data
@@ -0,0 +1,42 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from api.core import catalogue, imprint_index
+from api.tests.test_importers import HEADER, _row
+
+
+class CatalogueETagTests(TestCase):
+    def _upload(self, *rows: str, header: str = HEADER):
+        sheet = SimpleUploadedFile('sheet.csv', '\n'.join([header, *rows]).encode())
+        # TestCase 는 커밋하지 않으므로 업로드가 등록한 on_commit 작업(색인 갱신)을 직접 실행한다.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post('/api/v1/upload/', {'sheet': sheet})
+        self.assertEqual(response.status_code, 201)
+        self.assertTrue(callbacks)
+
+    def test_etag_changes_after_upload(self):
+        self._upload(_row(1, '235'))
+        etag = self.client.get('/api/v1/search/').headers['ETag']
+        self.assertEqual(self.client.get('/api/v1/search/', HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self._upload(_row(2, '235'))
+
+        response = self.client.get('/api/v1/search/', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+
+    def test_cached_imprint_search_is_refreshed_after_upload(self):
+        header = f'{HEADER},PRINT_FRONT'
+        self._upload(f'{_row(1, "235")},AB12', header=header)
+        response = self.client.get('/api/v1/search/imprint/', {'q': 'AB12'})
+        self.assertEqual([match['drug']['ITEM_SEQ'] for match in response.json()], [1])
+        etag = response.headers['ETag']
+
+        self._upload(f'{_row(2, "235")},AB12', header=header)
+        # 커밋 직후 각인 색인이 새 버전으로 다시 만들어진다.
+        self.assertEqual(imprint_index._version, catalogue.get_version())
+
+        response = self.client.get('/api/v1/search/imprint/', {'q': 'AB12'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers['ETag'], etag)
+        self.assertEqual(sorted(match['drug']['ITEM_SEQ'] for match in response.json()), [1, 2])
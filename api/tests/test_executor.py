@@ -0,0 +1,50 @@
+import os
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from api.core import exceptions, executor
+
+
+class _Result:
+    timings = []
+
+
+def _sleep(data: bytes) -> _Result:
+    time.sleep(float(data))
+    return _Result()
+
+
+class PredictionExecutorTests(SimpleTestCase):
+    def setUp(self):
+        self.executor = executor.PredictionExecutor(workers=1, queue_size=0, timeout=0.3, start_method='fork')
+        self.addCleanup(self.executor.shutdown)
+        self.executor.start()
+
+    def test_timed_out_job_keeps_its_slot_until_it_finishes(self):
+        with self.assertRaises(exceptions.PredictionTimeoutException):
+            self.executor.submit(b'1.0', _sleep)
+        # 요청은 포기했지만 워커는 아직 작업 중이므로 새 작업을 받지 않는다.
+        with self.assertRaises(exceptions.PredictionBusyException):
+            self.executor.submit(b'0', _sleep)
+        time.sleep(1.0)
+        self.assertIsInstance(self.executor.submit(b'0', _sleep), _Result)
+
+
+def _crash(data: bytes) -> _Result:
+    os._exit(1)
+
+
+class BrokenPoolTests(SimpleTestCase):
+    def tearDown(self):
+        if executor._executor is not None:
+            executor._executor.shutdown()
+        executor._executor = None
+
+    @override_settings(PREDICTION_EXECUTOR={'WORKERS': 1, 'QUEUE_SIZE': 0, 'TIMEOUT': 5.0, 'START_METHOD': 'fork'})
+    def test_crashed_worker_gets_a_new_pool(self):
+        pool = executor.get_executor()
+        with self.assertRaises(exceptions.PredictionCrashedException):
+            pool.submit(b'', _crash)
+
+        self.assertIsNot(executor.get_executor(), pool)
@@ -0,0 +1,31 @@
+import json
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from api.tests.test_importers import HEADER, _row
+
+
+class IncrementalExportTests(TestCase):
+    def _upload(self, *rows: str):
+        sheet = SimpleUploadedFile('sheet.csv', '\n'.join([HEADER, *rows]).encode())
+        response = self.client.post('/api/v1/upload/', {'sheet': sheet})
+        self.assertEqual(response.status_code, 201)
+
+    def _export(self, **params) -> tuple:
+        response = self.client.get('/api/v1/export/', {'fields': 'ITEM_SEQ', **params})
+        self.assertEqual(response.status_code, 200)
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        return [row['ITEM_SEQ'] for row in rows], int(response.headers['X-Catalogue-Version'])
+
+    def test_since_version_returns_only_rows_from_later_sheets(self):
+        self._upload(_row(1, '235'), _row(2, '235'))
+        seqs, version = self._export()
+        self.assertEqual(seqs, [1, 2])
+
+        # 2 는 다시 반영되고 3 은 새로 들어온다.
+        self._upload(_row(2, '236'), _row(3, '235'))
+
+        seqs, next_version = self._export(since_version=version)
+        self.assertEqual(seqs, [2, 3])
+        self.assertEqual(self._export(since_version=next_version)[0], [])
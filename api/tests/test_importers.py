@@ -0,0 +1,22 @@
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase
+
+from api.core import importers
+
+HEADER = 'ITEM_SEQ,ITEM_NAME,ENTP_SEQ,ENTP_NAME,CHARTN,DRUG_SHAPE,COLOR_CLASS1,IMG_REGIST_TS,CLASS_NO,ETC_OTC_CODE,ITEM_PERMIT_DATE,SHAPE_CODE'
+
+
+def _row(item_seq: int, class_no: str) -> str:
+    return f'{item_seq},약{item_seq},1,업체,하얀색 원형 정제,원형,하양,20180309,{class_no},0,2019-01-09,16'
+
+
+class ImportSheetTests(TestCase):
+    def test_rejects_non_integer_with_original_row_number(self):
+        # 2행, (빈 3행), 4행, 5행
+        lines = [HEADER, _row(1, '235'), ',,,', _row(2, '1.5'), _row(3, '235')]
+        sheet = SimpleUploadedFile('sheet.csv', '\n'.join(lines).encode())
+
+        result = importers.import_sheet(sheet, catalogue_version=1)
+
+        self.assertEqual((result.inserted, result.rejected), (2, 1))
+        self.assertEqual(result.errors, ['4행: CLASS_NO 값이 올바르지 않습니다.'])
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from api.core import media
+from api.models import Prediction
+
+
+def _fail() -> bytes:
+    raise OSError('disk full')
+
+
+class MediaWriteTests(TestCase):
+    def setUp(self):
+        root = tempfile.TemporaryDirectory()
+        self.addCleanup(root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=root.name))
+        self.storage = Prediction._meta.get_field('image').storage
+
+    def test_name_is_not_readable_until_written(self):
+        field = Prediction._meta.get_field('image')
+        name = media._reserve(field, field.generate_filename(None, 'a.png'))
+
+        self.assertFalse(self.storage.exists(name))
+        # 같은 이름을 다시 요청해도 차지한 이름과 겹치지 않는다.
+        self.assertNotEqual(media._reserve(field, name), name)
+
+        media._write('image', name, lambda: b'png')
+        self.assertEqual(self.storage.open(name).read(), b'png')
+
+    def test_failed_write_clears_the_field(self):
+        field = Prediction._meta.get_field('image')
+        name = media._reserve(field, field.generate_filename(None, 'a.png'))
+        prediction = Prediction.objects.create(image=name, raw_image='raw.png', requested_at=timezone.now())
+
+        with self.assertRaises(OSError):
+            media._write('image', name, _fail)
+
+        prediction.refresh_from_db()
+        self.assertEqual(prediction.image.name, '')
+        self.assertEqual(os.listdir(os.path.dirname(self.storage.path(name))), [])
@@ -0,0 +1,43 @@
+import os
+import tempfile
+
+import numpy
+
+from django.test import SimpleTestCase, override_settings
+
+from api.core import munsell
+
+
+class MunsellTableTests(SimpleTestCase):
+    """변환 테이블 조회 결과가 colour-science 의 정확한 값과 허용 오차 안에서 일치하는지 확인한다."""
+
+    def setUp(self):
+        rng = numpy.random.default_rng(0)
+        self.samples = rng.integers(0, 256, size=(40, 3), dtype=numpy.uint8)
+        # 전체 테이블은 만드는 데 오래 걸리므로 표본이 속한 셀만 계산한다.
+        table = numpy.full((munsell.LEVELS,) * 3, numpy.nan, dtype=munsell.DTYPE)
+        centers = munsell.cell_centers()
+        for rgb in self.samples:
+            index = tuple(rgb >> munsell.SHIFT)
+            table[index] = munsell._to_cell(centers[index])
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, 'munsell.npy')
+        munsell.save_table(table, path)
+
+        settings = override_settings(MUNSELL_TABLE_PATH=path)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        munsell.reset()
+        self.addCleanup(munsell.reset)
+
+    def test_lookup_within_tolerance(self):
+        self.assertIsNotNone(munsell.get_table())
+        error = munsell.measure_error(self.samples)
+        self.assertGreater(error.n_compared, 0)
+        self.assertLessEqual(error.value, munsell.MAX_VALUE_ERROR)
+        self.assertLessEqual(error.chroma, munsell.MAX_CHROMA_ERROR)
+        self.assertGreaterEqual(error.match_rate, munsell.MIN_MATCH_RATE)
+
+    def test_table_opened_once(self):
+        self.assertIs(munsell.get_table(), munsell.get_table())
@@ -0,0 +1,50 @@
+import cv2
+import numpy
+
+from django.test import SimpleTestCase
+
+from api.core import prediction_cache
+
+
+def _pill(color, ext='.png') -> bytes:
+    mat = numpy.full((480, 640, 3), 230, dtype=numpy.uint8)
+    cv2.circle(mat, (320, 240), 120, color, -1)
+    return cv2.imencode(ext, mat)[1].tobytes()
+
+
+def _value(color: str) -> prediction_cache.CachedPrediction:
+    return prediction_cache.CachedPrediction(
+        shape='circle', color=color, mask_strategy=None, candidates=None, image_name='', mask_image_name='',
+    )
+
+
+class PerceptualCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.cache = prediction_cache.PredictionCache(max_size=16, ttl=60, max_distance=4, max_color_distance=10.0)
+
+    def test_same_shape_different_color_is_a_miss(self):
+        # 흑백으로 바꾸면 밝기가 같아 dHash 가 같은 빨강, 초록 알약
+        red, green = _pill((0, 0, 200)), _pill((0, 102, 0))
+        key, _ = self.cache.lookup(red)
+        self.cache.store(key, _value('red'))
+
+        _, cached = self.cache.lookup(green)
+
+        self.assertIsNone(cached)
+
+    def test_reencoded_photo_is_a_perceptual_hit(self):
+        key, _ = self.cache.lookup(_pill((0, 0, 200)))
+        self.cache.store(key, _value('red'))
+
+        _, cached = self.cache.lookup(_pill((0, 0, 200), ext='.jpg'))
+
+        self.assertEqual(cached.color, 'red')
+
+    def test_entry_from_another_generation_is_a_miss(self):
+        # 약품 목록 버전이 바뀌면 캐시된 후보가 달라질 수 있다.
+        key, _ = self.cache.lookup(_pill((0, 0, 200)), generation=(1, None))
+        self.cache.store(key, _value('red'))
+
+        self.assertIsNotNone(self.cache.lookup(_pill((0, 0, 200)), generation=(1, None))[1])
+        self.assertIsNone(self.cache.lookup(_pill((0, 0, 200), ext='.jpg'), generation=(2, None))[1])
+        self.assertIsNone(self.cache.lookup(_pill((0, 0, 200)), generation=(2, None))[1])
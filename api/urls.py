@@ -1,10 +1,23 @@
+from django.conf import settings
 from django.urls import path
 
-from api import views
+from api import async_views, views
 
 
+# ASGI 로 서비스할 때는 업로드/검색과 예측 결과 long-poll 을 비동기 view 로 처리한다.
+predict_view, prediction_detail_view, search_view = (
+    (async_views.PredictView, async_views.PredictionDetailView, async_views.SearchView) if settings.ASYNC_VIEWS
+    else (views.PredictView, views.PredictionDetailView, views.SearchView)
+)
+
 urlpatterns = [
-    path('predict/', views.PredictView.as_view()),
-    path('search/', views.SearchView.as_view()),
+    path('metrics', views.MetricsView.as_view()),
+    path('predict/', predict_view.as_view()),
+    path('predict/batch/', views.BatchPredictView.as_view()),
+    path('predict/<int:pk>/', prediction_detail_view.as_view()),
+    path('analytics/predictions/', views.PredictionAnalyticsView.as_view()),
+    path('search/', search_view.as_view()),
+    path('search/imprint/', views.ImprintSearchView.as_view()),
+    path('export/', views.ExportView.as_view()),
     path('upload/', views.UploadView.as_view()),
 ]
\ No newline at end of file
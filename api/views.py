@@ -1,52 +1,299 @@
-import pandas
+import datetime
+import logging
+import time
+import typing
 
+from django.conf import settings
 from django.core.files.uploadedfile import UploadedFile
+from django.http import HttpResponse, StreamingHttpResponse
 from django.db import transaction
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
-from rest_framework.generics import CreateAPIView, ListAPIView
+from rest_framework.exceptions import APIException, ValidationError
+from rest_framework.generics import CreateAPIView, ListAPIView, RetrieveAPIView
 from rest_framework.request import Request
+from rest_framework.views import APIView
 from rest_framework.response import Response
 
-from api.core import converters
-from api.core.algorithms import PredictionModel
-from api.models import DrugFullSpecification
-from api.serializers import DrugSerializer, PredictionSerializer
+from api.core import analytics, catalogue, drug_index, executor, exports, imprint_index, jobs, metrics, uploads, visual_index
+from api.models import ColorChoices, DrugFullSpecification, Prediction, PredictionStatusChoices, ShapeChoices
+from api.pagination import ItemSeqCursorPagination
+from api.serializers import DrugProjection, DrugSerializer, PredictionSerializer
 
 
-class SearchView(ListAPIView):
+logger = logging.getLogger(__name__)
+
+
+def _get_datetime(params: typing.Mapping[str, str], name: str) -> typing.Optional[datetime.datetime]:
+    """ISO 8601 시각 파라미터. 시간대가 없으면 현재 시간대로 본다."""
+    if not params.get(name):
+        return None
+    try:
+        value = parse_datetime(params[name])
+    except ValueError:
+        value = None
+    if value is None:
+        raise ValidationError({name: 'ISO 8601 형식의 시각이어야 합니다.'})
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+class SearchView(catalogue.CachedCatalogueMixin, ListAPIView):
     serializer_class = DrugSerializer
-    queryset = DrugFullSpecification.objects
+    pagination_class = ItemSeqCursorPagination
+    filter_fields = ['DRUG_SHAPE', 'COLOR_CLASS1', 'COLOR_CLASS2', 'ETC_OTC_CODE', 'ENTP_NAME']
+    prefix_filter_fields = ['ITEM_NAME']
+
+    def get_queryset(self):
+        return __class__.build_queryset(self.request.query_params)
+
+    def list(self, request: Request, *args, **kwargs):
+        # 모델 인스턴스와 DRF 필드를 거치지 않고, 요청한 열(`?fields=`)만 읽어 `DrugSerializer` 와 같은 JSON 을 만든다.
+        projection = DrugProjection.from_query_params(request.query_params)
+        queryset = self.get_queryset().values(*projection.columns(self.paginator.ordering))
+        page = self.paginate_queryset(queryset)
+        return self.get_paginated_response(projection.to_representation_many(page))
+
+    @classmethod
+    def build_queryset(cls, params: typing.Mapping[str, str]):
+        """검색 조건을 적용한 queryset. 비동기 `SearchView` 와 함께 사용한다."""
+        queryset = DrugFullSpecification.objects.all()
+        for field in __class__.filter_fields:
+            if field in params:
+                try:
+                    queryset = queryset.filter(**{field: params[field]})
+                except ValueError as e:
+                    raise ValidationError({field: str(e)})
+        for field in __class__.prefix_filter_fields:
+            if params.get(field):
+                # startswith(LIKE) 대신 범위 조건을 사용해야 DB 에 관계없이 인덱스를 탄다.
+                prefix = params[field]
+                queryset = queryset.filter(**{f'{field}__gte': prefix, f'{field}__lt': prefix + '\U0010ffff'})
+        return queryset
+
+
+class ImprintSearchView(catalogue.CachedCatalogueMixin, APIView):
+    """각인 문자열(`q`)과 비슷한 약품을 유사도 순으로 찾는다. `shape`, `color` 로 좁힐 수 있다."""
+
+    def list(self, request: Request, *args, **kwargs):
+        params = request.query_params
+        query = params.get('q', '')
+        if not imprint_index.normalize(query):
+            raise ValidationError({'q': '각인 문자열을 입력하세요.'})
+        shape = params.get('shape') or None
+        if shape is not None and shape not in ShapeChoices.values:
+            raise ValidationError({'shape': f'{ShapeChoices.values} 중 하나여야 합니다.'})
+        color = params.get('color') or None
+        if color is not None and color not in ColorChoices.values:
+            raise ValidationError({'color': f'{ColorChoices.values} 중 하나여야 합니다.'})
+        try:
+            limit = min(int(params.get('limit', settings.IMPRINT_INDEX['LIMIT'])), settings.IMPRINT_INDEX['MAX_LIMIT'])
+        except ValueError as e:
+            raise ValidationError({'limit': str(e)})
+
+        matches = imprint_index.search(query, shape, color, max(limit, 1))
+        drugs = DrugFullSpecification.objects.in_bulk([match.pk for match in matches])
+        return Response([
+            {'score': round(match.score, 4), 'side': match.side, 'drug': DrugSerializer(drugs[match.pk]).data}
+            for match in matches if match.pk in drugs
+        ])
+
+
+class ExportView(APIView):
+    """약품 목록 전체를 NDJSON(`?output=ndjson`, 기본값) 또는 CSV(`?output=csv`)로 스트리밍한다.
+
+    `after=<ITEM_SEQ>` 로 이어 받고, `since_version=<버전>` 으로 그 버전 이후에 반영된 행만 받는다.
+    `fields=` 로 열을 고를 수 있다.
+    """
+
+    def get(self, request: Request, *args, **kwargs):
+        params = request.query_params
+        output = params.get('output', 'ndjson')
+        if output not in exports.CONTENT_TYPES:
+            raise ValidationError({'output': f'{list(exports.CONTENT_TYPES)} 중 하나여야 합니다.'})
+        values = {}
+        for name in ('after', 'since_version'):
+            try:
+                values[name] = int(params[name]) if params.get(name) else None
+            except ValueError as e:
+                raise ValidationError({name: str(e)})
+
+        projection = DrugProjection.from_query_params(params)
+
+        # 다음 증분 동기화의 since_version. 조회를 시작하기 전에 읽으므로 그동안 반영된 행을 놓치지 않는다.
+        version = catalogue.get_version()
+        queryset = exports.build_queryset(projection.columns('ITEM_SEQ'), values['after'], values['since_version'])
+        response = StreamingHttpResponse(
+            exports.iter_rows(output, queryset, projection, settings.EXPORT['CHUNK_SIZE']),
+            content_type=exports.CONTENT_TYPES[output],
+        )
+        response['Content-Disposition'] = f'attachment; filename="drugs.{output}"'
+        response['X-Catalogue-Version'] = str(version)
+        return response
 
 
 class UploadView(CreateAPIView):
     serializer_class = DrugSerializer
 
     def create(self, request: Request, *args, **kwargs):
+        # pandas 를 불러오는 데 오래 걸리므로 목록을 올릴 때만 불러온다.
+        from api.core import importers
+
+        result = importers.ImportResult()
         for sheet in request.FILES.getlist('sheet'):
-            df = pandas.read_excel(sheet)
-            df = df.where(pandas.notnull(df), None)
             with transaction.atomic():
-                for i in df.index:
-                    data = dict(df.loc[i])
-                    serializer = self.get_serializer(data=data)
-                    serializer.is_valid(raise_exception=True)
-                    self.perform_create(serializer)
-        return Response({}, status=status.HTTP_201_CREATED)
+                # 같은 transaction 에서 올리므로 커밋되는 순간 모든 프로세스의 캐시 키가 바뀐다.
+                version = catalogue.bump()
+                transaction.on_commit(drug_index.refresh)
+                transaction.on_commit(imprint_index.rebuild)
+                transaction.on_commit(visual_index.schedule_update)
+                result.merge(importers.import_sheet(sheet, version))
+        return Response(result.to_dict(), status=status.HTTP_201_CREATED)
 
 
 class PredictView(CreateAPIView):
     serializer_class = PredictionSerializer
     image_field_name = 'raw_image'
 
+    def create(self, request: Request, *args, **kwargs):
+        if self.is_multiple():
+            return self.create_multiple(request)
+        response = super().create(request, *args, **kwargs)
+        if self.is_async():
+            response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
+    def create_multiple(self, request: Request) -> Response:
+        """`?multiple=1`: 사진 속 알약마다 `Prediction` 을 하나씩 만들어 목록으로 돌려준다."""
+        if self.is_async():
+            raise ValidationError({'multiple': '비동기 예측과 함께 사용할 수 없습니다.'})
+        requested_at = timezone.now()
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        file: UploadedFile = serializer.validated_data[__class__.image_field_name]
+        with analytics.recording_failure(requested_at):
+            fields = uploads.predict_multiple(file)
+        with metrics.timing('save'):
+            predictions = Prediction.objects.bulk_create([
+                Prediction(**pill_fields, requested_at=requested_at) for pill_fields in fields
+            ])
+        analytics.record(predictions)
+        return Response(self.get_serializer(predictions, many=True).data, status=status.HTTP_201_CREATED)
+
+    def is_async(self) -> bool:
+        return self.request.query_params.get('async', '').lower() in ('1', 'true')
+
+    def is_multiple(self) -> bool:
+        return self.request.query_params.get('multiple', '').lower() in ('1', 'true')
+
     def perform_create(self, serializer: PredictionSerializer):
         requested_at = timezone.now()
+        if self.is_async():
+            # 업로드만 저장하고, 나머지는 `run_prediction_worker` 가 처리한다.
+            serializer.save(
+                shape=ShapeChoices.UNKNOWN,
+                color=ColorChoices.UNKNOWN,
+                status=PredictionStatusChoices.PENDING,
+                requested_at=requested_at,
+            )
+            return
         file: UploadedFile = serializer.validated_data[__class__.image_field_name]
-        model = PredictionModel(converters.convert_file_to_mat(file))
-        serializer.save(
-            image=converters.convert_mat_to_file(model.mat, filename=file.name),
-            mask_image=converters.convert_mat_to_file(model.bin_mat, filename=file.name),
-            shape=model.shape,
-            color=model.color,
-            requested_at=requested_at,
-        )
+        with analytics.recording_failure(requested_at):
+            outcome = uploads.predict(file)
+        with metrics.timing('save'):
+            prediction = serializer.save(**outcome.fields, requested_at=requested_at)
+        analytics.record([prediction])
+        uploads.remember(outcome, prediction)
+
+
+class BatchPredictView(APIView):
+    """여러 장의 사진(`raw_image` 여러 개)을 한 번에 예측한다. 결과는 입력 순서대로, 실패한 사진은 오류로 돌려준다."""
+    image_field_name = 'raw_image'
+
+    def post(self, request: Request, *args, **kwargs):
+        requested_at = timezone.now()
+        files = request.FILES.getlist(__class__.image_field_name)
+        if not files:
+            raise ValidationError({__class__.image_field_name: '사진이 없습니다.'})
+        if len(files) > settings.PREDICTION_BATCH['MAX_IMAGES']:
+            raise ValidationError({__class__.image_field_name: f"사진은 최대 {settings.PREDICTION_BATCH['MAX_IMAGES']}장까지 보낼 수 있습니다."})
+
+        serializers = [PredictionSerializer(data={__class__.image_field_name: file}) for file in files]
+        valid = [i for i, serializer in enumerate(serializers) if serializer.is_valid()]
+        outcomes = dict(zip(valid, executor.map_settled(
+            lambda i: uploads.predict(serializers[i].validated_data[__class__.image_field_name]),
+            valid,
+        )))
+
+        predictions = {
+            i: Prediction(**{**serializers[i].validated_data, **outcome.fields}, requested_at=requested_at)
+            for i, outcome in outcomes.items() if not isinstance(outcome, Exception)
+        }
+        with metrics.timing('save'):
+            Prediction.objects.bulk_create(predictions.values())
+        analytics.record(predictions.values())
+        analytics.record_failures(requested_at, [
+            outcome for outcome in outcomes.values() if isinstance(outcome, Exception)
+        ])
+        for i, prediction in predictions.items():
+            uploads.remember(outcomes[i], prediction)
+
+        results = []
+        for i, serializer in enumerate(serializers):
+            if i in predictions:
+                results.append({'result': PredictionSerializer(predictions[i], context={'request': request}).data})
+            elif serializer.errors:
+                results.append({'error': serializer.errors})
+            else:
+                results.append({'error': self._format_error(outcomes[i])})
+        return Response(results, status=status.HTTP_200_OK)
+
+    def _format_error(self, e: Exception) -> typing.Dict[str, typing.Any]:
+        if isinstance(e, APIException):
+            return {'status': e.status_code, 'code': e.default_code, 'detail': e.detail}
+        logger.error('Batch prediction failed', exc_info=e)
+        return {'status': status.HTTP_500_INTERNAL_SERVER_ERROR, 'code': 'error', 'detail': 'A server error occurred.'}
+
+
+class PredictionDetailView(RetrieveAPIView):
+    serializer_class = PredictionSerializer
+    queryset = Prediction.objects
+
+    @staticmethod
+    def get_wait(params: typing.Mapping[str, str]) -> float:
+        """`?wait=<초>` 를 `PREDICTION_JOBS['MAX_WAIT']` 이하로 제한한 값"""
+        try:
+            wait = float(params.get('wait', 0))
+        except ValueError:
+            wait = 0.0
+        return min(wait, settings.PREDICTION_JOBS['MAX_WAIT'])
+
+    def get_object(self) -> Prediction:
+        """`?wait=<초>` 가 주어지면 작업이 끝나거나 시간이 다 될 때까지 기다린다. (long-poll)"""
+        prediction = super().get_object()
+        deadline = time.monotonic() + self.get_wait(self.request.query_params)
+        while prediction.status not in jobs.TERMINAL_STATUSES and time.monotonic() < deadline:
+            time.sleep(settings.PREDICTION_JOBS['POLL_INTERVAL'])
+            prediction.refresh_from_db()
+        return prediction
+
+
+class PredictionAnalyticsView(APIView):
+    """`since` 부터 `until` 까지(ISO 8601, 기본값은 최근 24시간) 한 시간 단위 예측 통계. 집계 행만 읽는다."""
+
+    def get(self, request: Request, *args, **kwargs):
+        params = request.query_params
+        until = _get_datetime(params, 'until') or timezone.now()
+        since = _get_datetime(params, 'since') or until - datetime.timedelta(days=1)
+        if since >= until:
+            raise ValidationError({'since': 'until 보다 이전이어야 합니다.'})
+        if (until - since) / analytics.BUCKET > settings.PREDICTION_ANALYTICS['MAX_BUCKETS']:
+            raise ValidationError({'since': f"최대 {settings.PREDICTION_ANALYTICS['MAX_BUCKETS']}시간까지 조회할 수 있습니다."})
+        return Response(analytics.summarize(since, until))
+
+
+class MetricsView(APIView):
+    def get(self, request: Request, *args, **kwargs):
+        return HttpResponse(metrics.render_prometheus(), content_type='text/plain; version=0.0.4; charset=utf-8')
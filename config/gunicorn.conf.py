@@ -0,0 +1,14 @@
+"""gunicorn 설정
+
+    gunicorn -c config/gunicorn.conf.py config.wsgi
+    gunicorn -c config/gunicorn.conf.py -k uvicorn.workers.UvicornWorker config.asgi
+
+예측 풀(`PREDICTION_EXECUTOR['WORKERS']`)은 서버 워커마다 하나씩 있다. `--preload` 여부와 관계없이
+fork 된 뒤 각 워커에서 풀의 프로세스를 미리 띄우므로, 첫 예측이 인터프리터 기동과 warm-up 을 기다리지 않는다.
+"""
+
+
+def post_worker_init(worker):
+    from api.core import executor
+
+    executor.start()
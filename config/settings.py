@@ -55,6 +55,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    'api.middleware.ServerTimingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -140,3 +141,147 @@ MEDIA_ROOT = BASE_DIR / MEDIA_URL
 # https://docs.djangoproject.com/en/4.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+
+# Precomputed sRGB -> Munsell lookup table (see `manage.py build_munsell_table`)
+
+MUNSELL_TABLE_PATH = BASE_DIR / 'data' / 'munsell.npy'
+
+
+# Prediction pipeline executor
+# WORKERS = 0 runs the pipeline inline in the request thread. Under gunicorn, `-c config/gunicorn.conf.py`
+# starts each worker's pool right after fork so the first prediction does not wait for it.
+
+PREDICTION_EXECUTOR = {
+    'WORKERS': 0,
+    'QUEUE_SIZE': 8,
+    'TIMEOUT': 30.0,
+    'START_METHOD': 'spawn',
+}
+
+
+# Import cv2/colour and prime the prediction caches in ApiConfig.ready. With
+# `gunicorn --preload` forked workers share those pages copy-on-write; the prediction
+# pool is created in each worker after fork (see config/gunicorn.conf.py), never in the preloading parent.
+# Keep it off for manage.py commands and search-only workers, which never run a prediction.
+
+WARM_UP_ON_READY = False
+
+
+# Asynchronous prediction jobs (see `manage.py run_prediction_worker`)
+
+PREDICTION_JOBS = {
+    'POLL_INTERVAL': 1.0,
+    'LEASE': 300.0,
+    'MAX_WAIT': 30.0,
+}
+
+
+# Prediction result cache
+# PERCEPTUAL_DISTANCE is the max Hamming distance between 64-bit dHashes for a
+# near-duplicate hit; None restricts the cache to byte-identical uploads.
+# PERCEPTUAL_COLOR_DISTANCE is the max colour difference (CIE76 ΔE) per cell of an 8x8 Lab thumbnail,
+# so pills with the same outline but a different colour never share an entry.
+
+PREDICTION_CACHE = {
+    'ENABLED': True,
+    'MAX_SIZE': 1024,
+    'TTL': 60 * 60,
+    'PERCEPTUAL_DISTANCE': 4,
+    'PERCEPTUAL_COLOR_DISTANCE': 10.0,
+}
+
+
+# In-memory (shape, color) drug candidate index
+# Rebuilt in a background thread when the catalogue version changes; requests keep using the
+# old index meanwhile. CHECK_INTERVAL: seconds between version checks (catches uploads applied by other processes).
+
+DRUG_INDEX = {
+    'LIMIT': 20,
+    'CHECK_INTERVAL': 30,
+}
+
+
+# In-memory character n-gram index over imprints (PRINT_FRONT/BACK, MARK_CODE_*_ANAL) for /search/imprint/
+# Matches scoring below MIN_SCORE (Dice similarity of padded 3-grams, 0~1) are dropped.
+
+IMPRINT_INDEX = {
+    'LIMIT': 20,
+    'MAX_LIMIT': 100,
+    'MIN_SCORE': 0.3,
+}
+
+
+# Visual nearest-neighbour index over reference drug images (built by `manage.py build_visual_index`)
+# When the file exists, candidates matching (shape, color) are re-ranked by similarity to the photo.
+# ITEM_IMAGE is downloaded only over http(s); larger images than MAX_DOWNLOAD_SIZE bytes are skipped.
+
+VISUAL_INDEX = {
+    'PATH': BASE_DIR / 'data' / 'visual_index.npy',
+    'UPDATE_ON_UPLOAD': False,
+    'DOWNLOAD_TIMEOUT': 10.0,
+    'MAX_DOWNLOAD_SIZE': 10 * 1024 * 1024,
+}
+
+
+# Prediction pipeline metrics (Server-Timing header and /api/v1/metrics)
+# DIR holds one memory-mapped file per process; None keeps metrics per process only.
+
+METRICS = {
+    'ENABLED': True,
+    'DIR': BASE_DIR / 'data' / 'metrics',
+}
+
+
+# Serve predict/ and search/ with native async views. Enable when running config.asgi;
+# under WSGI every async view call would spin up its own event loop.
+
+ASYNC_VIEWS = False
+
+
+# Prediction media (masked image and mask)
+# Files are written by WRITER_THREADS background threads after the response;
+# 0 writes them in the request thread. STORE_DERIVED = False keeps only the raw upload.
+
+PREDICTION_MEDIA = {
+    'STORE_DERIVED': True,
+    'WRITER_THREADS': 2,
+    'QUEUE_SIZE': 64,
+}
+
+
+# Versioned response cache for catalogue reads (/search/, /search/imprint/)
+# Keys include the catalogue version bumped by each sheet upload, so entries never need to be deleted.
+# Use a shared backend (e.g. Redis, Memcached) in CACHES to share entries between workers.
+
+CATALOGUE_CACHE = {
+    'ENABLED': True,
+    'ALIAS': 'default',
+    'TIMEOUT': 60 * 60,
+}
+
+
+# Streaming catalogue export (GET /api/v1/export/)
+# Rows are read and encoded CHUNK_SIZE at a time, so memory does not grow with the table.
+
+EXPORT = {
+    'CHUNK_SIZE': 2000,
+}
+
+
+# Batch prediction (POST /api/v1/predict/batch/)
+
+PREDICTION_BATCH = {
+    'THREADS': 4,
+    'MAX_IMAGES': 32,
+}
+
+
+# Hourly prediction rollups (GET /api/v1/analytics/predictions/)
+# Each finished prediction adds to its hour's row, so queries read at most MAX_BUCKETS rows per combination.
+# Rebuild past hours with `manage.py backfill_prediction_rollups`.
+
+PREDICTION_ANALYTICS = {
+    'ENABLED': True,
+    'MAX_BUCKETS': 24 * 92,
+}